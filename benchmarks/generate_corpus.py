@@ -0,0 +1,233 @@
+#!/usr/bin/python
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Generates a synthetic corpus of NDT result files for benchmarking.
+
+Writes raw NDT result files (JSON) and result packages (zips of JSON) shaped
+like those produced by the client_wrapper and the Ansible playbook, including
+failed tests, missing timestamps and non-result files that parsers must skip.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import zipfile
+
+_BROWSERS = {
+    'chrome': ['50.0.2661.86', '50.0.2661.102', '51.0.2704.63'],
+    'firefox': ['45.0.1', '46.0.1'],
+    'edge': ['25.10586.0.0'],
+    'safari': ['9.1'],
+}
+_OPERATING_SYSTEMS = {
+    'Windows': ['2012ServerR2', '10'],
+    'OSX': ['10.11.3', '10.11.5'],
+    'Ubuntu': ['14.04'],
+}
+_CLIENTS = ['ndt_js', 'banjo']
+_ERROR_MESSAGES = ['Timed out waiting for page to load.',
+                   'Failed to start c2s test.', 'Failed to start s2c test.',
+                   'Timed out waiting for c2s test to end.',
+                   'Timed out waiting for s2c test to end.']
+_TIMESTAMP_FIELDS = ['start_time', 'end_time', 'c2s_start_time', 'c2s_end_time',
+                     's2c_start_time', 's2c_end_time']
+_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+_LOG_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+_CORPUS_START_TIME = datetime.datetime(2016, 5, 24, 12, 0, 0)
+
+
+def generate_corpus(output_dir,
+                    raw_count,
+                    package_count,
+                    results_per_package=10,
+                    error_rate=0.1,
+                    missing_time_rate=0.05,
+                    junk_count=1,
+                    seed=0):
+    """Writes a synthetic corpus of NDT result files to a directory.
+
+    Args:
+        output_dir: Directory in which to write the corpus. It is created if it
+            does not exist.
+        raw_count: Number of raw result files (JSON) to write.
+        package_count: Number of result packages (zips) to write.
+        results_per_package: Number of raw result files in each package. Each
+            package also contains a client_wrapper log and a garbage.txt file.
+        error_rate: Fraction of results in which the NDT test failed, so the
+            result has errors and is missing c2s and s2c fields.
+        missing_time_rate: Fraction of timestamps to omit from results.
+        junk_count: Number of non-result files to write alongside the results.
+        seed: Seed for the random number generator, so that corpora are
+            reproducible.
+
+    Returns:
+        The total number of results written.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    generator = random.Random(seed)
+    result_index = 0
+    for raw_index in range(raw_count):
+        path = os.path.join(output_dir, 'raw-%06d.json' % raw_index)
+        with open(path, 'w') as raw_file:
+            raw_file.write(_generate_result_json(generator, result_index,
+                                                 error_rate, missing_time_rate))
+        result_index += 1
+    for package_index in range(package_count):
+        path = os.path.join(output_dir, 'package-%06d.zip' % package_index)
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+            log_lines = []
+            for member_index in range(results_per_package):
+                package.writestr('package-%06d-result-%03d.json' %
+                                 (package_index, member_index),
+                                 _generate_result_json(generator, result_index,
+                                                       error_rate,
+                                                       missing_time_rate))
+                log_lines.extend(_generate_log_lines(result_index))
+                result_index += 1
+            package.writestr('client_wrapper-%06d.log' % package_index,
+                             '\n'.join(log_lines) + '\n')
+            package.writestr('garbage.txt',
+                             'this is junk and should be ignored\n')
+    for junk_index in range(junk_count):
+        path = os.path.join(output_dir, 'garbage-%06d.txt' % junk_index)
+        with open(path, 'w') as junk_file:
+            junk_file.write('this is junk and should be ignored\n')
+    return result_index
+
+
+def _result_start_time(result_index):
+    # Results are spaced a minute apart, as if run back to back.
+    return _CORPUS_START_TIME + datetime.timedelta(minutes=result_index)
+
+
+def _generate_result_json(generator, result_index, error_rate,
+                          missing_time_rate):
+    """Generates the contents of a raw NDT result file."""
+    browser = generator.choice(sorted(_BROWSERS.keys()))
+    os_name = generator.choice(sorted(_OPERATING_SYSTEMS.keys()))
+    start_time = _result_start_time(result_index)
+    c2s_start_time = start_time + datetime.timedelta(seconds=generator.uniform(
+        5, 15))
+    c2s_end_time = c2s_start_time + datetime.timedelta(
+        seconds=generator.uniform(10, 12))
+    s2c_start_time = c2s_end_time + datetime.timedelta(
+        seconds=generator.uniform(0, 0.1))
+    s2c_end_time = s2c_start_time + datetime.timedelta(
+        seconds=generator.uniform(10, 12))
+    end_time = s2c_end_time + datetime.timedelta(seconds=generator.uniform(0,
+                                                                           1))
+    result = {
+        'browser': browser,
+        'browser_version': generator.choice(_BROWSERS[browser]),
+        'client': generator.choice(_CLIENTS),
+        'client_version': None,
+        'os': os_name,
+        'os_version': generator.choice(_OPERATING_SYSTEMS[os_name]),
+        'start_time': start_time,
+        'end_time': end_time,
+        'c2s_start_time': c2s_start_time,
+        'c2s_end_time': c2s_end_time,
+        'c2s_throughput': round(
+            generator.lognormvariate(2.5, 1.0), 2),
+        's2c_start_time': s2c_start_time,
+        's2c_end_time': s2c_end_time,
+        's2c_throughput': round(
+            generator.lognormvariate(1.0, 1.0), 2),
+        'latency': round(
+            generator.uniform(10, 600), 1),
+        'errors': [],
+    }
+    if generator.random() < error_rate:
+        for field in ['c2s_end_time', 'c2s_throughput', 's2c_start_time',
+                      's2c_end_time', 's2c_throughput', 'latency']:
+            result[field] = None
+        result['errors'] = [{
+            'message': generator.choice(_ERROR_MESSAGES),
+            'timestamp': end_time,
+        }]
+    for field in _TIMESTAMP_FIELDS:
+        if generator.random() < missing_time_rate:
+            result[field] = None
+    return json.dumps(
+        result, default=_format_timestamp,
+        indent=2, sort_keys=True)
+
+
+def _format_timestamp(timestamp):
+    return timestamp.strftime(_TIMESTAMP_FORMAT)
+
+
+def _generate_log_lines(result_index):
+    """Generates client_wrapper log lines for a single NDT test."""
+    start_time = _result_start_time(result_index)
+    events = [(0, '__main__     INFO     starting iteration 1...'),
+              (0, 'html5_driver INFO     starting NDT HTML5 test'),
+              (5, 'html5_driver INFO     page loaded, starting UI flow'),
+              (10, 'html5_driver INFO     c2s test started'),
+              (21, 'html5_driver INFO     c2s test finished'),
+              (21, 'html5_driver INFO     s2c test started'),
+              (32, 'html5_driver INFO     s2c test finished'),
+              (33, 'html5_driver INFO     NDT HTML5 test ended')]
+    return ['%s,000 %s' % ((start_time + datetime.timedelta(
+        seconds=offset)).strftime(_LOG_TIMESTAMP_FORMAT), message)
+            for offset, message in events]
+
+
+def main(args):
+    result_count = generate_corpus(args.output_dir, args.raw_count,
+                                   args.package_count, args.results_per_package,
+                                   args.error_rate, args.missing_time_rate,
+                                   args.junk_count, args.seed)
+    print 'Wrote %d results to %s' % (result_count, args.output_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='Synthetic NDT result corpus generator',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--output-dir',
+                        required=True,
+                        help='Directory in which to write the corpus')
+    parser.add_argument('--raw-count',
+                        type=int,
+                        default=1000,
+                        help='Number of raw result files to write')
+    parser.add_argument('--package-count',
+                        type=int,
+                        default=100,
+                        help='Number of result packages to write')
+    parser.add_argument('--results-per-package',
+                        type=int,
+                        default=10,
+                        help='Number of result files in each package')
+    parser.add_argument('--error-rate',
+                        type=float,
+                        default=0.1,
+                        help='Fraction of results in which the test failed')
+    parser.add_argument('--missing-time-rate',
+                        type=float,
+                        default=0.05,
+                        help='Fraction of timestamps to omit from results')
+    parser.add_argument('--junk-count',
+                        type=int,
+                        default=1,
+                        help='Number of non-result files to write')
+    parser.add_argument('--seed',
+                        type=int,
+                        default=0,
+                        help='Seed for the random number generator')
+    main(parser.parse_args())
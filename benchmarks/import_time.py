@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measures how long each testmaster command-line tool takes to start.
+
+Imports each tool's module in a fresh interpreter, as running the tool does,
+and reports the time the import takes and which heavy dependencies it loads.
+Tools are often run on just a few files, so startup can dominate their run
+time. Python 2.7 has no -X importtime, so each import is timed as a whole.
+
+Run from the root of the repository:
+
+    python -m benchmarks.import_time
+"""
+
+import argparse
+import collections
+import os
+import subprocess
+import sys
+
+# Dependencies that are slow to import, so that tools should import them only
+# when an option needs them.
+HEAVY_MODULES = ('ndt_e2e_clientworker', 'numpy', 'pytz', 'sqlite3')
+TOOLS = ('json_to_csv', 'summarize', 'analyze_errors', 'compare', 'ingest',
+         'merge_partials', 'phase_timings')
+
+# The startup cost of a module. seconds is the shortest time taken to import
+# the module in a fresh interpreter, and heavy_modules is a sorted tuple of the
+# HEAVY_MODULES that importing it loads.
+ImportTime = collections.namedtuple('ImportTime',
+                                    ['module', 'seconds', 'heavy_modules'])
+
+_TESTMASTER_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'testmaster')
+# Imports a module as if it were the tool being run, then prints the time the
+# import took and the names of the heavy modules it loaded.
+_MEASURE_SCRIPT = """
+import sys
+import timeit
+sys.path.insert(0, %(testmaster_dir)r)
+start_time = timeit.default_timer()
+import %(module)s
+print timeit.default_timer() - start_time
+print ' '.join(sorted(set(name.split('.')[0]
+                          for name, loaded in sys.modules.items()
+                          if loaded and name.split('.')[0] in %(heavy)r)))
+"""
+
+
+def measure_import(module, repeat=5):
+    """Measures the time to import a testmaster module in a fresh interpreter.
+
+    Args:
+        module: The name of a module in the testmaster directory, such as
+            json_to_csv.
+        repeat: The number of times to import the module, each in a new
+            interpreter. The shortest time is reported.
+
+    Returns:
+        An ImportTime named tuple.
+
+    Raises:
+        subprocess.CalledProcessError: The module could not be imported.
+    """
+    script = _MEASURE_SCRIPT % {'testmaster_dir': _TESTMASTER_DIR,
+                                'module': module,
+                                'heavy': HEAVY_MODULES}
+    times = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', script])
+        seconds, heavy_modules = output.split('\n')[:2]
+        times.append(float(seconds))
+    return ImportTime(module, min(times), tuple(heavy_modules.split()))
+
+
+def main(args):
+    print '%-16s %12s  %s' % ('module', 'import (ms)', 'heavy modules')
+    for module in args.modules or TOOLS:
+        import_time = measure_import(module, args.repeat)
+        print '%-16s %12.1f  %s' % (module, import_time.seconds * 1000,
+                                    ', '.join(import_time.heavy_modules))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='testmaster import time benchmark',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('modules',
+                        nargs='*',
+                        help=('Modules to measure (default: every command-line '
+                              'tool)'))
+    parser.add_argument('--repeat',
+                        type=int,
+                        default=5,
+                        help='Number of times to import each module')
+    main(parser.parse_args())
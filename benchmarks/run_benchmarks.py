@@ -0,0 +1,204 @@
+#!/usr/bin/python
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measures how the NDT result conversion pipeline scales.
+
+Runs each stage of the pipeline (finding inputs, parsing results, converting
+them to CSV and aggregating them) over a corpus of result files and reports
+the wall time of each stage, throughput in results per second and the peak
+resident set size of the process so far. The peak is cumulative: it is the
+highest the process's memory use has been since it started, not during that
+stage alone, so a stage's peak reflects only its own memory use if it exceeds
+that of every stage before it.
+
+Run from the root of the repository:
+
+    python -m benchmarks.run_benchmarks --raw-count 10000 --package-count 1000
+"""
+
+import argparse
+import collections
+import contextlib
+import glob
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks import generate_corpus
+from testmaster import aggregate
+from testmaster import csv_convert
+from testmaster import read_results
+
+# The results of a benchmark stage. cumulative_peak_rss_kb is the peak resident
+# set size of the process from its start to the end of the stage.
+StageResult = collections.namedtuple(
+    'StageResult',
+    ['name', 'wall_time', 'results_per_second', 'cumulative_peak_rss_kb'])
+
+
+class StageTimer(object):
+    """Records the wall time and cumulative peak memory use of each stage."""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name, result_count):
+        """Times the enclosed block as a stage that processes results.
+
+        Args:
+            name: Name of the stage.
+            result_count: Number of results the stage processes, used to
+                calculate throughput.
+        """
+        start_time = time.time()
+        yield
+        wall_time = time.time() - start_time
+        results_per_second = result_count / wall_time if wall_time else None
+        self.stages.append(StageResult(name, wall_time, results_per_second,
+                                       _peak_rss_kb()))
+
+
+def _peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux, but in bytes on OS X.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss /= 1024
+    return peak_rss
+
+
+def run_benchmarks(corpus_dir, result_count, workers):
+    """Runs each stage of the conversion pipeline over a corpus.
+
+    Args:
+        corpus_dir: Directory containing the corpus of result files.
+        result_count: Number of results in the corpus.
+        workers: Number of processes to use to parse results.
+
+    Returns:
+        A list of StageResult named tuples, one per stage, in the order the
+        stages ran.
+    """
+    timer = StageTimer()
+    with timer.stage('glob', result_count):
+        result_paths = glob.glob(os.path.join(corpus_dir, '*'))
+    # Runs before parse_files so that its peak RSS is not masked by that of
+    # full NdtResults, as peaks are cumulative.
+    with timer.stage('parse_compact_files', result_count):
+        compact_results = read_results.parse_compact_files(result_paths,
+                                                           workers)
+    del compact_results
+    with timer.stage('parse_files', result_count):
+        results = read_results.parse_files(result_paths, workers)
+    with timer.stage('parse_fields', result_count):
+        records = read_results.parse_fields(result_paths,
+                                            csv_convert.CSV_FIELDS, workers)
+    with timer.stage('ndt_fields_to_csv', result_count):
+        csv_convert.ndt_fields_to_csv(records)
+    del records
+    with timer.stage('ndt_results_to_csv', result_count):
+        csv_convert.ndt_results_to_csv(results)
+    with timer.stage('aggregate', result_count):
+        aggregate.aggregate([result.s2c_result.throughput
+                             for result in results.itervalues()])
+        aggregate.aggregate([result.c2s_result.throughput
+                             for result in results.itervalues()])
+        aggregate.aggregate([result.latency for result in results.itervalues()])
+    del results
+    with open(os.devnull, 'w') as null_file:
+        with timer.stage('stream_to_csv', result_count):
+            results = read_results.iter_results(sorted(result_paths), workers)
+            csv_convert.write_ndt_results_csv(results, null_file)
+    return timer.stages
+
+
+def _print_report(stages, output_file):
+    output_file.write('%-20s %12s %14s %24s\n' %
+                      ('stage', 'wall time (s)', 'results/s',
+                       'cumulative peak RSS (KB)'))
+    for stage in stages:
+        output_file.write('%-20s %12.3f %14.1f %24d\n' %
+                          (stage.name, stage.wall_time,
+                           stage.results_per_second or 0.0,
+                           stage.cumulative_peak_rss_kb))
+
+
+def main(args):
+    corpus_dir = args.corpus
+    temp_dir = None
+    if not corpus_dir:
+        temp_dir = tempfile.mkdtemp()
+        corpus_dir = temp_dir
+        result_count = generate_corpus.generate_corpus(
+            corpus_dir, args.raw_count, args.package_count,
+            args.results_per_package, args.error_rate, args.missing_time_rate)
+    else:
+        result_count = len(read_results.parse_files(glob.glob(os.path.join(
+            corpus_dir, '*'))))
+    try:
+        stages = run_benchmarks(corpus_dir, result_count, args.jobs)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir)
+    if args.json:
+        json.dump(
+            {'result_count': result_count,
+             'stages': [stage._asdict() for stage in stages]},
+            sys.stdout,
+            indent=2)
+        sys.stdout.write('\n')
+    else:
+        print 'Benchmarked %d results' % result_count
+        _print_report(stages, sys.stdout)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='NDT result pipeline benchmarks',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--corpus',
+                        help=('Directory of result files to benchmark. If not '
+                              'specified, a synthetic corpus is generated'))
+    parser.add_argument('--raw-count',
+                        type=int,
+                        default=1000,
+                        help='Number of raw result files to generate')
+    parser.add_argument('--package-count',
+                        type=int,
+                        default=100,
+                        help='Number of result packages to generate')
+    parser.add_argument('--results-per-package',
+                        type=int,
+                        default=10,
+                        help='Number of result files in each package')
+    parser.add_argument('--error-rate',
+                        type=float,
+                        default=0.1,
+                        help='Fraction of generated results that failed')
+    parser.add_argument('--missing-time-rate',
+                        type=float,
+                        default=0.05,
+                        help='Fraction of timestamps to omit from results')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of processes to use to parse results')
+    parser.add_argument('--json',
+                        action='store_true',
+                        help='Print results as JSON')
+    main(parser.parse_args())
@@ -12,13 +12,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import array
 import collections
+import math
 
-import numpy
+# numpy is imported by the functions that need it rather than here. Summaries
+# of a few results (such as those of a single upload) never do, and importing
+# numpy would otherwise dominate their run time.
 
 Aggregates = collections.namedtuple('Aggregates',
                                     ['minimum', 'maximum', 'mean', 'median',
                                      'standard_deviation', 'sample_count'])
+Quantiles = collections.namedtuple('Quantiles', ['p50', 'p90', 'p95', 'p99'])
+
+_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+# Size parameter (k) of the KLL sketch used by RunningAggregate. The sketch
+# holds at most about 3k values, and its rank error is roughly 1/k.
+_SKETCH_SIZE = 200
+# Ratio between the capacities of adjacent compactors of a KLL sketch.
+_CAPACITY_DECAY = 2.0 / 3.0
+# Statistics of fewer values than this are calculated in pure Python. numpy sums
+# fewer than 8 values sequentially, so the results are identical.
+_SMALL_SAMPLE_COUNT = 8
 
 
 def aggregate(values):
@@ -33,9 +48,314 @@ def aggregate(values):
         specified values.
     """
     samples = [x for x in values if x is not None]
+    if 0 < len(samples) < _SMALL_SAMPLE_COUNT:
+        return _aggregate_small(samples)
+    import numpy
     return Aggregates(minimum=min(samples),
                       maximum=max(samples),
                       mean=numpy.mean(samples),
                       median=numpy.median(samples),
                       standard_deviation=numpy.std(samples),
                       sample_count=len(samples))
+
+
+def aggregate_array(values):
+    """Calculates aggregate statistics for a NumPy array of numeric values.
+
+    Vectorized equivalent of aggregate for columns of a ResultTable.
+
+    Args:
+        values: A NumPy array of numeric values for which to calculate aggregate
+            statistics. Entries in the array that are NaN are ignored.
+
+    Returns:
+        An Aggregates named tuple representing aggregate statistics for the
+        specified values.
+    """
+    import numpy
+    samples = values[~numpy.isnan(values)]
+    return Aggregates(minimum=samples.min(),
+                      maximum=samples.max(),
+                      mean=samples.mean(),
+                      median=numpy.median(samples),
+                      standard_deviation=samples.std(),
+                      sample_count=len(samples))
+
+
+def _aggregate_small(samples):
+    """Calculates aggregate statistics for a few values, as numpy does.
+
+    Matches aggregate in every bit: the mean and variance are summed in the
+    same order as numpy sums fewer than _SMALL_SAMPLE_COUNT values.
+    """
+    count = len(samples)
+    mean = _sum(samples) / count
+    standard_deviation = math.sqrt(
+        _sum([(x - mean) * (x - mean) for x in samples]) / count)
+    return Aggregates(minimum=min(samples),
+                      maximum=max(samples),
+                      mean=mean,
+                      median=_median(sorted(samples)),
+                      standard_deviation=standard_deviation,
+                      sample_count=count)
+
+
+def _sum(values):
+    total = 0.0
+    for value in values:
+        total += value
+    return total
+
+
+def _median(samples):
+    """Returns the median of a non-empty sorted list, as numpy.median does."""
+    middle = len(samples) // 2
+    if len(samples) % 2:
+        return float(samples[middle])
+    return (samples[middle - 1] + samples[middle]) / 2.0
+
+
+class RunningAggregate(object):
+    """Calculates aggregate statistics for a stream of values in one pass.
+
+    Running aggregates can be merged, so values may be aggregated separately
+    (for example, in different worker processes or from different files) and
+    then combined.
+
+    By default, values are not kept in memory. The minimum, maximum, mean and
+    standard deviation are exact (the mean and variance are updated with
+    Welford's algorithm), and quantiles, including the median, are estimated
+    with a KLL sketch of bounded size. The estimates are exact until the sketch
+    first fills, after a few hundred values.
+
+    In exact mode, every value is kept and the values are sorted before
+    statistics are calculated, so that statistics match those of aggregate for
+    the sorted values and do not depend, even in the last bit, on the order in
+    which values were added or merged.
+    """
+
+    def __init__(self, exact=False):
+        """Creates an empty RunningAggregate.
+
+        Args:
+            exact: If True, keeps every value so that the median and quantiles
+                are exact.
+        """
+        self._count = 0
+        self._minimum = None
+        self._maximum = None
+        self._mean = 0.0
+        self._sum_squared_deviations = 0.0
+        if exact:
+            self._values = array.array('d')
+            self._sketch = None
+        else:
+            self._values = None
+            self._sketch = _KllSketch()
+
+    def add(self, value):
+        """Adds a value to the aggregate.
+
+        Args:
+            value: A numeric value. If None, the value is ignored.
+        """
+        if value is None:
+            return
+        self._count += 1
+        if self._count == 1:
+            self._minimum = value
+            self._maximum = value
+        else:
+            self._minimum = min(self._minimum, value)
+            self._maximum = max(self._maximum, value)
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._sum_squared_deviations += delta * (value - self._mean)
+        if self._sketch:
+            self._sketch.add(value)
+        else:
+            self._values.append(value)
+
+    def add_array(self, values):
+        """Adds a NumPy array of values to the aggregate.
+
+        Equivalent to calling add for each value, but the moments of the array
+        are calculated with vectorized operations and then merged.
+
+        Args:
+            values: A NumPy array of numeric values. Entries that are NaN are
+                ignored.
+        """
+        import numpy
+        samples = values[~numpy.isnan(values)]
+        if not len(samples):
+            return
+        batch = RunningAggregate(exact=self._sketch is None)
+        batch._count = len(samples)
+        batch._minimum = float(samples.min())
+        batch._maximum = float(samples.max())
+        batch._mean = float(samples.mean())
+        batch._sum_squared_deviations = float(numpy.square(samples -
+                                                           batch._mean).sum())
+        if batch._sketch:
+            for value in samples.tolist():
+                batch._sketch.add(value)
+        else:
+            batch._values.extend(samples.tolist())
+        self.merge(batch)
+
+    def merge(self, other):
+        """Adds all the values of another RunningAggregate to this aggregate.
+
+        Args:
+            other: A RunningAggregate created with the same value of exact.
+
+        Raises:
+            ValueError: other is in exact mode and this aggregate is not, or
+                vice versa.
+        """
+        if (self._sketch is None) != (other._sketch is None):
+            raise ValueError('Cannot merge exact and approximate aggregates')
+        if not other._count:
+            return
+        if not self._count:
+            self._minimum = other._minimum
+            self._maximum = other._maximum
+        else:
+            self._minimum = min(self._minimum, other._minimum)
+            self._maximum = max(self._maximum, other._maximum)
+        # Combine means and variances as described by Chan et al. (1979).
+        count = self._count + other._count
+        delta = other._mean - self._mean
+        self._sum_squared_deviations += (
+            other._sum_squared_deviations + delta * delta * self._count *
+            other._count / count)
+        self._mean += delta * other._count / count
+        self._count = count
+        if self._sketch:
+            self._sketch.merge(other._sketch)
+        else:
+            self._values.extend(other._values)
+
+    def result(self):
+        """Returns an Aggregates named tuple for the values added so far.
+
+        If no values have been added, every statistic except sample_count is
+        None.
+        """
+        if not self._count:
+            return Aggregates(minimum=None,
+                              maximum=None,
+                              mean=None,
+                              median=None,
+                              standard_deviation=None,
+                              sample_count=0)
+        if self._values is not None:
+            return aggregate(sorted(self._values))
+        return Aggregates(minimum=self._minimum,
+                          maximum=self._maximum,
+                          mean=self._mean,
+                          median=self._sketch.quantile(0.5),
+                          standard_deviation=math.sqrt(
+                              self._sum_squared_deviations / self._count),
+                          sample_count=self._count)
+
+    def quantiles(self):
+        """Returns a Quantiles named tuple for the values added so far.
+
+        If no values have been added, every quantile is None.
+        """
+        if not self._count:
+            return Quantiles(*([None] * len(_QUANTILES)))
+        if self._values is not None:
+            import numpy
+            return Quantiles(*numpy.percentile(self._values, [
+                quantile * 100 for quantile in _QUANTILES
+            ]))
+        return Quantiles(* [self._sketch.quantile(quantile)
+                            for quantile in _QUANTILES])
+
+
+class _KllSketch(object):
+    """Estimates quantiles of a stream of values in bounded memory.
+
+    Implements the KLL sketch (Karnin, Lang and Liberty, 2016). Values are kept
+    in a hierarchy of compactors, where each value at height h stands for 2^h
+    of the original values. When a compactor is full, it is sorted and every
+    other value is promoted to the compactor above it. Compactors alternate
+    between promoting odd and even positions, which keeps the sketch
+    deterministic so that merged results are reproducible.
+    """
+
+    def __init__(self, k=_SKETCH_SIZE):
+        self._k = k
+        self._compactors = []
+        self._offsets = []
+        self._size = 0
+        self._max_size = 0
+        self._grow()
+
+    def add(self, value):
+        self._compactors[0].append(value)
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def merge(self, other):
+        while len(self._compactors) < len(other._compactors):
+            self._grow()
+        for height, compactor in enumerate(other._compactors):
+            self._compactors[height].extend(compactor)
+        self._size = sum(len(compactor) for compactor in self._compactors)
+        while self._size >= self._max_size:
+            self._compress()
+
+    def quantile(self, quantile):
+        # Until the first compaction, every value is still in the sketch.
+        if len(self._compactors) == 1:
+            if (quantile == 0.5 and
+                    len(self._compactors[0]) < _SMALL_SAMPLE_COUNT):
+                return _median(sorted(self._compactors[0]))
+            import numpy
+            return numpy.percentile(self._compactors[0], quantile * 100)
+        weighted_values = []
+        for height, compactor in enumerate(self._compactors):
+            weight = 1 << height
+            weighted_values.extend((value, weight) for value in compactor)
+        weighted_values.sort()
+        total_weight = sum(weight for _, weight in weighted_values)
+        target_weight = quantile * total_weight
+        cumulative_weight = 0
+        for value, weight in weighted_values:
+            cumulative_weight += weight
+            if cumulative_weight >= target_weight:
+                return value
+        return weighted_values[-1][0]
+
+    def _grow(self):
+        self._compactors.append([])
+        self._offsets.append(0)
+        self._max_size = sum(self._capacity(height)
+                             for height in range(len(self._compactors)))
+
+    def _capacity(self, height):
+        depth = len(self._compactors) - height - 1
+        return int(math.ceil(self._k * _CAPACITY_DECAY**depth)) + 1
+
+    def _compress(self):
+        for height in range(len(self._compactors)):
+            compactor = self._compactors[height]
+            if len(compactor) < self._capacity(height):
+                continue
+            if height + 1 == len(self._compactors):
+                self._grow()
+            compactor.sort()
+            # An odd value out stays in this compactor.
+            kept = [compactor.pop()] if len(compactor) % 2 else []
+            self._compactors[height + 1].extend(compactor[self._offsets[
+                height]::2])
+            self._offsets[height] ^= 1
+            self._compactors[height] = kept
+            self._size = sum(len(c) for c in self._compactors)
+            if self._size < self._max_size:
+                break
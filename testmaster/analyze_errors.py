@@ -0,0 +1,78 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Reports the errors that occurred in a corpus of NDT results.
+
+Given a pattern of files, finds the NDT result files (JSON) or result packages
+(zips of JSON), indexes the errors of every result in a single pass and writes a
+CSV of how often each error occurred, of error rates for each browser, OS and
+client, or of how often pairs of errors occurred together. Alternatively, lists
+the results in which a given error occurred.
+"""
+
+import argparse
+import glob
+import sys
+
+import error_index
+import field_decoder
+import read_results
+import result_table
+
+_REPORT_WRITERS = {
+    'counts': error_index.write_counts_csv,
+    'rates': error_index.write_rates_csv,
+    'cooccurrence': error_index.write_cooccurrence_csv,
+}
+
+
+def main(args):
+    rate_fields = [field for field in args.rate_fields.split(',') if field]
+    index = error_index.ErrorIndex(rate_fields)
+    result_paths = sorted(glob.glob(args.pattern))
+    index.add_records(read_results.iter_fields(result_paths,
+                                               field_decoder.FIELDS, args.jobs))
+    if args.results_with is not None:
+        for result_id in index.results_with(args.results_with):
+            print index.filenames[result_id]
+        return
+    _REPORT_WRITERS[args.report](index, sys.stdout)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='NDT Result error analyzer',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--pattern',
+                        required=True,
+                        help="Glob pattern of input files")
+    parser.add_argument('--report',
+                        choices=sorted(_REPORT_WRITERS.keys()),
+                        default='counts',
+                        help=('Report to write: the number of results with '
+                              'each error, error rates by --rate-fields, or '
+                              'the number of results with each pair of errors'))
+    parser.add_argument('--rate-fields',
+                        default=','.join(error_index.RATE_FIELDS),
+                        help=('Comma-separated list of fields by which to '
+                              'break down error rates (any of %s)' %
+                              ', '.join(result_table.CATEGORICAL_COLUMNS)))
+    parser.add_argument('--results-with',
+                        metavar='MESSAGE',
+                        help=('Instead of a report, list the filenames of the '
+                              'results in which this error occurred'))
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of processes to use to parse input files')
+    main(parser.parse_args())
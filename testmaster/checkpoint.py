@@ -0,0 +1,245 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Converts NDT results to CSV in resumable, fault-isolated batches.
+
+Input paths are converted in batches of a fixed number of inputs. After each
+batch, its rows are appended to the output CSV and a checkpoint recording the
+number of inputs done and the length of the output is appended to a journal.
+The output and journal are synced to disk once per batch, not once per input.
+A run that is interrupted resumes from its last checkpoint: the output is
+truncated to the length recorded there, discarding any rows written after it,
+and conversion continues with the next input.
+
+Inputs that cannot be read or decoded, such as corrupt JSON or truncated result
+packages, are quarantined: their paths and errors are written to a separate
+report rather than aborting the run. Each batch is converted with a single
+exception handler; only a batch that fails is converted again one input at a
+time, to find which of its inputs are bad.
+
+The journal is a text file of JSON objects, one per line. The first describes
+the inputs, so that a journal is never used to resume a run over different
+inputs, and each other line is a checkpoint.
+"""
+
+import collections
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+
+import csv_convert
+import pipeline_stats
+import read_results
+
+# Version of the journal format.
+_JOURNAL_VERSION = 1
+_QUARANTINE_HEADER = ['path', 'error']
+
+# The progress of a conversion, as of the end of a batch. inputs_done is the
+# number of input paths converted (or quarantined), and output_bytes and
+# quarantine_bytes are the lengths of the output CSV and quarantine report
+# after their rows.
+Checkpoint = collections.namedtuple(
+    'Checkpoint', ['inputs_done', 'output_bytes', 'quarantine_bytes'])
+
+
+def convert(result_paths,
+            output_path,
+            journal_path,
+            quarantine_path,
+            batch_size=1000,
+            workers=1):
+    """Converts NDT result files to a CSV, resuming from a journal if present.
+
+    The CSV has a row for each result in input path order, as
+    csv_convert.write_ndt_fields_csv writes for read_results.iter_fields.
+
+    Args:
+        result_paths: A list of paths to NDT result files to convert.
+        output_path: Path of the CSV to write.
+        journal_path: Path of the checkpoint journal. If it exists, conversion
+            resumes from its last checkpoint; otherwise it is created and
+            conversion starts from the first input.
+        quarantine_path: Path of the CSV report of quarantined inputs, with
+            the path of each and the error it raised.
+        batch_size: The number of inputs to convert between checkpoints.
+        workers: The number of processes to use to convert batches.
+
+    Raises:
+        ValueError: The journal was written for different inputs, or the
+            output or quarantine report is shorter than its last checkpoint.
+    """
+    header = _journal_header(result_paths)
+    checkpoint, journal_bytes = _read_journal(journal_path, header)
+    pipeline_stats.count('inputs_resumed', checkpoint.inputs_done)
+    batches = [result_paths[start:start + batch_size]
+               for start in range(checkpoint.inputs_done, len(result_paths),
+                                  batch_size)]
+    with open_at(journal_path, journal_bytes) as journal_file:
+        if not journal_file.tell():
+            _append(journal_file, header)
+        with open_at(output_path, checkpoint.output_bytes) as output_file:
+            if not output_file.tell():
+                csv_convert.write_csv_header(output_file)
+            with open_at(quarantine_path,
+                         checkpoint.quarantine_bytes) as quarantine_file:
+                _write_batches(batches, workers, checkpoint.inputs_done,
+                               output_file, quarantine_file, journal_file)
+
+
+def _write_batches(batches, workers, inputs_done, output_file, quarantine_file,
+                   journal_file):
+    """Converts batches of inputs, checkpointing after each one."""
+    quarantine_writer = csv.writer(quarantine_file)
+    if not quarantine_file.tell():
+        quarantine_writer.writerow(_QUARANTINE_HEADER)
+    for batch, (lines, failures) in itertools.izip(
+            batches, _iter_converted_batches(batches, workers)):
+        output_file.writelines(lines)
+        quarantine_writer.writerows(failures)
+        pipeline_stats.count('rows_written', len(lines))
+        pipeline_stats.count('inputs_quarantined', len(failures))
+        inputs_done += len(batch)
+        with pipeline_stats.timer('checkpoint'):
+            # The journal is synced last, so that a checkpoint never refers to
+            # rows that are not on disk.
+            sync(output_file)
+            sync(quarantine_file)
+            _append(journal_file, Checkpoint(inputs_done, output_file.tell(),
+                                             quarantine_file.tell())._asdict())
+            sync(journal_file)
+        pipeline_stats.count('checkpoints_written')
+
+
+def _iter_converted_batches(batches, workers):
+    """Yields the result of _convert_batch for each batch, in order."""
+    if workers <= 1:
+        for batch in batches:
+            yield _convert_batch(batch)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        for converted in pool.imap(_convert_batch, batches):
+            yield converted
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _convert_batch(result_paths):
+    """Converts a batch of inputs to CSV rows (may run in a worker process).
+
+    Returns:
+        A (lines, failures) tuple, where lines is a list of the CSV rows of the
+        batch's results, in order, and failures is a list of (path, error)
+        tuples for each input that could not be converted.
+    """
+    try:
+        return _convert_paths(result_paths), []
+    except read_results.INPUT_ERRORS:
+        pass
+    lines = []
+    failures = []
+    for result_path in result_paths:
+        try:
+            lines.extend(_convert_paths([result_path]))
+        except read_results.INPUT_ERRORS as e:
+            failures.append((result_path, '%s: %s' % (type(e).__name__, e)))
+    return lines, failures
+
+
+def _convert_paths(result_paths):
+    formatter = csv_convert.RowFormatter()
+    return [formatter.format_fields(filename, fields)
+            for filename, fields in read_results.iter_fields(
+                result_paths, csv_convert.CSV_FIELDS)]
+
+
+def _journal_header(result_paths):
+    digest = hashlib.sha1()
+    for result_path in result_paths:
+        digest.update(result_path + '\n')
+    return {'version': _JOURNAL_VERSION,
+            'inputs': len(result_paths),
+            'digest': digest.hexdigest()}
+
+
+def _read_journal(journal_path, header):
+    """Reads the last checkpoint in a journal.
+
+    A final line without a newline was cut short by an interruption and is
+    ignored.
+
+    Returns:
+        A (checkpoint, length) tuple, where checkpoint is the last Checkpoint
+        in the journal, or Checkpoint(0, 0, 0) if there is none, and length is
+        the number of bytes of complete lines in the journal.
+
+    Raises:
+        ValueError: The journal was written for inputs other than those
+            described by header.
+    """
+    checkpoint = Checkpoint(0, 0, 0)
+    if not os.path.exists(journal_path):
+        return checkpoint, 0
+    length = 0
+    with open(journal_path, 'rb') as journal_file:
+        for index, line in enumerate(journal_file):
+            if not line.endswith('\n'):
+                break
+            entry = json.loads(line)
+            if index == 0:
+                if entry != header:
+                    raise ValueError('Checkpoint journal %s was written for '
+                                     'different inputs' % journal_path)
+            else:
+                checkpoint = Checkpoint(**entry)
+            length += len(line)
+    return checkpoint, length
+
+
+def open_at(path, size):
+    """Opens a file for appending, truncated to size bytes.
+
+    Args:
+        path: Path of the file to open. It is created if it does not exist.
+        size: The length to which to truncate the file, as recorded by a
+            checkpoint.
+
+    Returns:
+        The open file, positioned at its end.
+
+    Raises:
+        ValueError: The file is shorter than size bytes.
+    """
+    output_file = open(path, 'ab')
+    if os.fstat(output_file.fileno()).st_size < size:
+        output_file.close()
+        raise ValueError('%s is shorter than its last checkpoint' % path)
+    output_file.truncate(size)
+    output_file.seek(0, os.SEEK_END)
+    return output_file
+
+
+def _append(journal_file, entry):
+    journal_file.write(json.dumps(entry, sort_keys=True) + '\n')
+
+
+def sync(output_file):
+    """Flushes a file and syncs its contents to disk."""
+    output_file.flush()
+    os.fsync(output_file.fileno())
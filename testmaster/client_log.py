@@ -0,0 +1,266 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Extracts the timing of each phase of an NDT test from client_wrapper logs.
+
+Result packages hold client_wrapper logs next to the raw results. Each test
+iteration logs lines such as:
+
+    2016-05-24 19:16:22,161 html5_driver INFO     c2s test started
+
+interleaved with lines that are irrelevant here (such as the raw result JSON
+that the client_wrapper prints). Logs are parsed a line at a time, so a log is
+never held in memory. Each line is first checked for a few substrings that
+every interesting message contains, and only lines that pass are matched
+against the log line regular expression.
+
+The client_wrapper logs in the local time of the host that ran the test,
+without a time zone, while result start times are in UTC. Log times are
+converted to UTC with a fixed offset, which is zero by default; that is, by
+default the hosts are assumed to keep their clocks in UTC.
+
+The events of each iteration give the duration of each phase in PHASES. An
+iteration's timings are linked to the raw result in the same package whose
+start time falls within the iteration.
+"""
+
+import bisect
+import collections
+import operator
+import re
+
+import field_decoder
+import read_results
+import result_package
+import timestamps
+
+# Phases of a test, in order, and the events that start and end each phase.
+# tests_start and tests_end are the start of the first and the end of the last
+# of the c2s and s2c tests, which run in a different order in each client.
+PHASES = collections.OrderedDict([
+    ('browser_launch', ('test_start', 'page_load_start')),
+    ('page_load', ('page_load_start', 'page_loaded')),
+    ('ui_flow', ('page_loaded', 'start_clicked')),
+    ('test_setup', ('start_clicked', 'tests_start')),
+    ('c2s', ('c2s_start', 'c2s_end')),
+    ('s2c', ('s2c_start', 's2c_end')),
+    ('teardown', ('tests_end', 'test_end')),
+    ('total', ('iteration_start', 'test_end')),
+])
+
+# An event in a client_wrapper log. timestamp_us is in microseconds since the
+# epoch (UTC, once the log's offset from UTC is applied) and kind is one of the
+# event names in PHASES (other than tests_start and tests_end).
+LogEvent = collections.namedtuple('LogEvent', ['timestamp_us', 'kind'])
+# The phase timings of one test iteration. start_us and end_us are the times of
+# the iteration's first and last events, and timings is a dictionary of the
+# duration of each phase in PHASES, in seconds, or None if the iteration did
+# not log the phase's start or end.
+IterationTimings = collections.namedtuple('IterationTimings',
+                                          ['start_us', 'end_us', 'timings'])
+
+# Every message that marks an event contains at least one of these.
+_MARKERS = ('test', 'iteration', 'loading URL', 'page loaded', 'clicked')
+_LINE_PATTERN = re.compile(r'(\d{4}-\d\d-\d\d) (\d\d:\d\d:\d\d),(\d{3}) '
+                           r'\S+\s+[A-Z]+\s+(.*?)\s*$')
+# Messages of each kind of event, by exact message or by prefix and suffix.
+_MESSAGES = {
+    'c2s test started': 'c2s_start',
+    'c2s test finished': 'c2s_end',
+    'c2s test ended': 'c2s_end',
+    's2c test started': 's2c_start',
+    's2c test finished': 's2c_end',
+    's2c test ended': 's2c_end',
+    'page loaded, starting UI flow': 'page_loaded',
+}
+_PREFIXES = (('starting iteration', 'iteration_start'),
+             ('loading URL', 'page_load_start'), ('clicked', 'start_clicked'))
+# Log timestamps have millisecond precision, so a result may appear to start up
+# to a millisecond before its iteration.
+_TOLERANCE_US = 1000
+_MICROSECONDS_PER_SECOND = 1e6
+_START_TIME = frozenset(['start_time'])
+
+
+def is_client_log(name):
+    """Indicates whether a package member name looks like a client_wrapper log.
+
+    Args:
+        name: The full name of a package member.
+
+    Returns:
+        True if the member's basename starts with client_wrapper and ends with
+        .log.
+    """
+    basename = name.rsplit('/', 1)[-1]
+    return basename.startswith('client_wrapper') and basename.endswith('.log')
+
+
+def iter_events(lines, utc_offset_us=0):
+    """Parses the events in the lines of a client_wrapper log.
+
+    Args:
+        lines: An iterable of the lines of a log, such as an open file.
+        utc_offset_us: The offset from UTC of the local time in which the log
+            was written, in microseconds (negative west of UTC).
+
+    Yields:
+        A LogEvent for each line that records an event, in log order.
+    """
+    for line in lines:
+        if not any(marker in line for marker in _MARKERS):
+            continue
+        match = _LINE_PATTERN.match(line)
+        if not match:
+            continue
+        kind = _event_kind(match.group(4))
+        if kind:
+            date, time, milliseconds = match.group(1, 2, 3)
+            local_time_us = timestamps.iso8601_to_us('%sT%s.%sZ' %
+                                                     (date, time, milliseconds))
+            yield LogEvent(local_time_us - utc_offset_us, kind)
+
+
+def iter_iteration_timings(events):
+    """Calculates the phase timings of each test iteration in a log.
+
+    Args:
+        events: An iterable of LogEvents, as yielded by iter_events.
+
+    Yields:
+        An IterationTimings for each iteration, in log order. Events before the
+        first iteration starts are ignored.
+    """
+    iteration_events = None
+    for event in events:
+        if event.kind == 'iteration_start':
+            if iteration_events:
+                yield _timings(iteration_events)
+            iteration_events = []
+        if iteration_events is not None:
+            iteration_events.append(event)
+    if iteration_events:
+        yield _timings(iteration_events)
+
+
+def link_timings(start_times, iterations):
+    """Finds the iteration in which each result ran.
+
+    Args:
+        start_times: A list of the start time of each result, in microseconds
+            since the epoch, or None.
+        iterations: A list of IterationTimings.
+
+    Returns:
+        A list with an entry for each result: the timings dictionary of the
+        latest iteration that started before the result and ended after it
+        started, or None if there is no such iteration.
+    """
+    iterations = sorted(iterations, key=operator.attrgetter('start_us'))
+    starts = [iteration.start_us for iteration in iterations]
+    # The latest end of each iteration and those that started before it, so
+    # that the search for an iteration that ended after a result started can
+    # stop as soon as no earlier iteration could have.
+    latest_ends = []
+    latest_end = float('-inf')
+    for iteration in iterations:
+        latest_end = max(latest_end, iteration.end_us)
+        latest_ends.append(latest_end)
+    linked = []
+    for start_time in start_times:
+        timings = None
+        if start_time is not None:
+            index = bisect.bisect_right(starts, start_time + _TOLERANCE_US) - 1
+            while index >= 0 and (
+                    latest_ends[index] + _TOLERANCE_US >= start_time):
+                if iterations[index].end_us + _TOLERANCE_US >= start_time:
+                    timings = iterations[index].timings
+                    break
+                index -= 1
+        linked.append(timings)
+    return linked
+
+
+def iter_phase_timings(result_paths, utc_offset_us=0):
+    """Reads the phase timings of the results in result packages.
+
+    Every client_wrapper log in each package is parsed a line at a time, and
+    each raw result in the package is linked to the iteration in which it ran.
+
+    Args:
+        result_paths: An iterable of paths to NDT result files. Paths that are
+            not result packages are ignored.
+        utc_offset_us: The offset from UTC of the local time in which the logs
+            were written, in microseconds (see iter_events).
+
+    Yields:
+        A (filename, timings) tuple for each raw result in each package, where
+        filename is the basename of the raw result file and timings is a
+        dictionary of the duration of each phase in PHASES in seconds (or None),
+        or None if no log iteration matches the result.
+    """
+    for result_path in result_paths:
+        if not result_package.looks_like_package(result_path):
+            continue
+        iterations = []
+        for log_name in result_package.member_names(result_path, is_client_log):
+            iterations.extend(iter_iteration_timings(iter_events(
+                result_package.iter_member_lines(result_path,
+                                                 log_name), utc_offset_us)))
+        filenames = []
+        start_times = []
+        for source, contents in read_results.iter_raw_results([result_path]):
+            filenames.append(source.filename)
+            start_times.append(field_decoder.decode_fields(
+                contents, _START_TIME)['start_time'])
+        for filename, timings in zip(filenames,
+                                     link_timings(start_times, iterations)):
+            yield filename, timings
+
+
+def _event_kind(message):
+    kind = _MESSAGES.get(message)
+    if kind:
+        return kind
+    for prefix, prefix_kind in _PREFIXES:
+        if message.startswith(prefix):
+            return prefix_kind
+    if message.startswith('starting ') and message.endswith(' test'):
+        return 'test_start'
+    if message.endswith(' test ended'):
+        return 'test_end'
+    return None
+
+
+def _timings(events):
+    """Returns the IterationTimings of the events of one iteration."""
+    event_times = {}
+    for event in events:
+        event_times.setdefault(event.kind, event.timestamp_us)
+    test_starts = [event_times[kind] for kind in ('c2s_start', 's2c_start')
+                   if kind in event_times]
+    test_ends = [event_times[kind] for kind in ('c2s_end', 's2c_end')
+                 if kind in event_times]
+    if test_starts:
+        event_times['tests_start'] = min(test_starts)
+    if test_ends:
+        event_times['tests_end'] = max(test_ends)
+    timings = {}
+    for phase, (start_kind, end_kind) in PHASES.iteritems():
+        timings[phase] = None
+        if start_kind in event_times and end_kind in event_times:
+            timings[phase] = (
+                event_times[end_kind] -
+                event_times[start_kind]) / _MICROSECONDS_PER_SECOND
+    return IterationTimings(events[0].timestamp_us, events[-1].timestamp_us,
+                            timings)
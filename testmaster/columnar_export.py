@@ -0,0 +1,160 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Exports a ResultTable to typed, binary columnar formats.
+
+Unlike the CSV summary, columnar exports keep full precision and types, so
+they can be loaded for analysis without parsing text:
+
+  * Throughputs, latency and durations are float64, with NaN (NumPy) or null
+    (Parquet) for missing values.
+  * Timestamps are int64 microseconds since the epoch (NumPy) or UTC
+    microsecond timestamps (Parquet).
+  * String fields such as browser, os and client are dictionary-encoded.
+  * Each result's errors are a list of error messages.
+
+NumPy .npz export has no extra dependencies. Parquet export requires pyarrow.
+"""
+
+import numpy
+
+import result_table
+
+_DURATION_COLUMNS = ('total_duration', 'c2s_duration', 's2c_duration')
+
+
+def write_npz(table, output_path):
+    """Writes a ResultTable to an uncompressed NumPy .npz archive.
+
+    The archive holds one array per column: 'filename', each column in
+    result_table.FLOAT_COLUMNS and result_table.TIME_COLUMNS, and the
+    'total_duration', 'c2s_duration' and 's2c_duration' columns. Each
+    categorical column NAME is stored as 'NAME_codes' (int32, with -1 for a
+    missing value) and 'NAME_categories'. Errors are stored as 'error_codes',
+    'error_offsets' and 'error_messages', as in ResultTable.
+
+    Args:
+        table: A ResultTable to export.
+        output_path: Path of the .npz file to write.
+    """
+    arrays = {'filename': _string_array(table.filenames)}
+    arrays.update(table.columns)
+    for name in _DURATION_COLUMNS:
+        arrays[name] = getattr(table, name)()
+    for name, categorical in table.categoricals.iteritems():
+        codes, categories = _without_null_category(categorical)
+        arrays[name + '_codes'] = codes
+        arrays[name + '_categories'] = _string_array(categories)
+    arrays['error_codes'] = table.error_codes
+    arrays['error_offsets'] = table.error_offsets
+    arrays['error_messages'] = _string_array(table.error_messages)
+    numpy.savez(output_path, **arrays)
+
+
+def read_npz(input_path):
+    """Loads a ResultTable from a .npz archive written by write_npz.
+
+    Args:
+        input_path: Path of the .npz file to read.
+
+    Returns:
+        A ResultTable with the contents of the archive.
+    """
+    archive = numpy.load(input_path)
+    try:
+        columns = {}
+        for name in result_table.FLOAT_COLUMNS + result_table.TIME_COLUMNS:
+            columns[name] = archive[name]
+        categoricals = {}
+        for name in result_table.CATEGORICAL_COLUMNS:
+            categoricals[name] = _with_null_category(
+                archive[name + '_codes'], archive[name + '_categories'])
+        return result_table.ResultTable(archive['filename'].tolist(), columns,
+                                        categoricals, archive['error_codes'],
+                                        archive['error_offsets'],
+                                        archive['error_messages'].tolist())
+    finally:
+        archive.close()
+
+
+def write_parquet(table, output_path):
+    """Writes a ResultTable to a Parquet file.
+
+    Args:
+        table: A ResultTable to export.
+        output_path: Path of the Parquet file to write.
+
+    Raises:
+        ImportError: pyarrow is not installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('Parquet export requires pyarrow')
+    names = ['filename']
+    arrays = [pyarrow.array(table.filenames, type=pyarrow.string())]
+    for name in result_table.FLOAT_COLUMNS:
+        names.append(name)
+        arrays.append(pyarrow.array(table.columns[name], from_pandas=True))
+    for name in _DURATION_COLUMNS:
+        names.append(name)
+        arrays.append(pyarrow.array(getattr(table, name)(), from_pandas=True))
+    timestamp_type = pyarrow.timestamp('us', tz='UTC')
+    for name in result_table.TIME_COLUMNS:
+        column = table.columns[name]
+        names.append(name)
+        arrays.append(pyarrow.array(column,
+                                    mask=column == result_table.MISSING_TIME,
+                                    type=timestamp_type))
+    for name in result_table.CATEGORICAL_COLUMNS:
+        codes, categories = _without_null_category(table.categoricals[name])
+        names.append(name)
+        arrays.append(pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(codes, mask=codes < 0),
+            pyarrow.array(categories, type=pyarrow.string())))
+    error_messages = numpy.array(table.error_messages, dtype=object)
+    names.append('errors')
+    arrays.append(pyarrow.ListArray.from_arrays(
+        pyarrow.array(table.error_offsets.astype(numpy.int32)),
+        pyarrow.array(error_messages[table.error_codes].tolist(),
+                      type=pyarrow.string())))
+    pyarrow.parquet.write_table(
+        pyarrow.Table.from_arrays(arrays, names), output_path)
+
+
+def _without_null_category(categorical):
+    """Returns a categorical's codes and categories with None coded as -1."""
+    if None not in categorical.categories:
+        return categorical.codes, list(categorical.categories)
+    null_code = categorical.categories.index(None)
+    codes = categorical.codes.copy()
+    codes[codes == null_code] = -1
+    codes[codes > null_code] -= 1
+    categories = [value for value in categorical.categories
+                  if value is not None]
+    return codes, categories
+
+
+def _with_null_category(codes, categories):
+    """Inverts _without_null_category, making None the last category."""
+    categories = categories.tolist()
+    if (codes < 0).any():
+        codes = codes.copy()
+        codes[codes < 0] = len(categories)
+        categories.append(None)
+    return result_table.Categorical(codes, categories)
+
+
+def _string_array(values):
+    return numpy.array(list(values), dtype=numpy.unicode_)
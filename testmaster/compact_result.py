@@ -0,0 +1,224 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Stores NDT results compactly in memory.
+
+An NdtResult is an object with an attribute dictionary, two nested
+NdtSingleTestResult objects with dictionaries of their own and up to six
+timezone-aware datetimes, which costs well over a kilobyte per result. A
+CompactResult packs the six timestamps (as microseconds since the epoch), both
+throughputs and latency into a single fixed-width string, keeps the remaining
+fields in __slots__ and shares one copy of each distinct browser, OS, client,
+version and error message across results, so it takes a fraction of the memory.
+Only a bounded number of distinct values are shared, so that a long-running
+process that sees many unique error messages does not keep every one of them
+alive; values beyond that bound are stored unshared.
+
+A CompactResult has the same attributes as an NdtResult (c2s_result and
+s2c_result return lightweight views, timestamps are converted to datetimes on
+access and errors have messages but no timestamps), so it can be passed to
+result_metrics, csv_convert and summary in place of an NdtResult.
+"""
+
+import struct
+
+import field_decoder
+import timestamps
+
+# The numeric fields of a result, in packed order: six int64 timestamps in
+# microseconds since the epoch, then three float64 values.
+_TIME_FIELDS = ('start_time', 'end_time', 'c2s_start_time', 'c2s_end_time',
+                's2c_start_time', 's2c_end_time')
+_FLOAT_FIELDS = ('c2s_throughput', 's2c_throughput', 'latency')
+_NUMBERS = struct.Struct('<%dq%dd' % (len(_TIME_FIELDS), len(_FLOAT_FIELDS)))
+_INT64 = struct.Struct('<q')
+_FLOAT64 = struct.Struct('<d')
+# Packed values that stand for a missing timestamp or number.
+_MISSING_TIME = -2**63
+_MISSING_FLOAT = float('nan')
+_STRING_FIELDS = ('browser', 'browser_version', 'os', 'os_version', 'client',
+                  'client_version')
+
+# The maximum number of distinct string field values, and of distinct errors,
+# to share. Browser, OS and client names and versions are few, so this bounds
+# the memory kept alive by unique error messages.
+_MAX_SHARED_VALUES = 4096
+
+# The shared copy of each string field value and each error, keyed by value and
+# by message.
+_strings = {}
+_errors = {}
+
+
+class CompactTestError(object):
+    """An error that occurred during a result, without its timestamp.
+
+    Attributes:
+        message: The error message.
+        timestamp: Always None.
+    """
+    __slots__ = ('message',)
+    timestamp = None
+
+    def __init__(self, message):
+        self.message = message
+
+    def __repr__(self):
+        return 'CompactTestError(%r)' % self.message
+
+
+class CompactTestResult(object):
+    """A view of the c2s or s2c test of a CompactResult.
+
+    Attributes:
+        start_time_us: The start time in microseconds since the epoch, or None.
+        end_time_us: The end time in microseconds since the epoch, or None.
+        throughput: The throughput in Mbps, or None.
+    """
+    __slots__ = ('start_time_us', 'end_time_us', 'throughput')
+
+    def __init__(self, start_time_us, end_time_us, throughput):
+        self.start_time_us = start_time_us
+        self.end_time_us = end_time_us
+        self.throughput = throughput
+
+    @property
+    def start_time(self):
+        """The start time as a UTC datetime, or None."""
+        return timestamps.us_to_datetime(self.start_time_us)
+
+    @property
+    def end_time(self):
+        """The end time as a UTC datetime, or None."""
+        return timestamps.us_to_datetime(self.end_time_us)
+
+
+class CompactResult(object):
+    """An NDT result stored in a fraction of the memory of an NdtResult.
+
+    Attributes:
+        browser: The browser name, or None.
+        browser_version: The browser version, or None.
+        os: The OS name, or None.
+        os_version: The OS version, or None.
+        client: The NDT client name, or None.
+        client_version: The NDT client version, or None.
+        errors: A tuple of CompactTestErrors.
+    """
+    __slots__ = ('_numbers',) + _STRING_FIELDS + ('errors',)
+
+    def __init__(self, fields):
+        """Creates a compact result from a dictionary of its fields.
+
+        Args:
+            fields: A dictionary of every field in field_decoder.FIELDS, as
+                returned by field_decoder.decode_fields.
+        """
+        numbers = [_MISSING_TIME if fields[field] is None else fields[field]
+                   for field in _TIME_FIELDS]
+        numbers.extend(_MISSING_FLOAT if fields[field] is None else
+                       fields[field] for field in _FLOAT_FIELDS)
+        self._numbers = _NUMBERS.pack(*numbers)
+        for field in _STRING_FIELDS:
+            setattr(self, field, _shared_string(fields[field]))
+        self.errors = tuple(_error(message) for message in fields['errors'])
+
+    @classmethod
+    def from_result(cls, result):
+        """Creates a compact result from an NdtResult.
+
+        Args:
+            result: An NdtResult instance.
+
+        Returns:
+            A CompactResult with the same fields as result.
+        """
+        return cls(field_decoder.result_to_fields(result))
+
+    def __getstate__(self):
+        return self.to_fields()
+
+    def __setstate__(self, fields):
+        self.__init__(fields)
+
+    @property
+    def start_time(self):
+        """The start time of the result as a UTC datetime, or None."""
+        return timestamps.us_to_datetime(self._time(0))
+
+    @property
+    def end_time(self):
+        """The end time of the result as a UTC datetime, or None."""
+        return timestamps.us_to_datetime(self._time(1))
+
+    @property
+    def c2s_result(self):
+        """A CompactTestResult of the c2s test."""
+        return CompactTestResult(self._time(2), self._time(3), self._float(0))
+
+    @property
+    def s2c_result(self):
+        """A CompactTestResult of the s2c test."""
+        return CompactTestResult(self._time(4), self._time(5), self._float(1))
+
+    @property
+    def latency(self):
+        """The latency in milliseconds, or None."""
+        return self._float(2)
+
+    def to_fields(self):
+        """Returns a dictionary of the result's fields.
+
+        Returns:
+            A dictionary in the form returned by field_decoder.decode_fields.
+        """
+        numbers = _NUMBERS.unpack(self._numbers)
+        fields = {}
+        for field, value in zip(_TIME_FIELDS, numbers):
+            fields[field] = None if value == _MISSING_TIME else value
+        for field, value in zip(_FLOAT_FIELDS, numbers[len(_TIME_FIELDS):]):
+            fields[field] = None if value != value else value
+        for field in _STRING_FIELDS:
+            fields[field] = getattr(self, field)
+        fields['errors'] = [error.message for error in self.errors]
+        return fields
+
+    def _time(self, index):
+        value = _INT64.unpack_from(self._numbers, index * _INT64.size)[0]
+        return None if value == _MISSING_TIME else value
+
+    def _float(self, index):
+        offset = len(_TIME_FIELDS) * _INT64.size + index * _FLOAT64.size
+        value = _FLOAT64.unpack_from(self._numbers, offset)[0]
+        # NaN is the only value that is not equal to itself.
+        return None if value != value else value
+
+
+def _shared_string(value):
+    """Returns the shared copy of a string, if it is or can be shared."""
+    shared_value = _strings.get(value)
+    if shared_value is None:
+        shared_value = value
+        if len(_strings) < _MAX_SHARED_VALUES:
+            _strings[value] = value
+    return shared_value
+
+
+def _error(message):
+    """Returns a CompactTestError for a message, shared while there is room."""
+    error = _errors.get(message)
+    if error is None:
+        error = CompactTestError(message)
+        if len(_errors) < _MAX_SHARED_VALUES:
+            _errors[message] = error
+    return error
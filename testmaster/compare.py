@@ -0,0 +1,114 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares the metrics of two populations of NDT results.
+
+Given a pattern of files and filters that select a baseline and a candidate
+population of results (for example, by client version), writes a CSV of the
+difference in the median and mean of each metric between the populations, with
+bootstrap confidence intervals.
+"""
+
+import argparse
+import csv
+import glob
+import sys
+
+import numpy
+
+import comparison
+import field_decoder
+import read_results
+import result_table
+
+_COLUMNS = ('metric', 'statistic', 'baseline', 'candidate', 'difference',
+            'lower', 'upper', 'baseline_count', 'candidate_count',
+            'significant')
+
+
+def main(args):
+    table = result_table.ResultTable.from_fields(read_results.iter_fields(
+        sorted(glob.glob(args.pattern)), field_decoder.FIELDS, args.jobs))
+    random_state = numpy.random.RandomState(args.seed)
+    comparisons = comparison.compare_tables(
+        table, comparison.filter_rows(table, args.baseline),
+        comparison.filter_rows(table, args.candidate), args.metrics.split(','),
+        args.resamples, args.confidence, random_state)
+    _write_comparisons_csv(comparisons, sys.stdout)
+
+
+def _write_comparisons_csv(comparisons, output_file):
+    csv_writer = csv.writer(output_file)
+    csv_writer.writerow(_COLUMNS)
+    for result in comparisons:
+        csv_writer.writerow([_format_value(getattr(result, column))
+                             for column in _COLUMNS])
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float):
+        return '%.3f' % value
+    return value
+
+
+def _filter(text):
+    try:
+        return comparison.parse_filter(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='NDT Result population comparison',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--pattern',
+                        required=True,
+                        help="Glob pattern of input files")
+    parser.add_argument('--baseline',
+                        required=True,
+                        type=_filter,
+                        help=('Filter that selects the baseline results, as '
+                              'field=value[,field=value...], on any of %s' %
+                              ', '.join(result_table.CATEGORICAL_COLUMNS)))
+    parser.add_argument('--candidate',
+                        required=True,
+                        type=_filter,
+                        help='Filter that selects the candidate results')
+    parser.add_argument('--metrics',
+                        default=','.join(comparison.METRICS),
+                        help='Comma-separated list of metrics to compare')
+    parser.add_argument('--resamples',
+                        type=int,
+                        default=10000,
+                        help='Number of bootstrap resamples')
+    parser.add_argument('--confidence',
+                        type=float,
+                        default=0.95,
+                        help='Confidence level of the intervals')
+    parser.add_argument('--seed',
+                        type=int,
+                        help='Random seed, for repeatable intervals')
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of processes to use to parse input files')
+    args = parser.parse_args()
+    for metric in args.metrics.split(','):
+        if metric not in comparison.METRICS:
+            parser.error('Unknown metric: %s' % metric)
+    main(args)
@@ -0,0 +1,240 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares the metrics of two populations of NDT results.
+
+Given a baseline and a candidate population (for example, the results of two
+client versions), compare estimates the difference (candidate minus baseline)
+in the median and mean of a metric, with a percentile bootstrap confidence
+interval for each difference. Each population is resampled independently.
+
+Drawing every resample explicitly costs one random draw per value per
+resample, so the bootstrap distributions are instead generated directly from
+the sorted values:
+
+  * Median: the median of a resample of n sorted values is the value at the
+    index of the middle order statistic of n uniform random indexes, which
+    follows a beta distribution. One or two beta draws per resample give the
+    exact bootstrap distribution of the median.
+  * Mean: the sorted values are split into blocks of adjacent values, and the
+    number of draws from each block in each resample is drawn from a
+    multinomial distribution. The sum of the draws from a block is its count
+    times the block's mean, plus a normally distributed term with the block's
+    variance. With at most one value per block, this is the exact bootstrap;
+    otherwise blocks of adjacent sorted values have little variance, so the
+    approximation is close.
+
+Either way the cost of each resample does not grow with the number of results.
+"""
+
+import collections
+
+import numpy
+
+import result_table
+
+# Metrics that can be compared: the float columns of a ResultTable.
+METRICS = result_table.FLOAT_COLUMNS
+STATISTICS = ('median', 'mean')
+
+# Maximum number of blocks of sorted values used to bootstrap the mean.
+_MEAN_BLOCKS = 512
+
+# The comparison of one statistic of one metric between two populations.
+# baseline and candidate are the statistic of each population, difference is
+# candidate - baseline, lower and upper bound the confidence interval of the
+# difference, and baseline_count and candidate_count are the number of values of
+# the metric in each population. significant is True if the confidence interval
+# does not include zero.
+Comparison = collections.namedtuple(
+    'Comparison', ['metric', 'statistic', 'baseline', 'candidate', 'difference',
+                   'lower', 'upper', 'baseline_count', 'candidate_count',
+                   'significant'])
+
+
+def parse_filter(text):
+    """Parses a filter of the form 'field=value[,field=value...]'.
+
+    Args:
+        text: The filter to parse. Each field must be in
+            result_table.CATEGORICAL_COLUMNS.
+
+    Returns:
+        A dictionary of values, keyed by field.
+
+    Raises:
+        ValueError: The filter is malformed or names an unknown field.
+    """
+    conditions = {}
+    for condition in text.split(','):
+        field, separator, value = condition.partition('=')
+        field = field.strip()
+        if not separator or not field:
+            raise ValueError('Expected field=value: %s' % condition)
+        if field not in result_table.CATEGORICAL_COLUMNS:
+            raise ValueError('Cannot filter results by %s' % field)
+        conditions[field] = value.strip()
+    return conditions
+
+
+def filter_rows(table, conditions):
+    """Selects the rows of a ResultTable that match every condition.
+
+    Args:
+        table: A ResultTable.
+        conditions: A dictionary of values, keyed by field, as returned by
+            parse_filter.
+
+    Returns:
+        A boolean array with an entry for each row of table.
+    """
+    mask = numpy.ones(len(table), dtype=bool)
+    for field, value in conditions.iteritems():
+        categorical = table.categoricals[field]
+        mask &= categorical.codes == categorical.code_of(value)
+    return mask
+
+
+def compare_tables(table,
+                   baseline_rows,
+                   candidate_rows,
+                   metrics=METRICS,
+                   resamples=10000,
+                   confidence=0.95,
+                   random_state=None):
+    """Compares each metric of two populations of the results in a table.
+
+    Args:
+        table: A ResultTable.
+        baseline_rows: A boolean array selecting the baseline results.
+        candidate_rows: A boolean array selecting the candidate results.
+        metrics: A list of metrics in METRICS to compare.
+        resamples: The number of bootstrap resamples of each population.
+        confidence: The confidence level of each interval.
+        random_state: An optional numpy.random.RandomState, for repeatable
+            results.
+
+    Returns:
+        A list of Comparisons, for each statistic of each metric.
+    """
+    comparisons = []
+    for metric in metrics:
+        column = table.columns[metric]
+        comparisons.extend(compare(metric, column[baseline_rows], column[
+            candidate_rows], resamples, confidence, random_state))
+    return comparisons
+
+
+def compare(metric,
+            baseline_values,
+            candidate_values,
+            resamples=10000,
+            confidence=0.95,
+            random_state=None):
+    """Compares the median and mean of two populations of values.
+
+    Args:
+        metric: The name of the metric, used to label the Comparisons.
+        baseline_values: A float64 array of the baseline values. NaN values
+            are ignored.
+        candidate_values: A float64 array of the candidate values. NaN values
+            are ignored.
+        resamples: The number of bootstrap resamples of each population.
+        confidence: The confidence level of each interval, between 0 and 1.
+        random_state: An optional numpy.random.RandomState.
+
+    Returns:
+        A list of a Comparison for each statistic in STATISTICS. If either
+        population has no values, every field but the counts is None.
+    """
+    random_state = random_state or numpy.random.RandomState()
+    baseline_values = numpy.sort(baseline_values[~numpy.isnan(baseline_values)])
+    candidate_values = numpy.sort(candidate_values[~numpy.isnan(
+        candidate_values)])
+    counts = (len(baseline_values), len(candidate_values))
+    if not all(counts):
+        return [Comparison(metric, statistic, None, None, None, None, None,
+                           counts[0], counts[1], None)
+                for statistic in STATISTICS]
+    tail = 50.0 * (1 - confidence)
+    comparisons = []
+    for statistic, bootstrap in (('median', bootstrap_medians),
+                                 ('mean', bootstrap_means)):
+        baseline = _STATISTICS[statistic](baseline_values)
+        candidate = _STATISTICS[statistic](candidate_values)
+        differences = (bootstrap(candidate_values, resamples, random_state) -
+                       bootstrap(baseline_values, resamples, random_state))
+        lower, upper = numpy.percentile(differences, [tail, 100 - tail])
+        comparisons.append(Comparison(
+            metric, statistic, baseline, candidate, candidate - baseline, lower,
+            upper, counts[0], counts[1], not lower <= 0 <= upper))
+    return comparisons
+
+
+def bootstrap_medians(sorted_values, resamples, random_state):
+    """Draws the medians of bootstrap resamples of a set of values.
+
+    Args:
+        sorted_values: A non-empty float64 array of values, in ascending order.
+        resamples: The number of resamples.
+        random_state: A numpy.random.RandomState.
+
+    Returns:
+        A float64 array of the median of each resample, as numpy.median would
+        calculate it.
+    """
+    count = len(sorted_values)
+    # The median is the k-th smallest draw (1-based), or the mean of the k-th
+    # and (k+1)-th smallest if count is even. The k-th smallest of count
+    # uniform variates follows Beta(k, count - k + 1), and flooring uniform
+    # variates scaled by count gives uniform random indexes.
+    k = (count + 1) // 2
+    uniforms = random_state.beta(k, count - k + 1, resamples)
+    medians = sorted_values[_to_index(uniforms, count)]
+    if count % 2 == 0:
+        # Given the k-th smallest, the (k+1)-th smallest is the smallest of the
+        # remaining count - k variates, which are uniform above it.
+        uniforms += (1 - uniforms) * random_state.beta(1, count - k, resamples)
+        medians = (medians + sorted_values[_to_index(uniforms, count)]) / 2
+    return medians
+
+
+def bootstrap_means(sorted_values, resamples, random_state):
+    """Draws the means of bootstrap resamples of a set of values.
+
+    Args:
+        sorted_values: A non-empty float64 array of values, in ascending order.
+        resamples: The number of resamples.
+        random_state: A numpy.random.RandomState.
+
+    Returns:
+        A float64 array of the mean of each resample.
+    """
+    count = len(sorted_values)
+    blocks = numpy.array_split(sorted_values, min(count, _MEAN_BLOCKS))
+    sizes = numpy.array([len(block) for block in blocks], dtype=numpy.float64)
+    block_means = numpy.array([block.mean() for block in blocks])
+    block_variances = numpy.array([block.var() for block in blocks])
+    draws = random_state.multinomial(count, sizes / count, resamples)
+    sums = draws.dot(block_means)
+    if block_variances.any():
+        sums += (numpy.sqrt(draws.dot(block_variances)) *
+                 random_state.standard_normal(resamples))
+    return sums / count
+
+
+def _to_index(uniforms, count):
+    return numpy.minimum((uniforms * count).astype(numpy.int64), count - 1)
+
+
+_STATISTICS = {'median': numpy.median, 'mean': numpy.mean}
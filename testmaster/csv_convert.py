@@ -16,8 +16,31 @@ import csv
 import io
 import operator
 
+import external_sort
+import pipeline_stats
 import result_metrics
 
+_FIELDNAMES = ['filename', 'total_duration', 'c2s_throughput', 'c2s_duration',
+               's2c_throughput', 's2c_duration', 'latency', 'error',
+               'error_list']
+# The result fields (see field_decoder.FIELDS) needed to write a CSV row.
+CSV_FIELDS = frozenset(['start_time', 'end_time', 'c2s_start_time',
+                        'c2s_end_time', 'c2s_throughput', 's2c_start_time',
+                        's2c_end_time', 's2c_throughput', 'latency', 'errors'])
+_MICROSECONDS_PER_SECOND = 1e6
+# A header row with friendly names for each column.
+_HEADER_ROW = {
+    'filename': 'Filename',
+    'total_duration': 'Total Duration (s)',
+    'c2s_throughput': 'Upload Throughput (Mbps)',
+    'c2s_duration': 'Upload Duration (s)',
+    's2c_throughput': 'Download Througput (Mbps)',
+    's2c_duration': 'Download Duration (s)',
+    'latency': 'Latency (ms)',
+    'error': 'Error occurred?',
+    'error_list': 'Error List',
+}
+
 
 def ndt_results_to_csv(results):
     """Converts a dictionary of NdtResult objects to a CSV summary.
@@ -33,41 +56,207 @@ def ndt_results_to_csv(results):
         A CSV string describing the NDT results.
     """
     output = io.BytesIO()
-    csv_writer = csv.DictWriter(
-        output,
-        fieldnames=['filename', 'total_duration', 'c2s_throughput',
-                    'c2s_duration', 's2c_throughput', 's2c_duration', 'latency',
-                    'error', 'error_list'])
-    # Write a header row with friendly names for each column
-    csv_writer.writerow({
-        'filename': 'Filename',
-        'total_duration': 'Total Duration (s)',
-        'c2s_throughput': 'Upload Throughput (Mbps)',
-        'c2s_duration': 'Upload Duration (s)',
-        's2c_throughput': 'Download Througput (Mbps)',
-        's2c_duration': 'Download Duration (s)',
-        'latency': 'Latency (ms)',
-        'error': 'Error occurred?',
-        'error_list': 'Error List',
-    })
     # Sort results so that rows are in ascending order of filename.
     sorted_results = sorted(results.items(), key=operator.itemgetter(0))
-    for filename, result in sorted_results:
-        csv_writer.writerow({
-            'filename': filename,
-            'total_duration':
-            _format_float(result_metrics.total_duration(result)),
-            'c2s_throughput': _format_float(result.c2s_result.throughput),
-            'c2s_duration': _format_float(result_metrics.c2s_duration(result)),
-            's2c_throughput': _format_float(result.s2c_result.throughput),
-            's2c_duration': _format_float(result_metrics.s2c_duration(result)),
-            'latency': _format_float(result.latency),
-            'error': 1 if len(result.errors) > 0 else 0,
-            'error_list': _join_errors(result.errors),
-        })
+    write_ndt_results_csv(sorted_results, output)
+    return output.getvalue()
+
+
+def write_ndt_results_csv(results, output_file, header=True):
+    """Writes a sequence of NdtResult objects to a file as a CSV summary.
+
+    Writes a header row, then one row for each result, in the order in which
+    the results are produced. Each row is written as soon as its result is
+    available, so results may be a generator that parses results lazily.
+
+    Args:
+        results: An iterable of (filename, result) tuples, where filename is the
+            filename of the original result file from which result, an NdtResult
+            instance, was parsed.
+        output_file: A file-like object to which to write the CSV.
+        header: Whether to write the header row. Pass False to append rows to
+            an existing CSV.
+    """
+    csv_writer = csv.DictWriter(output_file, fieldnames=_FIELDNAMES)
+    if header:
+        csv_writer.writerow(_HEADER_ROW)
+    row_count = 0
+    with pipeline_stats.exclusive_timer('write_csv'):
+        for filename, result in results:
+            csv_writer.writerow(_result_to_row(filename, result))
+            row_count += 1
+    pipeline_stats.count('rows_written', row_count)
+
+
+def ndt_fields_to_csv(records):
+    """Converts a dictionary of decoded result fields to a CSV summary.
+
+    Produces the same CSV as ndt_results_to_csv, from results decoded with
+    read_results.parse_fields rather than parsed into NdtResult objects.
+
+    Args:
+        records: A dictionary of field dictionaries containing at least the
+            fields in CSV_FIELDS, keyed by the filename of the original result
+            file from which they were parsed.
+
+    Returns:
+        A CSV string describing the NDT results.
+    """
+    output = io.BytesIO()
+    sorted_records = sorted(records.items(), key=operator.itemgetter(0))
+    write_ndt_fields_csv(sorted_records, output)
     return output.getvalue()
 
 
+def write_ndt_fields_csv(records, output_file, header=True):
+    """Writes a sequence of decoded result fields to a file as a CSV summary.
+
+    Produces the same CSV as write_ndt_results_csv, from results decoded with
+    read_results.iter_fields rather than parsed into NdtResult objects.
+
+    Args:
+        records: An iterable of (filename, fields) tuples, where fields is a
+            dictionary containing at least the fields in CSV_FIELDS.
+        output_file: A file-like object to which to write the CSV.
+        header: Whether to write the header row.
+    """
+    csv_writer = csv.DictWriter(output_file, fieldnames=_FIELDNAMES)
+    if header:
+        csv_writer.writerow(_HEADER_ROW)
+    row_count = 0
+    with pipeline_stats.exclusive_timer('write_csv'):
+        for filename, fields in records:
+            csv_writer.writerow(_fields_to_row(filename, fields))
+            row_count += 1
+    pipeline_stats.count('rows_written', row_count)
+
+
+def write_sorted_ndt_results_csv(
+        results, output_file, memory_budget,
+        temp_dir=None):
+    """Writes NdtResult objects to a file as a CSV summary, in filename order.
+
+    Writes the same CSV as ndt_results_to_csv(dict(results)), but holds at most
+    about memory_budget bytes of rows in memory, spilling sorted runs of rows
+    to temporary files and merging them. As in a dictionary, if several results
+    have the same filename, only the last one is written.
+
+    Args:
+        results: An iterable of (filename, result) tuples, where result is an
+            NdtResult instance, such as read_results.iter_results.
+        output_file: A file-like object to which to write the CSV.
+        memory_budget: The approximate number of bytes of rows to sort in
+            memory at a time.
+        temp_dir: The directory in which to write sorted runs, or None for the
+            system default.
+    """
+    _write_sorted_rows(results, RowFormatter().format_result, output_file,
+                       memory_budget, temp_dir)
+
+
+def write_sorted_ndt_fields_csv(
+        records, output_file, memory_budget,
+        temp_dir=None):
+    """Writes decoded result fields to a file as a CSV summary, in order.
+
+    Writes the same CSV as ndt_fields_to_csv(dict(records)), in bounded memory,
+    as write_sorted_ndt_results_csv does.
+
+    Args:
+        records: An iterable of (filename, fields) tuples, where fields is a
+            dictionary containing at least the fields in CSV_FIELDS, such as
+            read_results.iter_fields.
+        output_file: A file-like object to which to write the CSV.
+        memory_budget: The approximate number of bytes of rows to sort in
+            memory at a time.
+        temp_dir: The directory in which to write sorted runs, or None for the
+            system default.
+    """
+    _write_sorted_rows(records, RowFormatter().format_fields, output_file,
+                       memory_budget, temp_dir)
+
+
+def write_csv_header(output_file):
+    """Writes the header row of a CSV summary to a file."""
+    csv.DictWriter(output_file, fieldnames=_FIELDNAMES).writerow(_HEADER_ROW)
+
+
+class RowFormatter(object):
+    """Formats individual rows of a CSV summary as strings."""
+
+    def __init__(self):
+        self._output = io.BytesIO()
+        self._csv_writer = csv.DictWriter(self._output, fieldnames=_FIELDNAMES)
+
+    def format_result(self, filename, result):
+        """Returns the CSV row, with line terminator, for an NdtResult."""
+        return self._format(_result_to_row(filename, result))
+
+    def format_fields(self, filename, fields):
+        """Returns the CSV row for a dictionary of decoded result fields."""
+        return self._format(_fields_to_row(filename, fields))
+
+    def _format(self, row):
+        self._csv_writer.writerow(row)
+        line = self._output.getvalue()
+        self._output.seek(0)
+        self._output.truncate()
+        return line
+
+
+def _write_sorted_rows(records, format_row, output_file, memory_budget,
+                       temp_dir):
+    write_csv_header(output_file)
+    keyed_lines = ((filename, format_row(filename, record))
+                   for filename, record in records)
+    row_count = 0
+    with pipeline_stats.exclusive_timer('write_csv'):
+        for line in external_sort.sort_lines(keyed_lines, memory_budget,
+                                             temp_dir):
+            output_file.write(line)
+            row_count += 1
+    pipeline_stats.count('rows_written', row_count)
+
+
+def _result_to_row(filename, result):
+    return {
+        'filename': filename,
+        'total_duration': _format_float(result_metrics.total_duration(result)),
+        'c2s_throughput': _format_float(result.c2s_result.throughput),
+        'c2s_duration': _format_float(result_metrics.c2s_duration(result)),
+        's2c_throughput': _format_float(result.s2c_result.throughput),
+        's2c_duration': _format_float(result_metrics.s2c_duration(result)),
+        'latency': _format_float(result.latency),
+        'error': 1 if len(result.errors) > 0 else 0,
+        'error_list': _join_errors(result.errors),
+    }
+
+
+def _fields_to_row(filename, fields):
+    errors = fields['errors']
+    return {
+        'filename': filename,
+        'total_duration':
+        _format_float(_duration(fields['start_time'], fields['end_time'])),
+        'c2s_throughput': _format_float(fields['c2s_throughput']),
+        'c2s_duration': _format_float(_duration(fields['c2s_start_time'],
+                                                fields['c2s_end_time'])),
+        's2c_throughput': _format_float(fields['s2c_throughput']),
+        's2c_duration': _format_float(_duration(fields['s2c_start_time'],
+                                                fields['s2c_end_time'])),
+        'latency': _format_float(fields['latency']),
+        'error': 1 if errors else 0,
+        'error_list': ','.join(errors),
+    }
+
+
+def _duration(start_time_us, end_time_us):
+    # Matches result_metrics, which computes timedelta.total_seconds().
+    if start_time_us is None or end_time_us is None:
+        return None
+    return (end_time_us - start_time_us) / _MICROSECONDS_PER_SECOND
+
+
 def _format_float(value):
     if value is None:
         return ''
@@ -0,0 +1,160 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Resolves NDT results that share a filename.
+
+Results are normally keyed by the basename of their raw result file, so two
+different results with the same basename (for example, from two clients that
+name their results identically) collide. A ResultIndex tracks the full source
+of every result (see read_results.ResultSource) and a hash of its raw contents.
+Copies of identical results are recognized by their hash and decoded only
+once, while results that share a basename but differ in content are recorded
+as conflicts and resolved by a policy:
+
+  * keep-first: Keeps the first result read with each basename.
+  * keep-last: Keeps the last result read with each basename (the behavior of
+    read_results.parse_files).
+  * keep-all: Keeps every distinct result. Results whose basename is shared by
+    a different result are keyed by their full source instead.
+"""
+
+import collections
+import hashlib
+
+import read_results
+
+KEEP_FIRST = 'keep-first'
+KEEP_LAST = 'keep-last'
+KEEP_ALL = 'keep-all'
+POLICIES = (KEEP_FIRST, KEEP_LAST, KEEP_ALL)
+
+# Results with the same basename but different contents. filename is the shared
+# basename. sources is a list of the ResultSource of each distinct result, in
+# the order they were read (if a result was read more than once, its first copy
+# is listed, or its last copy under keep-last). kept is a list of the sources
+# whose results were kept.
+Conflict = collections.namedtuple('Conflict', ['filename', 'sources', 'kept'])
+
+
+def parse_files(result_paths, policy=KEEP_LAST, decode=None, prefetch=0):
+    """Parses a list of files, resolving results that share a basename.
+
+    Args:
+        result_paths: A list of paths to NDT result files and result packages.
+        policy: One of POLICIES, which determines which of several different
+            results with the same basename are kept.
+        decode: A function that decodes the raw contents of a result file.
+            Defaults to decoding an NdtResult.
+        prefetch: The number of paths to read ahead in background threads
+            (see read_results.iter_raw_results).
+
+    Returns:
+        A ResultIndex of the results.
+    """
+    index = ResultIndex(policy, decode)
+    for source, raw_contents in read_results.iter_raw_results(result_paths,
+                                                              prefetch):
+        index.add(source, raw_contents)
+    return index
+
+
+class ResultIndex(object):
+    """Indexes decoded results by basename and by a hash of their contents.
+
+    Attributes:
+        duplicate_count: The number of results skipped because their basename
+            and contents were identical to a result already added.
+    """
+
+    def __init__(self, policy=KEEP_LAST, decode=None):
+        """Creates an empty index.
+
+        Args:
+            policy: One of POLICIES.
+            decode: A function that decodes the raw contents of a result file.
+                Defaults to decoding an NdtResult.
+
+        Raises:
+            ValueError: policy is not one of POLICIES.
+        """
+        if policy not in POLICIES:
+            raise ValueError('Unknown duplicate policy: %s' % policy)
+        self._policy = policy
+        if not decode:
+            # Imported here so that callers that decode only selected fields
+            # do not load the decoder.
+            from ndt_e2e_clientworker.client_wrapper import result_decoder
+            decode = result_decoder.NdtResultDecoder().decode
+        self._decode = decode
+        # Decoded results, keyed by the digest of their raw contents.
+        self._results_by_digest = {}
+        # For each basename, an OrderedDict of the source of each distinct
+        # result, keyed by digest, in the order they were added.
+        self._sources_by_filename = collections.OrderedDict()
+        self.duplicate_count = 0
+
+    def add(self, source, raw_contents):
+        """Adds a raw result to the index, decoding it if it is new.
+
+        Args:
+            source: The ResultSource of the raw result.
+            raw_contents: A string containing the raw result file.
+        """
+        digest = hashlib.sha1(raw_contents).digest()
+        if digest not in self._results_by_digest:
+            self._results_by_digest[digest] = self._decode(raw_contents)
+        sources = self._sources_by_filename.setdefault(
+            source.filename, collections.OrderedDict())
+        if digest in sources:
+            self.duplicate_count += 1
+            if self._policy != KEEP_LAST:
+                return
+            # Under keep-last, the most recent copy is the one that is kept.
+            del sources[digest]
+        sources[digest] = source
+
+    def results(self):
+        """Returns the results kept under the index's policy.
+
+        Returns:
+            A dictionary of decoded results. Results are keyed by their
+            basename, except under keep-all, where conflicting results are keyed
+            by str(source).
+        """
+        kept_results = {}
+        for filename, sources in self._sources_by_filename.iteritems():
+            for digest, source in self._kept(sources):
+                if len(sources) > 1 and self._policy == KEEP_ALL:
+                    key = str(source)
+                else:
+                    key = filename
+                kept_results[key] = self._results_by_digest[digest]
+        return kept_results
+
+    def conflicts(self):
+        """Returns a list of Conflicts, in order of their basename."""
+        conflicts = []
+        for filename, sources in sorted(self._sources_by_filename.iteritems()):
+            if len(sources) > 1:
+                kept = [source for _, source in self._kept(sources)]
+                conflicts.append(Conflict(filename, sources.values(), kept))
+        return conflicts
+
+    def _kept(self, sources):
+        """Returns the (digest, source) pairs to keep for one basename."""
+        items = sources.items()
+        if self._policy == KEEP_FIRST:
+            return items[:1]
+        if self._policy == KEEP_LAST:
+            return items[-1:]
+        return items
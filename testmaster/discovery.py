@@ -0,0 +1,160 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Finds NDT result files and result packages in directory trees.
+
+Directories are scanned with os.scandir where it is available, so files can be
+filtered by name and type using only the metadata returned while listing a
+directory, without opening or stat-ing each file. Python 2 has no os.scandir; it
+uses the optional scandir package if it is installed, and otherwise lists each
+directory with os.listdir and stats each entry to find its type.
+Subdirectories are scanned in parallel across a pool of threads, which helps
+most when results are spread across many directories on a network file system.
+"""
+
+import fnmatch
+import multiprocessing.pool
+import os
+
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
+# Names of files that may hold NDT results: raw results and result packages.
+DEFAULT_INCLUDE = ('*.json', '*.zip')
+
+
+def find_result_files(roots, include=None, exclude=None, threads=8):
+    """Recursively finds candidate result files under a list of directories.
+
+    Include and exclude patterns are shell-style globs, matched against both
+    a file's name and its path relative to the root in which it was found. An
+    excluded directory is not scanned at all. Symbolic links to directories are
+    not followed.
+
+    Args:
+        roots: A list of directories to search.
+        include: A list of glob patterns. Only files that match at least one
+            pattern are returned. Defaults to DEFAULT_INCLUDE.
+        exclude: A list of glob patterns. Files and directories that match any
+            pattern are skipped.
+        threads: The number of threads to use to scan directories.
+
+    Returns:
+        A list of paths to matching files. Paths under each root are sorted, and
+        roots appear in the order given.
+    """
+    include = list(include or DEFAULT_INCLUDE)
+    exclude = list(exclude or [])
+    root_files = []
+    subdirectories = []
+    for root_index, root in enumerate(roots):
+        files, directories = _scan_directory(root, '', include, exclude)
+        root_files.append(files)
+        subdirectories.extend((root_index, directory)
+                              for directory in directories)
+
+    def scan_subdirectory(subdirectory):
+        return _scan_tree(subdirectory[1], include, exclude)
+
+    pool = multiprocessing.pool.ThreadPool(max(1, threads))
+    try:
+        subdirectory_files = pool.map(scan_subdirectory, subdirectories)
+    finally:
+        pool.close()
+        pool.join()
+    for subdirectory, files in zip(subdirectories, subdirectory_files):
+        root_files[subdirectory[0]].extend(files)
+    paths = []
+    for files in root_files:
+        paths.extend(sorted(files))
+    return paths
+
+
+def _scan_tree(directory, include, exclude):
+    """Returns the matching files in a directory and all its subdirectories.
+
+    Args:
+        directory: A (path, path relative to the root) tuple.
+        include: A list of glob patterns of files to include.
+        exclude: A list of glob patterns of files and directories to skip.
+
+    Returns:
+        A list of paths to matching files.
+    """
+    files = []
+    pending = [directory]
+    while pending:
+        path, relative_path = pending.pop()
+        directory_files, subdirectories = _scan_directory(path, relative_path,
+                                                          include, exclude)
+        files.extend(directory_files)
+        pending.extend(subdirectories)
+    return files
+
+
+def _scan_directory(directory, relative_directory, include, exclude):
+    """Lists the matching files and unexcluded subdirectories of a directory.
+
+    Returns:
+        A (files, subdirectories) tuple, where files is a list of paths and
+        subdirectories is a list of (path, path relative to the root) tuples.
+    """
+    files = []
+    subdirectories = []
+    for entry in _list_directory(directory):
+        if relative_directory:
+            relative_path = relative_directory + '/' + entry.name
+        else:
+            relative_path = entry.name
+        if _matches(entry.name, relative_path, exclude):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            subdirectories.append((entry.path, relative_path))
+        elif (_matches(entry.name, relative_path, include) and entry.is_file()):
+            files.append(entry.path)
+    return files, subdirectories
+
+
+def _matches(name, relative_path, patterns):
+    for pattern in patterns:
+        if (fnmatch.fnmatch(name, pattern) or
+                fnmatch.fnmatch(relative_path, pattern)):
+            return True
+    return False
+
+
+def _list_directory(directory):
+    if _scandir is not None:
+        return _scandir(directory)
+    return [_ListdirEntry(directory, name) for name in os.listdir(directory)]
+
+
+class _ListdirEntry(object):
+    """A minimal stand-in for os.DirEntry when scandir is not available."""
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+
+    def is_dir(self, follow_symlinks=True):
+        if not follow_symlinks and os.path.islink(self.path):
+            return False
+        return os.path.isdir(self.path)
+
+    def is_file(self):
+        return os.path.isfile(self.path)
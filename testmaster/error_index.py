@@ -0,0 +1,317 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Indexes the errors of NDT results for failure analysis.
+
+An ErrorIndex assigns each distinct error message an integer error id and each
+result an integer result id, and keeps an inverted index from each error id to
+the ids of the results in which that error occurred. Alongside the index, it
+counts results and errors for each browser, OS and client and counts the
+results in which each pair of errors occurred together, so error counts, error
+rates and co-occurrence can all be reported after a single pass over the
+results, without splitting error strings.
+
+Results are added a ResultTable at a time, and each table's errors are indexed
+with vectorized operations on its error codes.
+"""
+
+import collections
+import csv
+import itertools
+
+import numpy
+
+import result_table
+
+# Fields by which error rates are broken down by default.
+RATE_FIELDS = ('browser', 'os', 'client')
+
+# Number of results to add to an index at a time in ErrorIndex.add_records.
+_BATCH_SIZE = 65536
+
+# The error rate of one group of results. result_count is the number of results
+# in the group, error_count is the number of those results in which the error
+# occurred and rate is error_count / result_count.
+ErrorRate = collections.namedtuple('ErrorRate',
+                                   ['result_count', 'error_count', 'rate'])
+
+
+class ErrorIndex(object):
+    """Indexes the errors of a corpus of NDT results.
+
+    An error that occurs more than once in the same result is counted once for
+    that result.
+
+    Attributes:
+        rate_fields: The list of fields by which error rates are broken down.
+        messages: A list of the distinct error messages, indexed by error id.
+        filenames: A list of the filename of each result, indexed by result id.
+        failed_count: The number of results with at least one error.
+    """
+
+    def __init__(self, rate_fields=RATE_FIELDS):
+        """Creates an empty index.
+
+        Args:
+            rate_fields: A list of fields in result_table.CATEGORICAL_COLUMNS
+                by which to break down error rates.
+
+        Raises:
+            ValueError: rate_fields contains a field that is not in
+                result_table.CATEGORICAL_COLUMNS.
+        """
+        for field in rate_fields:
+            if field not in result_table.CATEGORICAL_COLUMNS:
+                raise ValueError('Cannot break down errors by %s' % field)
+        self.rate_fields = list(rate_fields)
+        self.messages = []
+        self.filenames = []
+        self.failed_count = 0
+        self._ids_by_message = {}
+        # For each error id, a list of int64 arrays of the ids of the results
+        # in which the error occurred, in ascending order.
+        self._result_ids = []
+        # For each rate field, a Counter of results keyed by the field's value.
+        self._value_counts = {field: collections.Counter()
+                              for field in self.rate_fields}
+        # For each rate field, a Counter of results keyed by (value, error id).
+        self._value_error_counts = {field: collections.Counter()
+                                    for field in self.rate_fields}
+        # A Counter of results keyed by pairs of error ids, lower id first.
+        self._pair_counts = collections.Counter()
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def add_table(self, table):
+        """Adds every result in a ResultTable to the index.
+
+        Args:
+            table: A ResultTable of results to add.
+        """
+        first_result_id = len(self.filenames)
+        self.filenames.extend(table.filenames)
+        error_ids = numpy.array(
+            [self._intern(message) for message in table.error_messages],
+            dtype=numpy.int64)
+        message_count = len(self.messages)
+        rows = numpy.repeat(numpy.arange(len(table)), table.error_count())
+        # Sorted, distinct (row, error id) pairs, encoded as single integers.
+        row_errors = numpy.unique(rows * message_count + error_ids[
+            table.error_codes])
+        rows = row_errors // max(message_count, 1)
+        ids = row_errors % max(message_count, 1)
+        self.failed_count += len(numpy.unique(rows))
+        self._index_results(rows + first_result_id, ids)
+        for field in self.rate_fields:
+            self._count_values(field, table.categoricals[field], rows, ids,
+                               message_count)
+        self._count_pairs(rows, ids)
+
+    def add_records(self, records):
+        """Adds a sequence of decoded result fields to the index.
+
+        Records are added in batches, so only one batch is held in memory as a
+        ResultTable at a time.
+
+        Args:
+            records: An iterable of (filename, fields) tuples, where fields is a
+                dictionary of every field in field_decoder.FIELDS, such as
+                those yielded by read_results.iter_fields.
+        """
+        builder = result_table.ResultTableBuilder()
+        for row, (filename, fields) in enumerate(records, 1):
+            builder.append_fields(filename, fields)
+            if row % _BATCH_SIZE == 0:
+                self.add_table(builder.build())
+                builder = result_table.ResultTableBuilder()
+        self.add_table(builder.build())
+
+    def results_with(self, message):
+        """Returns the ids of the results in which an error occurred.
+
+        Args:
+            message: An error message.
+
+        Returns:
+            An int64 array of result ids, in ascending order. The array is
+            empty if the error never occurred.
+        """
+        error_id = self._ids_by_message.get(message)
+        if error_id is None:
+            return numpy.empty(0, dtype=numpy.int64)
+        result_ids = self._result_ids[error_id]
+        if len(result_ids) > 1:
+            # Merge the arrays from each table so later lookups are cheaper.
+            result_ids[:] = [numpy.concatenate(result_ids)]
+        return result_ids[0]
+
+    def error_counts(self):
+        """Returns the number of results in which each error occurred.
+
+        Returns:
+            A dictionary of result counts, keyed by error message.
+        """
+        return {message: sum(len(ids) for ids in result_ids)
+                for message, result_ids in zip(self.messages, self._result_ids)}
+
+    def error_rates(self, field):
+        """Returns the rate of each error for each value of a field.
+
+        Args:
+            field: A field in rate_fields.
+
+        Returns:
+            A dictionary of ErrorRates, keyed by (value, error message) tuples,
+            with an entry for each error that occurred in results with each
+            value.
+        """
+        value_counts = self._value_counts[field]
+        rates = {}
+        for key, error_count in self._value_error_counts[field].iteritems():
+            value, error_id = key
+            result_count = value_counts[value]
+            rates[(value, self.messages[error_id])] = ErrorRate(
+                result_count, error_count, float(error_count) / result_count)
+        return rates
+
+    def cooccurrences(self):
+        """Returns the number of results in which each pair of errors occurred.
+
+        Returns:
+            A dictionary of result counts, keyed by tuples of two error
+            messages. Each pair appears once, in order of the errors' ids.
+        """
+        return {
+            (self.messages[first_id], self.messages[second_id]): count
+            for (first_id, second_id), count in self._pair_counts.iteritems()
+        }
+
+    def _intern(self, message):
+        """Returns the error id of a message, assigning a new id if needed."""
+        error_id = self._ids_by_message.get(message)
+        if error_id is None:
+            error_id = len(self.messages)
+            self._ids_by_message[message] = error_id
+            self.messages.append(message)
+            self._result_ids.append([])
+        return error_id
+
+    def _index_results(self, result_ids, error_ids):
+        """Adds result ids to the inverted index of each error id."""
+        # A stable sort keeps the result ids of each error in ascending order.
+        order = numpy.argsort(error_ids, kind='mergesort')
+        error_ids = error_ids[order]
+        result_ids = result_ids[order]
+        for start, end in _runs(error_ids):
+            self._result_ids[error_ids[start]].append(result_ids[start:end])
+
+    def _count_values(self, field, categorical, rows, error_ids, message_count):
+        """Counts results and errors by the value of a field."""
+        value_counts = numpy.bincount(categorical.codes,
+                                      minlength=len(categorical.categories))
+        for code, count in enumerate(value_counts):
+            if count:
+                self._value_counts[field][categorical.categories[code]] += int(
+                    count)
+        keys = categorical.codes[rows].astype(numpy.int64) * message_count
+        keys, counts = numpy.unique(keys + error_ids, return_counts=True)
+        for key, count in zip(keys, counts):
+            value = categorical.categories[key // message_count]
+            error_id = int(key % message_count)
+            self._value_error_counts[field][(value, error_id)] += int(count)
+
+    def _count_pairs(self, rows, error_ids):
+        """Counts the results in which each pair of errors occurred."""
+        for start, end in _runs(rows):
+            if end - start > 1:
+                row_error_ids = error_ids[start:end].tolist()
+                self._pair_counts.update(itertools.combinations(row_error_ids,
+                                                                2))
+
+
+def _runs(values):
+    """Returns (start, end) index pairs of each run of equal sorted values."""
+    if not len(values):
+        return []
+    starts = numpy.flatnonzero(numpy.r_[True, values[1:] != values[:-1]])
+    ends = numpy.append(starts[1:], len(values))
+    return zip(starts, ends)
+
+
+def write_counts_csv(index, output_file):
+    """Writes the number and fraction of results with each error as CSV.
+
+    Rows are in descending order of count.
+
+    Args:
+        index: An ErrorIndex.
+        output_file: A file-like object to which to write the CSV.
+    """
+    csv_writer = csv.writer(output_file)
+    csv_writer.writerow(['error', 'results', 'rate'])
+    for message, count in _by_count(index.error_counts()):
+        csv_writer.writerow([message, count, _format_rate(count, len(index))])
+
+
+def write_rates_csv(index, output_file):
+    """Writes the rate of each error for each value of each rate field as CSV.
+
+    Rows are grouped by field and value, in descending order of error count
+    within each group.
+
+    Args:
+        index: An ErrorIndex.
+        output_file: A file-like object to which to write the CSV.
+    """
+    csv_writer = csv.writer(output_file)
+    csv_writer.writerow(['field', 'value', 'error', 'results', 'error_results',
+                         'rate'])
+    for field in index.rate_fields:
+        rates = index.error_rates(field)
+        for key in sorted(
+                rates.keys(),
+                key=lambda key: (key[0], -rates[key].error_count, key[1])):
+            value, message = key
+            rate = rates[key]
+            csv_writer.writerow([field, _format_value(
+                value), message, rate.result_count, rate.error_count, '%.4f' %
+                                 rate.rate])
+
+
+def write_cooccurrence_csv(index, output_file):
+    """Writes the number of results in which each pair of errors occurred.
+
+    Rows are in descending order of count.
+
+    Args:
+        index: An ErrorIndex.
+        output_file: A file-like object to which to write the CSV.
+    """
+    csv_writer = csv.writer(output_file)
+    csv_writer.writerow(['error', 'other_error', 'results'])
+    for pair, count in _by_count(index.cooccurrences()):
+        csv_writer.writerow([pair[0], pair[1], count])
+
+
+def _by_count(counts):
+    """Returns the items of a dictionary of counts, largest count first."""
+    return sorted(counts.iteritems(), key=lambda item: (-item[1], item[0]))
+
+
+def _format_rate(count, total):
+    return '%.4f' % (float(count) / total) if total else ''
+
+
+def _format_value(value):
+    return '' if value is None else value
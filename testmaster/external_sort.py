@@ -0,0 +1,172 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Sorts more lines of output than fit in memory.
+
+sort_lines buffers (key, line) pairs until they reach a memory budget, sorts
+the buffer and spills it to a temporary file as a sorted run, and finally
+merges the runs (and whatever remains in the buffer) with a heap. To bound the
+number of open files, runs are merged in levels as they accumulate: whenever a
+level holds _MERGE_FANOUT runs, they are merged into one run on the next level.
+Each line is therefore rewritten about log(runs) / log(_MERGE_FANOUT) times,
+rather than once for every merge. As with sorting dict(keyed_lines).items(),
+only the last line with each key is kept: each line is tagged with its position
+in the input, so that the merge orders lines with the same key by position and
+drops all but the last.
+"""
+
+import heapq
+import marshal
+import tempfile
+
+import pipeline_stats
+
+# Approximate memory, in bytes, used by each buffered line in addition to the
+# length of its key and text: the tuple, the position and the string headers.
+_LINE_OVERHEAD = 150
+# Number of runs on one level that are merged into a single run on the next
+# level. At most _MERGE_FANOUT runs are open on each level, so the number of
+# open files grows only with the logarithm of the number of runs.
+_MERGE_FANOUT = 16
+
+
+def sort_lines(keyed_lines, memory_budget, temp_dir=None):
+    """Sorts lines by key, spilling sorted runs to disk to bound memory use.
+
+    Args:
+        keyed_lines: An iterable of (key, line) tuples, where key is a string
+            and line is a byte string.
+        memory_budget: The approximate number of bytes of lines to hold in
+            memory before spilling them to a temporary file.
+        temp_dir: The directory in which to create temporary files, or None for
+            the system default.
+
+    Yields:
+        Each line, in ascending order of key. If several lines have the same
+        key, only the last of them in keyed_lines is yielded.
+    """
+    records = ((key, position, line)
+               for position, (key, line) in enumerate(keyed_lines))
+    for _, _, line in sort_records(records, memory_budget, temp_dir):
+        yield line
+
+
+def sort_records(records, memory_budget, temp_dir=None):
+    """Sorts (key, position, line) records, keeping the last for each key.
+
+    Like sort_lines, but the caller supplies the position of each record, which
+    decides which of several records with the same key is kept.
+
+    Args:
+        records: An iterable of (key, position, line) tuples, where position is
+            any value that marshal can store, such as an integer or a tuple of
+            integers. No two records may have the same key and position.
+        memory_budget: The approximate number of bytes of lines to hold in
+            memory before spilling them to a temporary file.
+        temp_dir: The directory in which to create temporary files, or None for
+            the system default.
+
+    Yields:
+        (key, position, line) tuples in ascending order of key, with only the
+        record with the greatest position for each key.
+    """
+    # The runs on each level, oldest first. Each run on level i is the merge of
+    # _MERGE_FANOUT runs on level i - 1.
+    levels = []
+    try:
+        buffered = []
+        buffered_bytes = 0
+        for record in records:
+            buffered.append(record)
+            buffered_bytes += len(record[0]) + len(record[2]) + _LINE_OVERHEAD
+            if buffered_bytes >= memory_budget:
+                buffered.sort()
+                _add_run(levels, 0, _write_run(buffered, temp_dir), temp_dir)
+                buffered = []
+                buffered_bytes = 0
+        buffered.sort()
+        runs = [run for level in levels for run in level]
+        for record in merge_records([_read_run(run) for run in runs] + [buffered
+                                                                       ]):
+            yield record
+    finally:
+        for level in levels:
+            _close(level)
+
+
+def merge_records(sorted_records):
+    """Merges sorted sequences of records, keeping the last for each key.
+
+    Args:
+        sorted_records: An iterable of iterables of (key, position, line)
+            tuples, each in ascending order of (key, position), such as the
+            output of sort_records.
+
+    Yields:
+        (key, position, line) tuples in ascending order of key, with only the
+        record with the greatest position for each key.
+    """
+    previous = None
+    for record in heapq.merge(*sorted_records):
+        if previous is not None and previous[0] != record[0]:
+            yield previous
+        previous = record
+    if previous is not None:
+        yield previous
+
+
+def _add_run(levels, level_index, run, temp_dir):
+    """Adds a run to a level, merging the level into the next when it is full.
+
+    The order of records with the same key does not depend on the order of runs,
+    since merge_records orders them by position, so merged runs may be kept on
+    any level.
+    """
+    if level_index == len(levels):
+        levels.append([])
+    level = levels[level_index]
+    level.append(run)
+    if len(level) >= _MERGE_FANOUT:
+        merged_run = _write_run(
+            merge_records([_read_run(level_run) for level_run in level]),
+            temp_dir)
+        _close(level)
+        del level[:]
+        _add_run(levels, level_index + 1, merged_run, temp_dir)
+
+
+def _write_run(records, temp_dir):
+    """Writes sorted (key, position, line) tuples to a new temporary file."""
+    run = tempfile.TemporaryFile(dir=temp_dir)
+    record_count = 0
+    for record in records:
+        marshal.dump(record, run)
+        record_count += 1
+    run.seek(0)
+    pipeline_stats.count('sort_runs_written')
+    pipeline_stats.count('sort_records_written', record_count)
+    return run
+
+
+def _read_run(run):
+    """Yields the (key, position, line) tuples of a run."""
+    while True:
+        try:
+            yield marshal.load(run)
+        except EOFError:
+            return
+
+
+def _close(runs):
+    for run in runs:
+        run.close()
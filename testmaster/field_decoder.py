@@ -0,0 +1,152 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Decodes only the fields that a caller needs from a raw NDT result file.
+
+Decoding a raw result into an NdtResult parses every field, including six
+timestamps into timezone-aware datetimes, which dominates the cost of
+converting results. Callers that only need some fields (for example, the CSV
+summary needs throughputs, latency, timestamps and error messages) can instead
+decode a flat dictionary of just those fields. Timestamps are parsed straight
+to integer microseconds since the epoch and errors are reduced to their
+messages, as expected by ResultTableBuilder.append_fields.
+
+If ujson is installed, it is used to parse JSON. Results that the fast decoder
+does not understand (for example, a timestamp in an unexpected format) are
+decoded with the NDT result decoder instead, so both decoders always agree.
+Results that neither decoder understands (for example, valid JSON that is a
+list rather than an object) raise ValueError, like malformed JSON does.
+"""
+
+import functools
+
+import timestamps
+
+try:
+    import ujson
+    _loads = functools.partial(ujson.loads, precise_float=True)
+except ImportError:
+    import json
+    _loads = json.loads
+
+TIME_FIELDS = frozenset(['start_time', 'end_time', 'c2s_start_time',
+                         'c2s_end_time', 's2c_start_time', 's2c_end_time'])
+# Every field that can be decoded.
+FIELDS = TIME_FIELDS | frozenset(
+    ['c2s_throughput', 's2c_throughput', 'latency', 'os', 'os_version',
+     'client', 'client_version', 'browser', 'browser_version', 'errors'])
+
+
+def decode_fields(raw_contents, fields=FIELDS):
+    """Decodes a subset of the fields of a raw NDT result.
+
+    Args:
+        raw_contents: A string containing the contents of a raw result file.
+        fields: An iterable of names of the fields to decode, from FIELDS.
+
+    Returns:
+        A dictionary with an entry for each name in fields. Timestamps are
+        integer microseconds since the epoch, 'errors' is a list of error
+        messages and missing values are None.
+
+    Raises:
+        ValueError: fields includes a name that is not in FIELDS, or
+            raw_contents is not an NDT result.
+    """
+    unknown_fields = set(fields) - FIELDS
+    if unknown_fields:
+        raise ValueError('Unknown fields: %s' %
+                         ', '.join(sorted(unknown_fields)))
+    try:
+        return _decode_fast(raw_contents, fields)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return _decode_slow(raw_contents, fields)
+
+
+def decode_result(decoder, raw_contents):
+    """Decodes a raw NDT result into an NdtResult.
+
+    Args:
+        decoder: An NdtResultDecoder.
+        raw_contents: A string containing the contents of a raw result file.
+
+    Returns:
+        An NdtResult instance.
+
+    Raises:
+        ValueError: raw_contents is not an NDT result, whether because it is
+            not valid JSON or because the JSON is not in the expected form.
+    """
+    try:
+        return decoder.decode(raw_contents)
+    except (AttributeError, KeyError, TypeError) as e:
+        raise ValueError('Not an NDT result: %s' % e)
+
+
+def result_to_fields(result):
+    """Flattens an NdtResult into a dictionary of every field in FIELDS.
+
+    Args:
+        result: An NdtResult instance.
+
+    Returns:
+        A dictionary in the form returned by decode_fields.
+    """
+    return {
+        'c2s_throughput': result.c2s_result.throughput,
+        's2c_throughput': result.s2c_result.throughput,
+        'latency': result.latency,
+        'start_time': timestamps.datetime_to_us(result.start_time),
+        'end_time': timestamps.datetime_to_us(result.end_time),
+        'c2s_start_time':
+        timestamps.datetime_to_us(result.c2s_result.start_time),
+        'c2s_end_time': timestamps.datetime_to_us(result.c2s_result.end_time),
+        's2c_start_time':
+        timestamps.datetime_to_us(result.s2c_result.start_time),
+        's2c_end_time': timestamps.datetime_to_us(result.s2c_result.end_time),
+        'browser': result.browser,
+        'browser_version': result.browser_version,
+        'os': result.os,
+        'os_version': result.os_version,
+        'client': result.client,
+        'client_version': result.client_version,
+        'errors': [error.message for error in result.errors],
+    }
+
+
+def _decode_fast(raw_contents, fields):
+    """Decodes fields directly from the result's JSON.
+
+    Raises an AttributeError, KeyError, TypeError or ValueError if the result is
+    not in the expected form.
+    """
+    document = _loads(raw_contents)
+    decoded = {}
+    for field in fields:
+        value = document.get(field)
+        if field in TIME_FIELDS:
+            value = timestamps.iso8601_to_us(value)
+        elif field == 'errors':
+            value = [error['message'] for error in value or []]
+        decoded[field] = value
+    return decoded
+
+
+def _decode_slow(raw_contents, fields):
+    """Decodes fields by way of a full NdtResult."""
+    # Imported here so that modules which only flatten NdtResults, such as
+    # result_table, do not depend on the decoder.
+    from ndt_e2e_clientworker.client_wrapper import result_decoder
+    result = decode_result(result_decoder.NdtResultDecoder(), raw_contents)
+    all_fields = result_to_fields(result)
+    return {field: all_fields[field] for field in fields}
@@ -0,0 +1,320 @@
+#!/usr/bin/python
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Continuously converts NDT result files as they arrive in a directory.
+
+Watches a directory for new NDT result files (JSON) or result packages (zips of
+JSON), parses only those files, and appends a row for each of their results to
+a CSV. Optionally keeps CSVs of aggregate statistics up to date, overall and for
+each time window. Each file is ingested once, when it first appears.
+
+Files that are modified in place after they were ingested are deliberately not
+ingested again: their rows are already in the append-only CSV and their values
+in the running statistics, neither of which can be replaced, so re-ingesting
+them would count their results twice. Producers should write each new batch of
+results to a new file (for example, by writing to a temporary name and renaming
+it into the directory).
+
+Files that cannot be read or parsed, such as corrupt JSON or truncated result
+packages, are logged and quarantined: their paths and errors are written to a
+separate report, and they are not retried.
+
+Progress is saved after each batch of new files, so ingestion resumes where it
+left off after a restart. The names of the files already ingested are kept in an
+append-only log beside the state file, so saving progress does not rewrite
+them. The state file records the lengths of the output CSV, that log and the
+quarantine report as of the last batch; on restart, each is truncated to its
+recorded length, discarding anything written by a batch that was interrupted.
+"""
+
+import argparse
+import contextlib
+import cPickle
+import csv
+import logging
+import os
+import time
+
+import checkpoint
+import csv_convert
+import read_results
+import rollup
+import summary
+import watcher
+
+_QUARANTINE_HEADER = ['path', 'error']
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    state_path = _state_path(args)
+    seen_path = state_path + '.seen'
+    quarantine_path = args.quarantine or args.output + '.quarantine'
+    state = _load_state(state_path, args.output, _group_by(args), args.window,
+                        bool(args.rollup))
+    with checkpoint.open_at(args.output, state['output_bytes']) as output_file:
+        with checkpoint.open_at(seen_path, state['seen_bytes']) as seen_file:
+            with checkpoint.open_at(
+                    quarantine_path,
+                    state['quarantine_bytes']) as quarantine_file:
+                directory_watcher = watcher.DirectoryWatcher(
+                    args.watch, args.settle_time, _read_seen(seen_path))
+                _watch(args, directory_watcher, state_path, state,
+                       (output_file, seen_file, quarantine_file))
+
+
+def _watch(args, directory_watcher, state_path, state, ingester_files):
+    """Ingests new files as they appear, saving state after each batch."""
+    while True:
+        new_paths = directory_watcher.poll()
+        if new_paths:
+            _ingest(new_paths, state, *ingester_files)
+            if args.summary:
+                _save_summary(args.summary, state['summary'])
+            if args.rollup:
+                _save_rollup(args.rollup, state['rollup'])
+            _save_state(state_path, state)
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+def _state_path(args):
+    return args.state or args.output + '.state'
+
+
+def _group_by(args):
+    return [field for field in args.group_by.split(',') if field]
+
+
+def _read_settings(state_path):
+    """Reads the settings of a state file, or returns None if there is none.
+
+    A state file starts with a small dictionary of the settings with which it
+    was created, the summary's group_by fields ('group_by') and the rollup's
+    window, or None if it has no rollup ('window'), so that they can be checked
+    without loading the rest of the state.
+    """
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, 'rb') as state_file:
+        return cPickle.load(state_file)
+
+
+def _settings_mismatch(settings, group_by, window, with_rollup):
+    """Describes how options conflict with a state file's settings, or None."""
+    if settings['group_by'] != group_by:
+        return ('--group-by %s does not match the state file, which groups '
+                'results by %s' % (','.join(group_by),
+                                   ','.join(settings['group_by']) or 'nothing'))
+    if with_rollup and settings['window'] is None:
+        return ('the state file was created without --rollup, so it has no '
+                'rollup to write')
+    if with_rollup and settings['window'] != window:
+        return ('--window %s does not match the state file, whose rollup has '
+                '%s windows' % (window, settings['window']))
+    return None
+
+
+def _load_state(state_path, output_path, group_by, window, with_rollup):
+    """Loads the running summary and rollup and the lengths of ingester files.
+
+    If the state file does not exist, creates one for an empty output. A rollup
+    is kept only if with_rollup is set when the state file is created, and the
+    summary's grouping and the rollup's window cannot change afterwards.
+
+    Returns:
+        A dict of the running summary.Summary ('summary'), rollup.Rollup or None
+        ('rollup'), and the lengths in bytes of the output CSV
+        ('output_bytes'), seen log ('seen_bytes') and quarantine report
+        ('quarantine_bytes') as of the last batch.
+
+    Raises:
+        ValueError: group_by, window or with_rollup conflict with the settings
+            of the state file, or the state file does not exist but the output
+            CSV is not empty.
+    """
+    if os.path.exists(state_path):
+        with open(state_path, 'rb') as state_file:
+            mismatch = _settings_mismatch(
+                cPickle.load(state_file), group_by, window, with_rollup)
+            if mismatch:
+                raise ValueError('%s: %s' % (state_path, mismatch))
+            return cPickle.load(state_file)
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        raise ValueError('%s is not empty, but there is no state file %s '
+                         'recording what it contains' %
+                         (output_path, state_path))
+    result_rollup = None
+    if with_rollup:
+        result_rollup = rollup.Rollup(window, group_by)
+    state = {'summary': summary.Summary(group_by),
+             'rollup': result_rollup,
+             'output_bytes': 0,
+             'seen_bytes': 0,
+             'quarantine_bytes': 0}
+    _save_state(state_path, state)
+    return state
+
+
+def _read_seen(seen_path):
+    """Reads the names of the files already ingested from the seen log."""
+    with open(seen_path, 'rb') as seen_file:
+        return set(line.rstrip('\n') for line in seen_file)
+
+
+def _ingest(result_paths, state, output_file, seen_file, quarantine_file):
+    """Ingests a batch of new result files.
+
+    Appends the results in result_paths to the output CSV, the names of the
+    files to the seen log and any files that could not be parsed to the
+    quarantine report, then syncs them to disk and updates state, which must be
+    saved afterwards.
+
+    Args:
+        result_paths: A list of paths to NDT result files to parse.
+        state: The ingester state, as returned by _load_state.
+        output_file: The output CSV, open for appending. The header row is
+            written if it is empty.
+        seen_file: The seen log, open for appending.
+        quarantine_file: The quarantine report, open for appending. The header
+            row is written if it is empty.
+    """
+    results = []
+    failures = []
+    for result_path in result_paths:
+        # A file's results are kept only if all of them parse, so that a
+        # package with a bad member is quarantined as a whole.
+        try:
+            path_results = list(read_results.iter_results([result_path]))
+        except read_results.INPUT_ERRORS as e:
+            error = '%s: %s' % (type(e).__name__, e)
+            logging.error('Quarantined %s: %s', result_path, error)
+            failures.append((result_path, error))
+            continue
+        results.extend(path_results)
+    csv_convert.write_ndt_results_csv(results,
+                                      output_file,
+                                      header=output_file.tell() == 0)
+    for result_path in result_paths:
+        seen_file.write(os.path.basename(result_path) + '\n')
+    quarantine_writer = csv.writer(quarantine_file)
+    if failures and not quarantine_file.tell():
+        quarantine_writer.writerow(_QUARANTINE_HEADER)
+    quarantine_writer.writerows(failures)
+    for ingester_file in (output_file, seen_file, quarantine_file):
+        checkpoint.sync(ingester_file)
+
+    for _, result in results:
+        state['summary'].add(result)
+    if state['rollup'] is not None:
+        state['rollup'].add_results(results)
+    state['output_bytes'] = output_file.tell()
+    state['seen_bytes'] = seen_file.tell()
+    state['quarantine_bytes'] = quarantine_file.tell()
+    logging.info('Ingested %d results from %d files (%d quarantined)',
+                 len(results), len(result_paths), len(failures))
+
+
+def _save_summary(summary_path, result_summary):
+    with _atomic_write(summary_path) as summary_file:
+        summary.write_summary_csv(result_summary.summaries(),
+                                  result_summary.group_by, summary_file)
+
+
+def _save_rollup(rollup_path, result_rollup):
+    with _atomic_write(rollup_path) as rollup_file:
+        summary.write_summary_csv(result_rollup.summaries(),
+                                  ['window_start'] + result_rollup.group_by,
+                                  rollup_file)
+
+
+def _save_state(state_path, state):
+    settings = {'group_by': state['summary'].group_by, 'window': None}
+    if state['rollup'] is not None:
+        settings['window'] = state['rollup'].window
+    with _atomic_write(state_path) as state_file:
+        cPickle.dump(settings, state_file, cPickle.HIGHEST_PROTOCOL)
+        cPickle.dump(state, state_file, cPickle.HIGHEST_PROTOCOL)
+
+
+@contextlib.contextmanager
+def _atomic_write(path):
+    """Replaces the contents of path without exposing a partial file."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as temp_file:
+        yield temp_file
+        checkpoint.sync(temp_file)
+    os.rename(temp_path, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='NDT Result ingester',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--watch',
+                        required=True,
+                        help='Directory in which new result files arrive')
+    parser.add_argument('--output',
+                        required=True,
+                        help='Path to CSV to which to append results')
+    parser.add_argument('--summary',
+                        help=('Path to a CSV of aggregate statistics to keep '
+                              'up to date'))
+    parser.add_argument('--rollup',
+                        help=('Path to a CSV of aggregate statistics for each '
+                              'time window to keep up to date'))
+    parser.add_argument('--window',
+                        choices=rollup.WINDOWS.keys(),
+                        default='1h',
+                        help=('Size of the time windows of the rollup (fixed '
+                              'when the state file is created)'))
+    parser.add_argument('--group-by',
+                        default='',
+                        help=('Comma-separated list of fields by which to '
+                              'group the summary (any of %s)' %
+                              ', '.join(summary.GROUP_FIELDS)))
+    parser.add_argument(
+        '--quarantine',
+        help=('Path to CSV to which to write the paths of files '
+              'that cannot be parsed (default: '
+              'OUTPUT.quarantine)'))
+    parser.add_argument('--state',
+                        help=('Path to file in which to save progress '
+                              '(default: OUTPUT.state)'))
+    parser.add_argument('--interval',
+                        type=float,
+                        default=10.0,
+                        help='Seconds to wait between polls of the directory')
+    parser.add_argument('--settle-time',
+                        type=float,
+                        default=5.0,
+                        help=('Seconds a file must go unmodified before it '
+                              'is ingested, so partially written files are '
+                              'not read'))
+    parser.add_argument('--once',
+                        action='store_true',
+                        help='Poll the directory once, then exit')
+    args = parser.parse_args()
+    for field in _group_by(args):
+        if field not in summary.GROUP_FIELDS:
+            parser.error('Cannot group results by %s' % field)
+    state_settings = _read_settings(_state_path(args))
+    if state_settings:
+        settings_mismatch = _settings_mismatch(state_settings, _group_by(args),
+                                               args.window, bool(args.rollup))
+        if settings_mismatch:
+            parser.error(settings_mismatch)
+    main(args)
@@ -14,27 +14,431 @@
 # limitations under the License.
 """Converts NDT result files to a single CSV describing all results.
 
-Given a pattern of files, finds the NDT result files (JSON) or result packages
-(zips of JSON) and parses their contents to produce a CSV of results.
+Given a pattern of files and/or directories to search recursively, finds the NDT
+result files (JSON) or result packages (zips of JSON) and parses their contents
+to produce a CSV of results.
 """
 
 import argparse
+import cProfile
+import functools
 import glob
+import json
+import operator
+import sys
+import timeit
 
+import checkpoint
 import csv_convert
+import dedupe
+import discovery
+import field_decoder
+import pipeline_stats
 import read_results
+import sharding
+import summary
+
+# Modules that depend on numpy or SQLite (columnar_export, query, result_cache
+# and result_table) are imported only by the options that use them, so that a
+# conversion of a few files, as run from upload hooks, starts quickly.
+
+_BYTES_PER_MEGABYTE = 1024 * 1024
+# Fields that --where may compare (see query.FIELDS).
+_QUERY_FIELDS = sorted(field_decoder.FIELDS - frozenset(['errors']))
 
 
 def main(args):
-    results = read_results.parse_files(glob.glob(args.pattern))
-    print csv_convert.ndt_results_to_csv(results)
+    profiler = None
+    if args.cprofile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start_time = timeit.default_timer()
+    try:
+        _convert_with_cache(args)
+    finally:
+        wall_time = timeit.default_timer() - start_time
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        _report_stats(args, wall_time)
+
+
+def _convert_with_cache(args):
+    cache = None
+    if args.cache:
+        import result_cache
+        cache = result_cache.ResultCache(args.cache)
+        if args.clear_cache:
+            cache.invalidate()
+    try:
+        _convert(args, cache)
+    finally:
+        if cache:
+            cache.evict(max_entries=args.cache_max_entries)
+            cache.close()
+
+
+def _convert(args, cache):
+    if args.shard:
+        _write_partial(args)
+        return
+    if args.checkpoint:
+        checkpoint.convert(
+            _result_paths(args), args.output, args.checkpoint,
+            args.quarantine or args.output + '.quarantine',
+            args.checkpoint_interval, args.jobs)
+        return
+    if args.format != 'csv':
+        _export_columnar(args, cache)
+        return
+    # --where needs every field that a query may select on.
+    fields = field_decoder.FIELDS if args.where else csv_convert.CSV_FIELDS
+    if args.duplicates:
+        records = _parse_deduplicated(args, fields)
+        if args.where:
+            records = _select(args, records)
+        print csv_convert.ndt_fields_to_csv(records)
+        return
+    # Without a cache, decode only the fields that the CSV needs, which is
+    # faster than decoding full NdtResults.
+    if args.stream:
+        result_paths = sorted(_result_paths(args))
+        if cache:
+            csv_convert.write_ndt_results_csv(
+                read_results.iter_results(result_paths, args.jobs, cache),
+                sys.stdout)
+        else:
+            csv_convert.write_ndt_fields_csv(
+                read_results.iter_fields(result_paths, csv_convert.CSV_FIELDS,
+                                         args.jobs, args.prefetch), sys.stdout)
+        return
+    if args.sort_memory:
+        _convert_sorted(args, cache)
+        return
+    if cache:
+        results = read_results.parse_files(
+            _result_paths(args), args.jobs, cache)
+        if args.where:
+            results = _select(args, results, parsed_results=True)
+        print csv_convert.ndt_results_to_csv(results)
+    else:
+        records = read_results.parse_fields(
+            _result_paths(args), fields, args.jobs, args.prefetch)
+        if args.where:
+            records = _select(args, records)
+        print csv_convert.ndt_fields_to_csv(records)
+
+
+def _write_partial(args):
+    """Writes the partial summary of the shard selected by --shard."""
+    index, count = args.shard
+    memory_budget = float('inf')
+    if args.sort_memory:
+        memory_budget = int(args.sort_memory * _BYTES_PER_MEGABYTE)
+    with open(args.output, 'wb') as output_file:
+        sharding.write_partial(
+            _result_paths(args), index, count, _group_by(args), output_file,
+            args.jobs, memory_budget)
+
+
+def _group_by(args):
+    return [field for field in args.group_by.split(',') if field]
+
+
+def _convert_sorted(args, cache):
+    """Writes the CSV in filename order, sorting within --sort-memory."""
+    memory_budget = int(args.sort_memory * _BYTES_PER_MEGABYTE)
+    if cache:
+        csv_convert.write_sorted_ndt_results_csv(
+            read_results.iter_results(
+                _result_paths(args), args.jobs, cache), sys.stdout,
+            memory_budget)
+    else:
+        csv_convert.write_sorted_ndt_fields_csv(
+            read_results.iter_fields(
+                _result_paths(args), csv_convert.CSV_FIELDS, args.jobs,
+                args.prefetch), sys.stdout, memory_budget)
+    # Matches the newline that print adds after the CSV in the other modes.
+    sys.stdout.write('\n')
+
+
+def _parse_deduplicated(args, fields):
+    """Parses results, resolving and reporting results that share a basename.
+
+    Returns:
+        A dictionary of field dictionaries, keyed as in ResultIndex.results.
+    """
+    decode = functools.partial(field_decoder.decode_fields, fields=fields)
+    index = dedupe.parse_files(
+        _result_paths(args), args.duplicates, decode, args.prefetch)
+    for conflict in index.conflicts():
+        sys.stderr.write('Conflicting results for %s: %s (kept %s)\n' %
+                         (conflict.filename,
+                          ', '.join(str(source) for source in conflict.sources),
+                          ', '.join(str(source) for source in conflict.kept)))
+    return index.results()
+
+
+def _select(args, records, parsed_results=False):
+    """Selects the results that match the --where query.
+
+    Args:
+        args: The parsed command-line arguments.
+        records: A dictionary of field dictionaries, keyed by filename.
+        parsed_results: True if the values of records are NdtResults rather
+            than field dictionaries.
+
+    Returns:
+        A dictionary of the records that match the query.
+    """
+    import query
+    import result_table
+    build_table = result_table.ResultTable.from_fields
+    if parsed_results:
+        build_table = result_table.ResultTable.from_results
+    records = sorted(records.items(), key=operator.itemgetter(0))
+    with pipeline_stats.timer('query'):
+        rows = query.select(build_table(records), args.where)
+    pipeline_stats.count('results_selected', len(rows))
+    return dict(records[row] for row in rows)
+
+
+def _result_paths(args):
+    """Returns the paths matching --pattern and found under each --input."""
+    result_paths = []
+    with pipeline_stats.timer('find_inputs'):
+        if args.pattern:
+            result_paths.extend(glob.glob(args.pattern))
+        if args.input:
+            result_paths.extend(discovery.find_result_files(
+                args.input, args.include, args.exclude, args.scan_threads))
+    pipeline_stats.count('input_paths', len(result_paths))
+    # Sorting makes the output, including which of several results with the
+    # same filename wins, independent of directory listing order, so that it
+    # matches the merged output of a sharded run.
+    return sorted(result_paths)
+
+
+def _report_stats(args, wall_time):
+    """Writes pipeline statistics as requested by --profile and --metrics."""
+    stats = pipeline_stats.snapshot()
+    if args.profile:
+        pipeline_stats.write_report(stats, wall_time, sys.stderr)
+    if args.metrics:
+        stats['wall_seconds'] = wall_time
+        with open(args.metrics, 'w') as metrics_file:
+            json.dump(stats, metrics_file, indent=2, sort_keys=True)
+
+
+def _export_columnar(args, cache):
+    import result_table
+    if args.duplicates:
+        records = sorted(
+            _parse_deduplicated(args, field_decoder.FIELDS).items(),
+            key=operator.itemgetter(0))
+        _write_columnar(args, result_table.ResultTable.from_fields(records))
+        return
+    result_paths = _result_paths(args)
+    if args.stream:
+        result_paths = sorted(result_paths)
+    if cache:
+        records = read_results.iter_results(result_paths, args.jobs, cache)
+        build_table = result_table.ResultTable.from_results
+    else:
+        records = read_results.iter_fields(result_paths, field_decoder.FIELDS,
+                                           args.jobs, args.prefetch)
+        build_table = result_table.ResultTable.from_fields
+    if not args.stream:
+        # As in parse_files, the last result with each filename wins.
+        records = sorted(dict(records).items(), key=operator.itemgetter(0))
+    _write_columnar(args, build_table(records))
+
+
+def _write_columnar(args, table):
+    import columnar_export
+    import query
+    if args.where:
+        with pipeline_stats.timer('query'):
+            table = table.take(query.select(table, args.where))
+        pipeline_stats.count('results_selected', len(table))
+    if args.format == 'npz':
+        columnar_export.write_npz(table, args.output)
+    else:
+        columnar_export.write_parquet(table, args.output)
+
+
+def _shard(text):
+    try:
+        return sharding.parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _query(text):
+    import query
+    try:
+        return query.parse(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
         prog='NDT Result JSON to CSV converter',
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('--pattern',
-                        required=True,
-                        help="Glob pattern of input files")
-    main(parser.parse_args())
+    parser.add_argument('--pattern', help="Glob pattern of input files")
+    parser.add_argument('--input',
+                        action='append',
+                        help=('Directory to search recursively for result '
+                              'files and packages (may be repeated)'))
+    parser.add_argument('--include',
+                        action='append',
+                        help=('Glob pattern of files to read under --input '
+                              'directories (may be repeated; defaults to %s)' %
+                              ' and '.join(discovery.DEFAULT_INCLUDE)))
+    parser.add_argument('--exclude',
+                        action='append',
+                        help=('Glob pattern of files and directories to skip '
+                              'under --input directories (may be repeated)'))
+    parser.add_argument('--scan-threads',
+                        type=int,
+                        default=8,
+                        help=('Number of threads to use to scan --input '
+                              'directories'))
+    parser.add_argument(
+        '--where',
+        type=_query,
+        help=('Convert only the results that match a query, '
+              'such as "browser=chrome and s2c_throughput<5". '
+              'Fields are compared with =, !=, <, <=, > or >= '
+              'and comparisons are combined with and, or, not '
+              'and parentheses. Fields: %s' % ', '.join(_QUERY_FIELDS)))
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of processes to use to parse input files')
+    parser.add_argument('--prefetch',
+                        type=int,
+                        default=0,
+                        help=('Number of input files to read ahead in '
+                              'background threads while results are parsed, '
+                              'to hide the latency of a network file system '
+                              '(ignored with --jobs or --cache)'))
+    parser.add_argument('--stream',
+                        action='store_true',
+                        help=('Write each row as soon as its result is parsed '
+                              '(in input path order, without sorting rows or '
+                              'merging results with the same filename), so '
+                              'that memory use does not grow with the number '
+                              'of results'))
+    parser.add_argument('--sort-memory',
+                        type=float,
+                        metavar='MB',
+                        help=('Sort rows by filename using at most about this '
+                              'many megabytes of memory, spilling sorted runs '
+                              'to temporary files (in $TMPDIR) and merging '
+                              'them. The output is the same as without this '
+                              'option, but the corpus need not fit in memory'))
+    parser.add_argument('--cache',
+                        help=('Path to a parse cache file. Results of input '
+                              'files that are unchanged since a previous run '
+                              'are read from the cache instead of reparsed'))
+    parser.add_argument('--clear-cache',
+                        action='store_true',
+                        help='Discard all cached results before converting')
+    parser.add_argument('--cache-max-entries',
+                        type=int,
+                        help=('Maximum number of input files to keep in the '
+                              'cache (least recently used are evicted first). '
+                              'Entries for deleted files are always evicted'))
+    parser.add_argument('--duplicates',
+                        choices=dedupe.POLICIES,
+                        help=('How to resolve different results with the same '
+                              'filename: keep the first or last one read, or '
+                              'keep all of them, naming conflicting results by '
+                              'their full path. Conflicts are reported on '
+                              'stderr and identical copies are merged. If not '
+                              'specified, the last one read is kept silently'))
+    parser.add_argument('--format',
+                        choices=('csv', 'npz', 'parquet'),
+                        default='csv',
+                        help=('Output format. npz (NumPy) and parquet are '
+                              'typed, full-precision columnar formats'))
+    parser.add_argument(
+        '--output',
+        help=('Path of the file to write for npz and parquet '
+              'formats, --shard or --checkpoint (otherwise, CSV '
+              'is written to stdout)'))
+    parser.add_argument('--shard',
+                        type=_shard,
+                        metavar='I/N',
+                        help=('Process only shard I of N (numbered from 0) of '
+                              'the input paths, and write a partial summary '
+                              'to --output instead of a CSV. Merge the partial '
+                              'summaries of all N shards with '
+                              'merge_partials.py'))
+    parser.add_argument('--checkpoint',
+                        metavar='JOURNAL',
+                        help=('Write the CSV to --output in input path order, '
+                              'as with --stream, recording progress in this '
+                              'checkpoint journal. If the journal exists, the '
+                              'conversion resumes from its last checkpoint. '
+                              'Inputs that cannot be read or decoded are '
+                              'skipped and listed in --quarantine'))
+    parser.add_argument('--checkpoint-interval',
+                        type=int,
+                        default=1000,
+                        metavar='N',
+                        help='Number of input paths to convert per checkpoint')
+    parser.add_argument('--quarantine',
+                        help=('Path of the CSV report of inputs skipped with '
+                              '--checkpoint and their errors (default: '
+                              'OUTPUT.quarantine)'))
+    parser.add_argument('--group-by',
+                        default='',
+                        help=('Comma-separated list of fields by which to '
+                              'group the statistics of a partial summary (any '
+                              'of %s)' % ', '.join(summary.GROUP_FIELDS)))
+    parser.add_argument('--profile',
+                        action='store_true',
+                        help=('Print the time spent in each stage of the '
+                              'conversion and counts of files, bytes and rows '
+                              'processed to stderr. Stages that run in worker '
+                              'processes (with --jobs) are not counted'))
+    parser.add_argument('--cprofile',
+                        help='Path to which to write cProfile statistics')
+    parser.add_argument('--metrics',
+                        help=('Path to which to write stage times and '
+                              'counters as JSON, for comparison across runs'))
+    args = parser.parse_args()
+    if not args.pattern and not args.input:
+        parser.error('at least one of --pattern or --input is required')
+    if args.shard and (args.format != 'csv' or args.stream or args.cache or
+                       args.duplicates or args.where):
+        parser.error('--shard cannot be used with --format, --stream, --cache, '
+                     '--duplicates or --where')
+    if args.shard and not args.output:
+        parser.error('--output is required with --shard')
+    if args.checkpoint and (args.format != 'csv' or args.shard or args.cache or
+                            args.duplicates or args.where or args.sort_memory):
+        parser.error('--checkpoint cannot be used with --format, --shard, '
+                     '--cache, --duplicates, --where or --sort-memory')
+    if args.checkpoint and not args.output:
+        parser.error('--output is required with --checkpoint')
+    if args.checkpoint_interval < 1:
+        parser.error('--checkpoint-interval must be at least 1')
+    for field in _group_by(args):
+        if field not in summary.GROUP_FIELDS:
+            parser.error('Cannot group results by %s' % field)
+    if args.format != 'csv' and not args.output:
+        parser.error('--output is required for %s format' % args.format)
+    if args.duplicates and (args.stream or args.cache or args.jobs > 1):
+        parser.error('--duplicates cannot be used with --stream, --cache or '
+                     '--jobs')
+    if args.sort_memory and (args.format != 'csv' or args.stream or
+                             args.duplicates or args.where):
+        parser.error('--sort-memory can only be used for csv format, without '
+                     '--stream, --duplicates or --where')
+    if args.where and args.stream and args.format == 'csv':
+        parser.error('--where cannot be used with --stream for csv format')
+    main(args)
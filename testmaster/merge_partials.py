@@ -0,0 +1,54 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Merges the partial summaries of a sharded conversion of NDT results.
+
+Given the partial summary files written by json_to_csv.py --shard for every
+shard of a corpus, writes the same CSV of results to stdout as a single
+json_to_csv.py run over the whole corpus, and optionally the same statistics
+as summarize.py --exact.
+"""
+
+import argparse
+import sys
+
+import sharding
+import summary
+
+
+def main(args):
+    partial_files = [open(path, 'rb') for path in args.partials]
+    try:
+        merged_summary = sharding.merge_partials(partial_files, sys.stdout)
+    finally:
+        for partial_file in partial_files:
+            partial_file.close()
+    # Matches the newline that json_to_csv.py prints after the CSV.
+    sys.stdout.write('\n')
+    if args.summary:
+        with open(args.summary, 'w') as summary_file:
+            summary.write_summary_csv(merged_summary.summaries(),
+                                      merged_summary.group_by, summary_file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='NDT Result partial summary merger',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('partials',
+                        nargs='+',
+                        help='Partial summary files, one for each shard')
+    parser.add_argument('--summary',
+                        help=('Path to which to write the statistics of the '
+                              'merged results as CSV'))
+    main(parser.parse_args())
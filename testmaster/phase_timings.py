@@ -0,0 +1,61 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Writes the timing of each phase of the NDT tests in result packages.
+
+Given a pattern of files, finds the result packages (zips of JSON) and parses
+the client_wrapper logs inside them to produce a CSV with the duration, in
+seconds, of each phase of the test that produced each packaged result.
+"""
+
+import argparse
+import csv
+import glob
+import sys
+
+import client_log
+
+_MICROSECONDS_PER_HOUR = 3600 * 10**6
+
+
+def main(args):
+    csv_writer = csv.writer(sys.stdout)
+    csv_writer.writerow(['filename'] + client_log.PHASES.keys())
+    utc_offset_us = int(round(args.log_utc_offset * _MICROSECONDS_PER_HOUR))
+    for filename, timings in client_log.iter_phase_timings(
+            sorted(glob.glob(args.pattern)), utc_offset_us):
+        timings = timings or {}
+        csv_writer.writerow([filename] + [_format_seconds(timings.get(phase))
+                                          for phase in client_log.PHASES])
+
+
+def _format_seconds(value):
+    if value is None:
+        return ''
+    return '%.3f' % value
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='NDT test phase timings',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--pattern',
+                        required=True,
+                        help="Glob pattern of input files")
+    parser.add_argument('--log-utc-offset',
+                        type=float,
+                        default=0.0,
+                        help=('Offset from UTC, in hours, of the local time of '
+                              'the hosts that wrote the client_wrapper logs '
+                              '(for example, -4 for EDT)'))
+    main(parser.parse_args())
@@ -0,0 +1,189 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Counts events and times stages of the result conversion pipeline.
+
+The pipeline modules record counters (such as files seen and bytes read) and
+the time spent in each stage (such as reading and decoding results) in a single
+process-wide set of statistics. Recording a value is a locked dictionary
+update, so instrumentation is always on and may be used from several threads.
+Code that runs once per result gathers its statistics locally and records them
+in batches (see record), so that the locking does not slow the pipeline.
+Statistics recorded in worker processes are not included.
+"""
+
+import collections
+import contextlib
+import operator
+import threading
+import timeit
+
+_clock = timeit.default_timer
+_counters = collections.defaultdict(int)
+_stage_times = collections.defaultdict(float)
+# The sum of _stage_times, kept so that exclusive_timer need not add them up.
+_total_time = [0.0]
+_lock = threading.Lock()
+
+
+def count(name, increment=1):
+    """Adds to a counter.
+
+    Args:
+        name: The name of the counter.
+        increment: The amount to add.
+    """
+    with _lock:
+        _counters[name] += increment
+
+
+def record(counters, stage_seconds):
+    """Adds to several counters and stage times in a single locked update.
+
+    Code that handles many small items can gather its statistics locally and
+    record them in batches, rather than paying for a locked update per item.
+
+    Args:
+        counters: A dictionary of the amount to add to each counter, by name.
+        stage_seconds: A dictionary of the time to add to each stage, in
+            seconds, by name.
+    """
+    with _lock:
+        for name, increment in counters.iteritems():
+            _counters[name] += increment
+        for stage, seconds in stage_seconds.iteritems():
+            _stage_times[stage] += seconds
+            _total_time[0] += seconds
+
+
+def clock():
+    """Returns the current time, in seconds, on the clock that times stages."""
+    return _clock()
+
+
+def add_time(stage, seconds):
+    """Adds to the time spent in a stage.
+
+    Args:
+        stage: The name of the stage.
+        seconds: The time to add, in seconds.
+    """
+    with _lock:
+        _stage_times[stage] += seconds
+        _total_time[0] += seconds
+
+
+@contextlib.contextmanager
+def timer(stage):
+    """Adds the time spent in the enclosed block to a stage."""
+    start_time = _clock()
+    try:
+        yield
+    finally:
+        add_time(stage, _clock() - start_time)
+
+
+@contextlib.contextmanager
+def exclusive_timer(stage):
+    """Adds the time spent in the enclosed block to a stage, less inner stages.
+
+    Time that other stages record while the block runs, such as the time spent
+    reading and decoding the results of a lazy iterable that the block
+    consumes, is not added, so that it is not counted twice. This lets a whole
+    loop be timed once, rather than each of its items. Stages recorded by other
+    threads while the block runs are also subtracted, so the block should not
+    run alongside other instrumented threads. Inner stages that record their
+    time in batches must finish (as an exhausted iterable does) before the
+    block ends.
+    """
+    start_time = _clock()
+    start_total = _total_time[0]
+    try:
+        yield
+    finally:
+        inner_time = _total_time[0] - start_total
+        add_time(stage, max(0.0, _clock() - start_time - inner_time))
+
+
+def timed(iterable, stage):
+    """Yields the items of an iterable, timing how long each takes to produce.
+
+    Only the time spent producing items is added to the stage, not the time
+    the caller spends between items.
+
+    Args:
+        iterable: The iterable to time.
+        stage: The name of the stage to which to add the time.
+
+    Yields:
+        Each item of iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        start_time = _clock()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            add_time(stage, _clock() - start_time)
+        yield item
+
+
+def snapshot():
+    """Returns the current statistics.
+
+    Returns:
+        A dictionary with a 'counters' entry, a dictionary of each counter's
+        value, and a 'stage_seconds' entry, a dictionary of the time spent in
+        each stage.
+    """
+    with _lock:
+        return {'counters': dict(_counters),
+                'stage_seconds': dict(_stage_times)}
+
+
+def reset():
+    """Sets every counter and stage time back to zero."""
+    with _lock:
+        _counters.clear()
+        _stage_times.clear()
+        _total_time[0] = 0.0
+
+
+def write_report(stats, wall_time, output_file):
+    """Writes a human-readable breakdown of statistics.
+
+    Args:
+        stats: Statistics, as returned by snapshot.
+        wall_time: The total elapsed time, in seconds. Time not spent in any
+            stage is reported as 'other'.
+        output_file: A file-like object to which to write the report.
+    """
+    stage_seconds = stats['stage_seconds']
+    output_file.write('%-24s %10s %7s\n' % ('stage', 'seconds', '%'))
+    rows = sorted(stage_seconds.items(),
+                  key=operator.itemgetter(1),
+                  reverse=True)
+    rows.append(('other', max(0.0, wall_time - sum(stage_seconds.values()))))
+    for stage, seconds in rows:
+        output_file.write('%-24s %10.3f %7.1f\n' %
+                          (stage, seconds, _percent(seconds, wall_time)))
+    output_file.write('%-24s %10.3f\n' % ('total', wall_time))
+    output_file.write('\n%-24s %10s\n' % ('counter', 'value'))
+    for name, value in sorted(stats['counters'].items()):
+        output_file.write('%-24s %10d\n' % (name, value))
+
+
+def _percent(part, whole):
+    return 100.0 * part / whole if whole else 0.0
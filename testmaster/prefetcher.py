@@ -0,0 +1,59 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Overlaps slow reads with processing by reading ahead in background threads.
+
+On a network file system, the time to open a file or fetch a zip archive's
+central directory is dominated by round trips to the server rather than by CPU,
+so reading one file at a time leaves the parser idle while it waits. imap reads
+a bounded number of items ahead across a pool of threads, which wait on I/O
+concurrently (the GIL is released while they block), while the caller
+processes items that have already been read.
+"""
+
+import collections
+import multiprocessing.pool
+
+
+def imap(function, iterable, depth):
+    """Applies a function to each item of an iterable, reading ahead in threads.
+
+    Like itertools.imap, but up to depth calls run ahead of the caller in a
+    pool of depth threads. Results are yielded in input order, and at most depth
+    results are pending (running or waiting for the caller) at a time, so depth
+    bounds both the I/O in flight and the memory held by prefetched results.
+
+    Args:
+        function: A function of one argument. It must be safe to call from
+            several threads at once.
+        iterable: The items to which to apply function.
+        depth: The number of calls to keep in flight.
+
+    Yields:
+        function(item) for each item of iterable, in order. If a call raises an
+        exception, it is raised when that call's result would have been
+        yielded.
+    """
+    pool = multiprocessing.pool.ThreadPool(max(1, depth))
+    pending = collections.deque()
+    try:
+        for item in iterable:
+            if len(pending) >= depth:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(function, (item,)))
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,316 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Selects NDT results with a small query language, backed by field indexes.
+
+A query is a boolean expression of comparisons between a field and a value,
+for example:
+
+    browser=chrome and os=Windows and s2c_throughput<5
+
+Comparisons may be combined with 'and', 'or', 'not' and parentheses. Fields are
+the categorical fields of a ResultTable (such as browser and client_version),
+which support = and !=, and its numeric fields (throughputs, latency and
+timestamps), which also support <, <=, > and >=. Timestamps are compared with
+UTC ISO 8601 values such as 2016-05-24T16:00:00Z. Values that contain spaces
+or operators may be quoted with single or double quotes. A comparison with a
+missing value is never true.
+
+A TableIndex is built once for a ResultTable: a hash index from each value of
+each categorical field to the rows with that value, and each numeric column's
+rows sorted by value. Each comparison is then answered with a dictionary
+lookup or a binary search rather than a scan of the table, so any number of
+queries can be run against the same corpus cheaply.
+"""
+
+import collections
+import functools
+import re
+
+import numpy
+
+import result_table
+import timestamps
+
+_NUMERIC_FIELDS = result_table.FLOAT_COLUMNS + result_table.TIME_COLUMNS
+FIELDS = result_table.CATEGORICAL_COLUMNS + _NUMERIC_FIELDS
+OPERATORS = ('=', '!=', '<', '<=', '>', '>=')
+
+_TOKEN_PATTERN = re.compile(r'''\s*(?:
+    (?P<parenthesis>[()])|
+    (?P<operator><=|>=|!=|=|<|>)|
+    "(?P<double_quoted>[^"]*)"|
+    '(?P<single_quoted>[^']*)'|
+    (?P<word>[^\s()=!<>'"]+))''', re.VERBOSE)
+_KEYWORDS = ('and', 'or', 'not')
+
+# A comparison of a field with a value. value is a string for categorical
+# fields, a float for float fields and integer microseconds since the epoch for
+# timestamp fields.
+Condition = collections.namedtuple('Condition', ['field', 'operator', 'value'])
+# operands are all true ('and') or any is true ('or').
+Combination = collections.namedtuple('Combination', ['operator', 'operands'])
+Negation = collections.namedtuple('Negation', ['operand'])
+
+
+def parse(text):
+    """Parses a query.
+
+    Args:
+        text: The query, for example 'browser=chrome and latency<100'.
+
+    Returns:
+        The query as a tree of Condition, Combination and Negation tuples.
+
+    Raises:
+        ValueError: The query is malformed.
+    """
+    parser = _Parser(_tokenize(text))
+    expression = parser.expression()
+    if parser.peek() is not None:
+        raise ValueError('Unexpected %s in query' % parser.peek()[1])
+    return expression
+
+
+def select(table, query):
+    """Returns the rows of a ResultTable that match a query.
+
+    Builds a TableIndex for the table. To run several queries against the same
+    table, build one TableIndex and call its select method instead.
+
+    Args:
+        table: A ResultTable.
+        query: A query string or a query parsed with parse.
+
+    Returns:
+        An int64 array of the matching rows, in ascending order.
+    """
+    return TableIndex(table).select(query)
+
+
+class TableIndex(object):
+    """Indexes the fields of a ResultTable to answer queries quickly."""
+
+    def __init__(self, table):
+        """Builds the indexes of a table.
+
+        Args:
+            table: A ResultTable.
+        """
+        self._row_count = len(table)
+        # For each categorical field, a dictionary of the rows with each value.
+        self._value_rows = {}
+        for field in result_table.CATEGORICAL_COLUMNS:
+            self._value_rows[field] = _hash_index(table.categoricals[field])
+        # For each numeric field, the rows that have a value, ordered by value,
+        # and their values in that order.
+        self._sorted_rows = {}
+        self._sorted_values = {}
+        for field in _NUMERIC_FIELDS:
+            values = table.columns[field]
+            if field in result_table.TIME_COLUMNS:
+                present = values != result_table.MISSING_TIME
+            else:
+                present = ~numpy.isnan(values)
+            rows = numpy.flatnonzero(present)
+            order = numpy.argsort(values[rows], kind='mergesort')
+            self._sorted_rows[field] = rows[order]
+            self._sorted_values[field] = values[rows][order]
+
+    def select(self, query):
+        """Returns the rows of the table that match a query.
+
+        Args:
+            query: A query string or a query parsed with parse.
+
+        Returns:
+            An int64 array of the matching rows, in ascending order.
+
+        Raises:
+            ValueError: query is a malformed query string.
+        """
+        if isinstance(query, basestring):
+            query = parse(query)
+        return self._evaluate(query)
+
+    def _evaluate(self, query):
+        if isinstance(query, Negation):
+            return numpy.setdiff1d(
+                numpy.arange(self._row_count),
+                self._evaluate(query.operand),
+                assume_unique=True)
+        if isinstance(query, Combination):
+            operand_rows = [self._evaluate(operand)
+                            for operand in query.operands]
+            if query.operator == 'or':
+                return reduce(numpy.union1d, operand_rows)
+            # Intersect the smallest sets first, so each step is cheap.
+            operand_rows.sort(key=len)
+            return reduce(
+                functools.partial(numpy.intersect1d,
+                                  assume_unique=True),
+                operand_rows)
+        if query.field in self._value_rows:
+            return self._evaluate_categorical(query)
+        return self._evaluate_numeric(query)
+
+    def _evaluate_categorical(self, condition):
+        value_rows = self._value_rows[condition.field]
+        if condition.operator == '=':
+            return value_rows.get(condition.value, _NO_ROWS)
+        # '!=' matches every other non-missing value.
+        other_rows = [rows for value, rows in value_rows.iteritems()
+                      if value != condition.value]
+        if not other_rows:
+            return _NO_ROWS
+        return numpy.sort(numpy.concatenate(other_rows))
+
+    def _evaluate_numeric(self, condition):
+        values = self._sorted_values[condition.field]
+        rows = self._sorted_rows[condition.field]
+        operator = condition.operator
+        value = condition.value
+        if operator == '!=':
+            start = numpy.searchsorted(values, value, 'left')
+            end = numpy.searchsorted(values, value, 'right')
+            matches = numpy.concatenate([rows[:start], rows[end:]])
+        else:
+            start, end = 0, len(values)
+            if operator in ('=', '>='):
+                start = numpy.searchsorted(values, value, 'left')
+            elif operator == '>':
+                start = numpy.searchsorted(values, value, 'right')
+            if operator in ('=', '<='):
+                end = numpy.searchsorted(values, value, 'right')
+            elif operator == '<':
+                end = numpy.searchsorted(values, value, 'left')
+            matches = rows[start:end]
+        return numpy.sort(matches)
+
+
+_NO_ROWS = numpy.empty(0, dtype=numpy.int64)
+
+
+def _hash_index(categorical):
+    """Returns a dictionary of the sorted rows with each non-missing value."""
+    order = numpy.argsort(categorical.codes, kind='mergesort')
+    codes = categorical.codes[order]
+    boundaries = numpy.flatnonzero(codes[1:] != codes[:-1]) + 1
+    value_rows = {}
+    for rows in numpy.split(order, boundaries):
+        if len(rows):
+            value = categorical.categories[categorical.codes[rows[0]]]
+            if value is not None:
+                value_rows[value] = rows.astype(numpy.int64)
+    return value_rows
+
+
+def _tokenize(text):
+    """Splits a query into a list of (kind, text) tuples."""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if not match:
+            raise ValueError('Cannot parse query at: %s' % text[position:])
+        kind = match.lastgroup
+        token = match.group(kind)
+        if kind in ('double_quoted', 'single_quoted'):
+            kind = 'value'
+        elif kind == 'word' and token.lower() in _KEYWORDS:
+            kind = 'keyword'
+            token = token.lower()
+        tokens.append((kind, token))
+        position = match.end()
+    return tokens
+
+
+class _Parser(object):
+    """A recursive descent parser of query tokens.
+
+    Grammar:
+        expression := term ('or' term)*
+        term := factor ('and' factor)*
+        factor := 'not' factor | '(' expression ')' | field operator value
+    """
+
+    def __init__(self, tokens):
+        self._tokens = tokens
+        self._position = 0
+
+    def peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return None
+
+    def _next(self, description):
+        token = self.peek()
+        if token is None:
+            raise ValueError('Expected %s at end of query' % description)
+        self._position += 1
+        return token
+
+    def _accept(self, kind, text):
+        if self.peek() == (kind, text):
+            self._position += 1
+            return True
+        return False
+
+    def expression(self):
+        operands = [self._term()]
+        while self._accept('keyword', 'or'):
+            operands.append(self._term())
+        return operands[0] if len(operands) == 1 else Combination('or',
+                                                                  operands)
+
+    def _term(self):
+        operands = [self._factor()]
+        while self._accept('keyword', 'and'):
+            operands.append(self._factor())
+        return operands[0] if len(operands) == 1 else Combination('and',
+                                                                  operands)
+
+    def _factor(self):
+        if self._accept('keyword', 'not'):
+            return Negation(self._factor())
+        if self._accept('parenthesis', '('):
+            expression = self.expression()
+            if not self._accept('parenthesis', ')'):
+                raise ValueError('Expected ) in query')
+            return expression
+        return self._condition()
+
+    def _condition(self):
+        kind, field = self._next('a field')
+        if kind != 'word' or field not in FIELDS:
+            raise ValueError('Unknown query field: %s' % field)
+        kind, operator = self._next('an operator')
+        if kind != 'operator':
+            raise ValueError('Expected an operator after %s' % field)
+        kind, value = self._next('a value')
+        if kind not in ('word', 'value'):
+            raise ValueError('Expected a value after %s%s' % (field, operator))
+        if field in result_table.CATEGORICAL_COLUMNS:
+            if operator not in ('=', '!='):
+                raise ValueError('Cannot compare %s with %s' % (field,
+                                                                operator))
+        elif field in result_table.TIME_COLUMNS:
+            value = timestamps.iso8601_to_us(value)
+        else:
+            try:
+                value = float(value)
+            except ValueError:
+                raise ValueError('Expected a number for %s: %s' % (field,
+                                                                   value))
+        return Condition(field, operator, value)
@@ -12,13 +12,29 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import functools
+import multiprocessing
 import os
 import zipfile
+import zlib
 
-from ndt_e2e_clientworker.client_wrapper import result_decoder
+import compact_result
+import field_decoder
+import pipeline_stats
+import prefetcher
+import result_package
 
+# Errors raised when an input file cannot be read or does not contain valid
+# results, such as a missing file, a corrupt or truncated result package or
+# malformed JSON.
+INPUT_ERRORS = (EnvironmentError, ValueError, zipfile.BadZipfile, zlib.error)
+# Number of results whose statistics are gathered locally before they are
+# recorded in pipeline_stats, as a locked update per result would slow reading.
+_STATS_INTERVAL = 256
 
-def parse_files(result_paths):
+
+def parse_files(result_paths, workers=1, cache=None, prefetch=0):
     """Parses a list of files for the NDT results they contain.
 
     Reads a list of raw files and/or result file packages and parses their
@@ -26,98 +42,423 @@ def parse_files(result_paths):
     within specified packages are ignored.
 
     Note that if multiple files in the list have the same basename, but
-    different contents, results are undefined.
+    different contents, the last one wins. Use dedupe.parse_files to detect and
+    resolve such conflicts.
 
     Args:
         result_paths: A list of paths to NDT result files to parse. These may be
             a combination of raw results (JSON files) and result packages (a
             compressed archive of raw results).
+        workers: The number of processes to use to parse result files. If
+            greater than 1, files and result packages are parsed in parallel
+            across a pool of worker processes. The output is identical to that
+            of parsing serially.
+        cache: An optional ResultCache. If specified, results for paths that
+            are unchanged since they were cached are read from the cache rather
+            than parsed, and newly parsed results are added to the cache.
+        prefetch: The number of paths to read ahead in background threads
+            while results are parsed, which hides the latency of a network
+            file system. Used only if workers is 1 and there is no cache.
 
     Returns:
         A dictionary of NdtResult instances, keyed by filename (only the
         basename).
     """
-    result_files = _read_result_files(result_paths)
-    return _decode_results(result_files)
+    return dict(iter_results(result_paths, workers, cache, prefetch))
 
 
-def _read_result_files(result_paths):
-    """Loads the raw contents of each result file in result files and packages.
+def iter_results(result_paths, workers=1, cache=None, prefetch=0):
+    """Lazily parses a list of files for the NDT results they contain.
 
-    Given a list of paths to NDT result files, finds files that looks like
-    either a raw NDT result file or a package of NDT result files. For raw
-    files, we read the file contents into memory directly. For result packages,
-    we open the package and read the contents of each raw result file in the
-    package into memory. We return the results in a dictionary mapping paths
-    to file contents.
+    Behaves like parse_files, but rather than building a dictionary of every
+    result, yields each result as soon as it is parsed, so that only one raw
+    result file is held in memory at a time. Results are yielded in the order
+    of result_paths (and, within a result package, in the order of the
+    package's members). Results that share a basename are all yielded.
 
     Args:
-        result_paths: A list of paths to NDT result files to parse. These may be
-            a combination of raw results (JSON files) and result packages (a
-            compressed archive of raw results).
+        result_paths: An iterable of paths to NDT result files to parse. These
+            may be a combination of raw results (JSON files) and result packages
+            (a compressed archive of raw results).
+        workers: The number of processes to use to parse result files. If
+            greater than 1, each path in result_paths is parsed by one of a pool
+            of worker processes, but results are still yielded in input order.
+        cache: An optional ResultCache from which to read the results of paths
+            that have not changed since they were cached, and to which to add
+            the results of all other paths.
+        prefetch: The number of paths to read ahead in background threads
+            while results are parsed, which hides the latency of a network
+            file system. Used only if workers is 1 and there is no cache.
 
-    Returns:
-        A dictionary where each key is a file basename and the value is a string
-        containing the contents of the corresponding file.
+    Yields:
+        A (filename, result) tuple for each result file, where filename is the
+        basename of the original result file and result is an NdtResult
+        instance.
     """
-    result_files = {}
-    for filename in result_paths:
-        if _is_raw_result(filename):
-            with open(filename) as result_file:
-                result_files[os.path.basename(filename)] = result_file.read()
-        elif _is_result_package(filename):
-            result_files.update(_read_results_from_package(filename))
-    return result_files
+    if cache:
+        return _iter_cached_results(result_paths, workers, cache)
+    if workers > 1:
+        return _flatten(_iter_path_results(result_paths, workers))
+    return _iter_decoded_results(result_paths, prefetch)
 
 
-def _read_results_from_package(result_package_path):
-    """Loads the raw contents of each result file in a result package.
+def parse_fields(result_paths, fields, workers=1, prefetch=0):
+    """Parses a list of files for selected fields of their NDT results.
 
-    Opens a result package file and, for each raw result file in the package,
-    reads the raw, decompressed contents of the file into memory. Any filenames
-    in the package that are not result files are ignored.
+    Behaves like parse_files, but decodes only the specified fields of each
+    result into a flat dictionary (see field_decoder.decode_fields), which is
+    much faster than decoding full NdtResult instances.
 
     Args:
-        result_package_path: Path to an NDT result package from which to read
-            file contents.
+        result_paths: A list of paths to NDT result files to parse.
+        fields: An iterable of names of the fields to decode, from
+            field_decoder.FIELDS.
+        workers: The number of processes to use to parse result files.
+        prefetch: The number of paths to read ahead in background threads.
 
     Returns:
-        A dictionary where each key is a file basename and the value is a string
-        containing the contents of the corresponding file.
+        A dictionary of field dictionaries, keyed by filename (only the
+        basename).
     """
-    results = {}
-    with zipfile.ZipFile(result_package_path) as result_package:
-        for filename in result_package.namelist():
-            if not _is_raw_result(filename):
-                continue
-            results[os.path.basename(filename)] = result_package.read(filename)
-    return results
+    return dict(iter_fields(result_paths, fields, workers, prefetch))
 
 
-def _is_raw_result(filename):
-    return os.path.splitext(filename)[1] == '.json'
+def iter_fields(result_paths, fields, workers=1, prefetch=0):
+    """Lazily parses a list of files for selected fields of their NDT results.
 
+    Behaves like iter_results, but yields a dictionary of the specified fields
+    of each result rather than an NdtResult instance.
 
-def _is_result_package(filename):
-    return zipfile.is_zipfile(filename)
+    Args:
+        result_paths: An iterable of paths to NDT result files to parse.
+        fields: An iterable of names of the fields to decode, from
+            field_decoder.FIELDS.
+        workers: The number of processes to use to parse result files.
+        prefetch: The number of paths to read ahead in background threads.
+            Used only if workers is 1.
+
+    Yields:
+        A (filename, fields) tuple for each result file, where filename is the
+        basename of the original result file and fields is a dictionary of the
+        decoded fields.
+    """
+    fields = frozenset(fields)
+    if workers > 1:
+        parse_path = functools.partial(_parse_path_fields, fields=fields)
+        return _flatten(_iter_path_results(result_paths, workers, parse_path))
+    return _iter_decoded_fields(result_paths, fields, prefetch)
+
+
+def iter_path_fields(result_paths, fields, workers=1):
+    """Parses each of a list of files for selected fields of its NDT results.
+
+    Behaves like iter_fields, but yields the results of each path together, so
+    that callers can tell which path each result came from.
+
+    Args:
+        result_paths: An iterable of paths to NDT result files to parse.
+        fields: An iterable of names of the fields to decode, from
+            field_decoder.FIELDS.
+        workers: The number of processes to use to parse result files.
+
+    Yields:
+        A list of (filename, fields) tuples for each path in result_paths, in
+        input order. The list is empty for paths that contain no results.
+    """
+    parse_path = functools.partial(_parse_path_fields, fields=frozenset(fields))
+    return _iter_path_results(result_paths, workers, parse_path)
 
 
-def _decode_results(result_files):
-    """Converts a dictionary of raw strings into a dictionary of parsed results.
+def parse_compact_files(result_paths, workers=1, prefetch=0):
+    """Parses a list of files for their NDT results, stored compactly.
 
-    Given a dictionary of filenames -> file content strings, parses the a
-    content strings to produce a dictionary of filenames -> NdtResult objects.
+    Behaves like parse_files, but returns each result as a
+    compact_result.CompactResult, which can be used in place of an NdtResult
+    (for example, by result_metrics and csv_convert) and takes a fraction of the
+    memory, so that a large corpus can be held in memory at once.
 
     Args:
-        result_files: A dictionary of raw strings to parse into NdtResult
-            objects, keyed by their original filename.
+        result_paths: A list of paths to NDT result files to parse.
+        workers: The number of processes to use to parse result files.
+        prefetch: The number of paths to read ahead in background threads.
 
     Returns:
-        A dictionary of NdtResult objects, keyed by the name of the file from
-        which they were parsed.
+        A dictionary of CompactResult instances, keyed by filename (only the
+        basename).
+    """
+    return dict(iter_compact_results(result_paths, workers, prefetch))
+
+
+def iter_compact_results(result_paths, workers=1, prefetch=0):
+    """Lazily parses a list of files for their NDT results, stored compactly.
+
+    Behaves like iter_results, but yields compact_result.CompactResult
+    instances.
+
+    Args:
+        result_paths: An iterable of paths to NDT result files to parse.
+        workers: The number of processes to use to parse result files.
+        prefetch: The number of paths to read ahead in background threads.
+            Used only if workers is 1.
+
+    Yields:
+        A (filename, result) tuple for each result file, where filename is the
+        basename of the original result file and result is a CompactResult.
+    """
+    for filename, fields in iter_fields(result_paths, field_decoder.FIELDS,
+                                        workers, prefetch):
+        yield filename, compact_result.CompactResult(fields)
+
+
+def _iter_cached_results(result_paths, workers, cache):
+    """Yields results from the cache, parsing only new or changed paths.
+
+    Args:
+        result_paths: An iterable of paths to NDT result files to parse.
+        workers: The number of processes to use to parse uncached paths.
+        cache: A ResultCache instance.
+
+    Yields:
+        A (filename, result) tuple for each result file, in input order.
     """
-    results = {}
+    result_paths = list(result_paths)
+    stale_paths = [path for path in result_paths if not cache.contains(path)]
+    stale_path_results = _iter_path_results(stale_paths, workers)
+    stale_paths = set(stale_paths)
+    for result_path in result_paths:
+        path_results = None
+        if result_path in stale_paths:
+            path_results = next(stale_path_results)
+            cache.put(result_path, path_results)
+        else:
+            path_results = cache.get(result_path)
+            # The file changed after we checked the cache, so parse it again.
+            if path_results is None:
+                path_results = _parse_path(result_path)
+                cache.put(result_path, path_results)
+        for path_result in path_results:
+            yield path_result
+
+
+def _flatten(path_results_iterator):
+    for path_results in path_results_iterator:
+        for path_result in path_results:
+            yield path_result
+
+
+def _iter_decoded_results(result_paths, prefetch=0):
+    # Imported here so that converting only selected fields, as json_to_csv
+    # does by default, does not load the decoder and its dependencies.
+    from ndt_e2e_clientworker.client_wrapper import result_decoder
     decoder = result_decoder.NdtResultDecoder()
-    for filename, raw_contents in result_files.iteritems():
-        results[filename] = decoder.decode(raw_contents)
-    return results
+    return _iter_decoded(result_paths,
+                         functools.partial(field_decoder.decode_result,
+                                           decoder), prefetch)
+
+
+def _iter_decoded_fields(result_paths, fields, prefetch=0):
+    return _iter_decoded(result_paths,
+                         functools.partial(field_decoder.decode_fields,
+                                           fields=fields),
+                         prefetch)
+
+
+def _iter_decoded(result_paths, decode, prefetch):
+    """Yields a (basename, decode(contents)) tuple for each result file.
+
+    The time spent decoding is recorded as the decode stage once every
+    _STATS_INTERVAL results.
+    """
+    clock = pipeline_stats.clock
+    decode_seconds = 0.0
+    pending_count = 0
+    try:
+        for filename, raw_contents in _iter_result_files(result_paths,
+                                                         prefetch):
+            start_time = clock()
+            try:
+                decoded = decode(raw_contents)
+            finally:
+                decode_seconds += clock() - start_time
+            pending_count += 1
+            if pending_count == _STATS_INTERVAL:
+                pipeline_stats.add_time('decode', decode_seconds)
+                decode_seconds = 0.0
+                pending_count = 0
+            yield filename, decoded
+    finally:
+        pipeline_stats.add_time('decode', decode_seconds)
+
+
+def _iter_path_results(result_paths, workers, parse_path=None):
+    """Parses result paths, yielding the list of results for each path.
+
+    If workers is greater than 1, result paths are parsed across a pool of
+    worker processes. Each path (a raw result file or an entire result package)
+    is a single unit of work. Pool.imap returns each path's results in the order
+    the paths were submitted, so the output order, and therefore which result
+    wins when two files share a basename, matches that of the serial parser.
+
+    Args:
+        result_paths: An iterable of paths to NDT result files to parse.
+        workers: The number of worker processes to use.
+        parse_path: A picklable function that parses a single path into a list
+            of results. Defaults to _parse_path, which decodes NdtResults.
+
+    Yields:
+        A list of (filename, result) tuples for each path in result_paths, in
+        input order.
+    """
+    parse_path = parse_path or _parse_path
+    if workers <= 1:
+        for result_path in result_paths:
+            yield parse_path(result_path)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        for path_results in pool.imap(parse_path, result_paths):
+            yield path_results
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _parse_path(result_path):
+    """Parses the results in a single path (may run in a worker process)."""
+    return list(_iter_decoded_results([result_path]))
+
+
+def _parse_path_fields(result_path, fields):
+    """Parses the fields of the results in a single path."""
+    return list(_iter_decoded_fields([result_path], fields))
+
+
+class ResultSource(collections.namedtuple('ResultSource', ['path', 'member'])):
+    """Identifies where a raw result file was read from.
+
+    Attributes:
+        path: The path of the raw result file or of the result package that
+            contains it.
+        member: The full name of the raw result file within the result package,
+            or None if the raw result file is not in a package.
+    """
+    __slots__ = ()
+
+    @property
+    def filename(self):
+        """The basename of the raw result file."""
+        return os.path.basename(self.member or self.path)
+
+    def __str__(self):
+        if self.member is None:
+            return self.path
+        return '%s/%s' % (self.path, self.member)
+
+
+def iter_raw_results(result_paths, prefetch=0):
+    """Loads the raw contents of each result file in result files and packages.
+
+    Given a list of paths to NDT result files, finds files that looks like
+    either a raw NDT result file or a package of NDT result files. For raw
+    files, we read the file contents into memory directly. For result packages,
+    we open the package and read the contents of each raw result file in the
+    package into memory. File contents are read one at a time, as the caller
+    consumes them, unless prefetch is set.
+
+    Args:
+        result_paths: An iterable of paths to NDT result files to parse. These
+            may be a combination of raw results (JSON files) and result packages
+            (a compressed archive of raw results).
+        prefetch: If greater than 0, the number of paths to read ahead of the
+            caller across a pool of threads, so that slow opens and reads (such
+            as on a network file system) overlap with processing. Each path is
+            read in full, including every result in a result package, so up to
+            prefetch paths' contents are held in memory at a time. Results are
+            yielded in the same order either way.
+
+    Yields:
+        A (source, contents) tuple for each result file, where source is a
+        ResultSource identifying the file and contents is a string containing
+        the contents of the file.
+    """
+    counters = collections.defaultdict(int)
+    if prefetch > 0:
+        raw_results = _flatten(prefetcher.imap(_read_path_contents,
+                                               result_paths, prefetch))
+    else:
+        raw_results = _flatten(_read_path(path, counters)
+                               for path in result_paths)
+    return _iter_counted(raw_results, counters)
+
+
+def _iter_counted(raw_results, counters):
+    """Yields raw results, counting them and timing how long each took to read.
+
+    Counts are gathered in counters, along with any that _read_path adds to it,
+    and recorded with the read time once every _STATS_INTERVAL results. Only
+    the time spent producing results is counted, not the time the caller spends
+    between them.
+    """
+    clock = pipeline_stats.clock
+    read_seconds = 0.0
+    pending_count = 0
+    try:
+        while True:
+            start_time = clock()
+            raw_result = next(raw_results, None)
+            read_seconds += clock() - start_time
+            if raw_result is None:
+                return
+            counters['results_read'] += 1
+            counters['bytes_read'] += len(raw_result[1])
+            pending_count += 1
+            if pending_count == _STATS_INTERVAL:
+                pipeline_stats.record(counters, {'read': read_seconds})
+                counters.clear()
+                read_seconds = 0.0
+                pending_count = 0
+            yield raw_result
+    finally:
+        pipeline_stats.record(counters, {'read': read_seconds})
+
+
+def _read_path(filename, counters):
+    """Yields a (source, contents) tuple for each result file in a path.
+
+    Adds to the files_seen, packages_read and files_skipped counts in counters,
+    a dictionary of counts by name.
+    """
+    counters['files_seen'] += 1
+    if _is_raw_result(filename):
+        with open(filename) as result_file:
+            yield ResultSource(filename, None), result_file.read()
+    elif _is_result_package(filename):
+        counters['packages_read'] += 1
+        for member, contents in result_package.iter_members(filename,
+                                                            _is_raw_result):
+            yield ResultSource(filename, member), contents
+    else:
+        counters['files_skipped'] += 1
+
+
+def _read_path_contents(filename):
+    """Reads every result file in a path (may run in a prefetch thread)."""
+    counters = collections.defaultdict(int)
+    contents = list(_read_path(filename, counters))
+    pipeline_stats.record(counters, {})
+    return contents
+
+
+def _iter_result_files(result_paths, prefetch=0):
+    """Yields a (basename, contents) tuple for each result file."""
+    for source, contents in iter_raw_results(result_paths, prefetch):
+        yield source.filename, contents
+
+
+def _is_raw_result(filename):
+    return os.path.splitext(filename)[1] == '.json'
+
+
+def _is_result_package(filename):
+    return result_package.looks_like_package(filename)
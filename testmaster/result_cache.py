@@ -0,0 +1,287 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Caches parsed NDT results on disk so that unchanged inputs are not reparsed.
+
+The cache is a SQLite database. Each input path (a raw result file or a result
+package) is recorded along with its modification time and size, and the
+decoded fields of each result within that path are stored as one row. An input
+is only read from the cache if its modification time and size are unchanged.
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+import timestamps
+from ndt_e2e_clientworker.client_wrapper import results
+
+# Incremented whenever the schema changes so that stale caches are rebuilt.
+_SCHEMA_VERSION = 1
+# Number of put() calls to batch into a single SQLite transaction.
+_PUTS_PER_COMMIT = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inputs (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    path TEXT NOT NULL REFERENCES inputs(path),
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    start_time INTEGER,
+    end_time INTEGER,
+    c2s_start_time INTEGER,
+    c2s_end_time INTEGER,
+    c2s_throughput REAL,
+    s2c_start_time INTEGER,
+    s2c_end_time INTEGER,
+    s2c_throughput REAL,
+    latency REAL,
+    os TEXT,
+    os_version TEXT,
+    client TEXT,
+    client_version TEXT,
+    browser TEXT,
+    browser_version TEXT,
+    errors TEXT,
+    PRIMARY KEY (path, position)
+);
+"""
+
+_RESULT_COLUMNS = ('filename', 'start_time', 'end_time', 'c2s_start_time',
+                   'c2s_end_time', 'c2s_throughput', 's2c_start_time',
+                   's2c_end_time', 's2c_throughput', 'latency', 'os',
+                   'os_version', 'client', 'client_version', 'browser',
+                   'browser_version', 'errors')
+
+
+class ResultCache(object):
+    """A persistent cache of the results parsed from each input path."""
+
+    def __init__(self, cache_path):
+        """Opens a result cache, creating it if it does not exist.
+
+        Args:
+            cache_path: Path to the SQLite database file that backs the cache.
+        """
+        self._connection = sqlite3.connect(cache_path)
+        self._connection.text_factory = str
+        self._uncommitted_puts = 0
+        schema_version = self._connection.execute(
+            'PRAGMA user_version').fetchone()[0]
+        if schema_version != _SCHEMA_VERSION:
+            self._connection.executescript(
+                'DROP TABLE IF EXISTS results; DROP TABLE IF EXISTS inputs;')
+            self._connection.execute('PRAGMA user_version = %d' %
+                                     _SCHEMA_VERSION)
+        self._connection.executescript(_SCHEMA)
+        self._connection.commit()
+
+    def contains(self, path):
+        """Indicates whether the cache holds current results for a path.
+
+        Args:
+            path: Path to a result file or result package.
+
+        Returns:
+            True if the cache has results for path and path's modification time
+            and size are unchanged since the results were cached.
+        """
+        return self._lookup_current(path) is not None
+
+    def get(self, path):
+        """Retrieves the cached results for a path.
+
+        Args:
+            path: Path to a result file or result package.
+
+        Returns:
+            A list of (filename, result) tuples, where result is an NdtResult,
+            in the order they were originally parsed, or None if the cache has
+            no current results for path.
+        """
+        cache_key = self._lookup_current(path)
+        if cache_key is None:
+            return None
+        self._connection.execute(
+            'UPDATE inputs SET last_used = ? WHERE path = ?',
+            (time.time(), cache_key))
+        rows = self._connection.execute(
+            'SELECT %s FROM results WHERE path = ? ORDER BY position' %
+            ', '.join(_RESULT_COLUMNS), (cache_key,))
+        return [(row[0], _row_to_result(row)) for row in rows]
+
+    def put(self, path, path_results):
+        """Adds the results parsed from a path to the cache.
+
+        Replaces any results previously cached for the same path.
+
+        Args:
+            path: Path to the result file or result package that was parsed.
+            path_results: A list of (filename, result) tuples parsed from path,
+                where result is an NdtResult. May be empty if path contains no
+                results.
+        """
+        file_stat = _stat(path)
+        if file_stat is None:
+            return
+        cache_key = _cache_key(path)
+        self._delete(cache_key)
+        self._connection.execute(
+            'INSERT INTO inputs (path, mtime, size, last_used) '
+            'VALUES (?, ?, ?, ?)', (cache_key, file_stat[0], file_stat[1],
+                                    time.time()))
+        self._connection.executemany(
+            'INSERT INTO results (path, position, %s) VALUES (?, ?, %s)' % (
+                ', '.join(_RESULT_COLUMNS),
+                ', '.join(['?'] * len(_RESULT_COLUMNS))),
+            [(cache_key, position) + _result_to_row(filename, result)
+             for position, (filename, result) in enumerate(path_results)])
+        self._uncommitted_puts += 1
+        if self._uncommitted_puts >= _PUTS_PER_COMMIT:
+            self.commit()
+
+    def invalidate(self, path=None):
+        """Removes cached results so that they are parsed again.
+
+        Args:
+            path: Path whose results to remove. If None, removes all results.
+        """
+        if path is None:
+            self._connection.execute('DELETE FROM results')
+            self._connection.execute('DELETE FROM inputs')
+        else:
+            self._delete(_cache_key(path))
+        self.commit()
+
+    def evict(self, max_entries=None, max_age=None):
+        """Removes least recently used entries and entries for missing files.
+
+        Args:
+            max_entries: If specified, the maximum number of input paths to
+                keep. The least recently used paths are removed first.
+            max_age: If specified, removes paths that have not been used in the
+                last max_age seconds.
+
+        Returns:
+            The number of input paths removed from the cache.
+        """
+        evicted = [path
+                   for path in self._select_paths('SELECT path FROM inputs')
+                   if not os.path.exists(path)]
+        if max_age is not None:
+            oldest_allowed = time.time() - max_age
+            evicted.extend(self._select_paths(
+                'SELECT path FROM inputs WHERE last_used < ?',
+                parameters=[oldest_allowed]))
+        if max_entries is not None:
+            evicted.extend(self._select_paths(
+                'SELECT path FROM inputs ORDER BY last_used DESC '
+                'LIMIT -1 OFFSET ?', [max_entries]))
+        evicted = set(evicted)
+        for path in evicted:
+            self._delete(path)
+        self.commit()
+        return len(evicted)
+
+    def commit(self):
+        """Writes any pending changes to disk."""
+        self._connection.commit()
+        self._uncommitted_puts = 0
+
+    def close(self):
+        """Writes any pending changes to disk and closes the cache."""
+        self.commit()
+        self._connection.close()
+
+    def _lookup_current(self, path):
+        """Returns the cache key for path if the cache has current results."""
+        file_stat = _stat(path)
+        if file_stat is None:
+            return None
+        cache_key = _cache_key(path)
+        row = self._connection.execute(
+            'SELECT mtime, size FROM inputs WHERE path = ?',
+            (cache_key,)).fetchone()
+        if row is None or tuple(row) != file_stat:
+            return None
+        return cache_key
+
+    def _select_paths(self, query, parameters=()):
+        return [row[0] for row in self._connection.execute(query, parameters)]
+
+    def _delete(self, cache_key):
+        self._connection.execute('DELETE FROM results WHERE path = ?',
+                                 (cache_key,))
+        self._connection.execute('DELETE FROM inputs WHERE path = ?',
+                                 (cache_key,))
+
+
+def _cache_key(path):
+    return os.path.abspath(path)
+
+
+def _stat(path):
+    """Returns the (modification time, size) of a file or None if missing."""
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return None
+    return file_stat.st_mtime, file_stat.st_size
+
+
+def _result_to_row(filename, result):
+    """Flattens an NdtResult into a tuple of values for _RESULT_COLUMNS."""
+    errors = [(error.message, timestamps.datetime_to_us(error.timestamp))
+              for error in result.errors]
+    c2s_result = result.c2s_result
+    s2c_result = result.s2c_result
+    to_us = timestamps.datetime_to_us
+    return (filename, to_us(result.start_time), to_us(result.end_time),
+            to_us(c2s_result.start_time), to_us(c2s_result.end_time),
+            c2s_result.throughput, to_us(s2c_result.start_time),
+            to_us(s2c_result.end_time), s2c_result.throughput, result.latency,
+            result.os, result.os_version, result.client, result.client_version,
+            result.browser, result.browser_version, json.dumps(errors))
+
+
+def _row_to_result(row):
+    """Rebuilds an NdtResult from a row of values for _RESULT_COLUMNS."""
+    (_, start_time, end_time, c2s_start_time, c2s_end_time, c2s_throughput,
+     s2c_start_time, s2c_end_time, s2c_throughput, latency, os_name, os_version,
+     client, client_version, browser, browser_version, errors) = row
+    return results.NdtResult(
+        start_time=timestamps.us_to_datetime(start_time),
+        end_time=timestamps.us_to_datetime(end_time),
+        c2s_result=results.NdtSingleTestResult(
+            start_time=timestamps.us_to_datetime(c2s_start_time),
+            end_time=timestamps.us_to_datetime(c2s_end_time),
+            throughput=c2s_throughput),
+        s2c_result=results.NdtSingleTestResult(
+            start_time=timestamps.us_to_datetime(s2c_start_time),
+            end_time=timestamps.us_to_datetime(s2c_end_time),
+            throughput=s2c_throughput),
+        latency=latency,
+        os=os_name,
+        os_version=os_version,
+        client=client,
+        client_version=client_version,
+        browser=browser,
+        browser_version=browser_version,
+        errors=[results.TestError(message, timestamps.us_to_datetime(timestamp))
+                for message, timestamp in json.loads(errors)])
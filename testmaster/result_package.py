@@ -0,0 +1,291 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Reads raw NDT result files out of result packages (zip archives).
+
+A result package holds raw result files alongside other files, such as
+client_wrapper logs, that are often much larger than the results themselves.
+Rather than open every member through zipfile, the reader indexes a package's
+central directory once, keeps only the members whose names look like raw
+results and then reads each of those members directly from its local header
+offset. Members that are not results are never read or decompressed.
+
+Deflated members are decompressed incrementally as they are read. Stored
+(uncompressed) members are read through a memory map of the package, so they
+cost no more than a page fault per page of result data.
+
+Member indexes are cached in memory, keyed by the package's path, modification
+time and size, so reading the same package again does not reread its central
+directory.
+"""
+
+import collections
+import mmap
+import os
+import struct
+import zipfile
+import zlib
+
+import pipeline_stats
+
+# Magic numbers at the start of a zip archive with members, and of an empty
+# zip archive.
+_ZIP_MAGIC = ('PK\x03\x04', 'PK\x05\x06')
+
+_LOCAL_HEADER_FORMAT = '<4s2B4HL2L2H'
+_LOCAL_HEADER_SIZE = struct.calcsize(_LOCAL_HEADER_FORMAT)
+_LOCAL_HEADER_SIGNATURE = 'PK\x03\x04'
+
+# Bit in a zip member's general purpose flags that marks it as encrypted.
+_ENCRYPTED_FLAG = 0x1
+# Number of compressed bytes to read from a package at a time.
+_READ_SIZE = 64 * 1024
+# Maximum number of package indexes to keep in memory.
+_MAX_CACHED_INDEXES = 4096
+
+_Member = collections.namedtuple('_Member', [
+    'name', 'header_offset', 'compress_type', 'compress_size', 'file_size',
+    'crc', 'flag_bits'
+])
+
+# Member indexes, keyed by (absolute path, modification time, size).
+_index_cache = {}
+
+
+def looks_like_package(path):
+    """Indicates whether a file starts with the magic number of a zip archive.
+
+    Unlike zipfile.is_zipfile, this reads only the first four bytes of the file
+    rather than searching for the archive's end of central directory record.
+
+    Args:
+        path: Path to the file to check.
+
+    Returns:
+        True if the file exists and starts with a zip magic number.
+    """
+    try:
+        with open(path, 'rb') as package_file:
+            return package_file.read(len(_ZIP_MAGIC[0])) in _ZIP_MAGIC
+    except IOError:
+        return False
+
+
+def member_names(package_path, name_filter):
+    """Lists the members of a result package that pass a filter.
+
+    Args:
+        package_path: Path to a zip archive.
+        name_filter: A function that takes a member's name and returns True if
+            the member should be included.
+
+    Returns:
+        A list of the names of matching members, in archive order.
+    """
+    members, _ = _index(package_path, name_filter)
+    return [member.name for member in members]
+
+
+def iter_members(package_path, name_filter):
+    """Reads the contents of the members of a result package that pass a filter.
+
+    Members are read one at a time, as the caller consumes them, so only one
+    member's contents are held in memory at a time. Members that do not pass
+    name_filter are never read.
+
+    Args:
+        package_path: Path to a zip archive.
+        name_filter: A function that takes a member's name and returns True if
+            the member should be read.
+
+    Yields:
+        A (name, contents) tuple for each matching member, in archive order,
+        where name is the member's full name within the archive and contents is
+        a string of its decompressed contents.
+
+    Raises:
+        zipfile.BadZipfile: The package is not a valid zip archive or a member
+            is corrupt.
+    """
+    members, skipped_count = _index(package_path, name_filter)
+    pipeline_stats.count('package_members_skipped', skipped_count)
+    if not members:
+        return
+    with open(package_path, 'rb') as package_file:
+        package_map = None
+        if any(member.compress_type == zipfile.ZIP_STORED
+               for member in members):
+            package_map = _map_file(package_file)
+        try:
+            for member in members:
+                yield member.name, _read_member(package_path, package_file,
+                                                package_map, member)
+        finally:
+            if package_map is not None:
+                package_map.close()
+
+
+def iter_member_lines(package_path, member_name):
+    """Reads the lines of a member of a result package, one at a time.
+
+    The member is decompressed a block at a time, so only a block of its
+    contents is held in memory at once, however large the member is.
+
+    Args:
+        package_path: Path to a zip archive.
+        member_name: The full name of the member within the archive.
+
+    Yields:
+        Each line of the member, including its line terminator.
+
+    Raises:
+        KeyError: The package has no member named member_name.
+        zipfile.BadZipfile: The package is not a valid zip archive or the
+            member is corrupt.
+    """
+    members, _ = _index(package_path, lambda name: name == member_name)
+    if not members:
+        raise KeyError('No member %r in %s' % (member_name, package_path))
+    member = members[0]
+    if not _is_directly_readable(member):
+        with zipfile.ZipFile(package_path) as package:
+            for line in package.open(member_name):
+                yield line
+        return
+    with open(package_path, 'rb') as package_file:
+        partial_line = ''
+        for block in _iter_member_blocks(package_path, package_file, member):
+            lines = (partial_line + block).split('\n')
+            partial_line = lines.pop()
+            for line in lines:
+                yield line + '\n'
+        if partial_line:
+            yield partial_line
+
+
+def clear_index_cache():
+    """Discards every cached package index."""
+    _index_cache.clear()
+
+
+def _index(package_path, name_filter):
+    """Finds the members of a package that pass a filter.
+
+    Returns:
+        A (members, skipped_count) tuple, where members is a list of _Member
+        tuples for the matching members, in archive order, and skipped_count is
+        the number of members that did not match.
+    """
+    all_members = _package_members(package_path)
+    members = [member for member in all_members if name_filter(member.name)]
+    return members, len(all_members) - len(members)
+
+
+def _package_members(package_path):
+    """Returns a cached list of _Member tuples for every member of a package."""
+    file_stat = os.stat(package_path)
+    cache_key = (os.path.abspath(package_path), file_stat.st_mtime,
+                 file_stat.st_size)
+    members = _index_cache.get(cache_key)
+    if members is None:
+        members = _read_index(package_path)
+        if len(_index_cache) >= _MAX_CACHED_INDEXES:
+            _index_cache.clear()
+        _index_cache[cache_key] = members
+    return members
+
+
+def _read_index(package_path):
+    """Reads the central directory of a zip archive into _Member tuples."""
+    with zipfile.ZipFile(package_path) as package:
+        return [_Member(info.filename, info.header_offset, info.compress_type,
+                        info.compress_size, info.file_size, info.CRC,
+                        info.flag_bits) for info in package.infolist()
+                if not info.filename.endswith('/')]
+
+
+def _map_file(package_file):
+    """Returns a read-only memory map of a file or None if mapping fails."""
+    try:
+        return mmap.mmap(package_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (mmap.error, ValueError):
+        return None
+
+
+def _read_member(package_path, package_file, package_map, member):
+    """Reads and checks the decompressed contents of a single member."""
+    if not _is_directly_readable(member):
+        # Fall back to zipfile for anything that we can't read directly.
+        with zipfile.ZipFile(package_path) as package:
+            return package.read(member.name)
+    if member.compress_type != zipfile.ZIP_STORED or package_map is None:
+        return ''.join(_iter_member_blocks(package_path, package_file, member))
+    data_offset = _data_offset(package_file, member)
+    contents = package_map[data_offset:data_offset + member.file_size]
+    _check_member(package_path, member, len(contents), zlib.crc32(contents))
+    return contents
+
+
+def _is_directly_readable(member):
+    if member.flag_bits & _ENCRYPTED_FLAG:
+        return False
+    return member.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
+
+def _data_offset(package_file, member):
+    """Returns the offset of a member's data, just past its local header."""
+    package_file.seek(member.header_offset)
+    header = package_file.read(_LOCAL_HEADER_SIZE)
+    if len(header) != _LOCAL_HEADER_SIZE:
+        raise zipfile.BadZipfile('Truncated file header for %r' % member.name)
+    fields = struct.unpack(_LOCAL_HEADER_FORMAT, header)
+    if fields[0] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipfile('Bad magic number for file header of %r' %
+                                 member.name)
+    name_length, extra_length = fields[10], fields[11]
+    return (
+        member.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length)
+
+
+def _iter_member_blocks(package_path, package_file, member):
+    """Yields the decompressed contents of a member a block at a time."""
+    package_file.seek(_data_offset(package_file, member))
+    decompressor = None
+    if member.compress_type == zipfile.ZIP_DEFLATED:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    size = 0
+    crc = 0
+    remaining = member.compress_size
+    while remaining > 0:
+        block = package_file.read(min(_READ_SIZE, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        if decompressor:
+            block = decompressor.decompress(block)
+        size += len(block)
+        crc = zlib.crc32(block, crc)
+        yield block
+    if decompressor:
+        block = decompressor.flush()
+        size += len(block)
+        crc = zlib.crc32(block, crc)
+        yield block
+    _check_member(package_path, member, size, crc)
+
+
+def _check_member(package_path, member, size, crc):
+    """Checks the size and CRC-32 of a member's decompressed contents."""
+    if size != member.file_size or crc & 0xffffffff != member.crc:
+        raise zipfile.BadZipfile('Bad CRC-32 for file %r in %s' %
+                                 (member.name, package_path))
@@ -0,0 +1,312 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Stores a corpus of NDT results as a table of NumPy columns.
+
+A ResultTable holds one row per NDT result. Numeric fields are stored in NumPy
+arrays: throughputs and latency as float64 (NaN where the value is missing) and
+timestamps as int64 microseconds since the epoch (MISSING_TIME where the value
+is missing). String fields such as browser and OS are stored as categorical
+codes into a list of distinct values, and each result's errors are stored as a
+variable-length list of codes into a list of distinct error messages.
+"""
+
+import numpy
+
+import field_decoder
+
+# Sentinel value for a missing timestamp in an int64 timestamp column.
+MISSING_TIME = numpy.iinfo(numpy.int64).min
+
+FLOAT_COLUMNS = ('c2s_throughput', 's2c_throughput', 'latency')
+TIME_COLUMNS = ('start_time', 'end_time', 'c2s_start_time', 'c2s_end_time',
+                's2c_start_time', 's2c_end_time')
+CATEGORICAL_COLUMNS = ('browser', 'browser_version', 'os', 'os_version',
+                       'client', 'client_version')
+
+# Number of rows to allocate at a time while building a table.
+_CHUNK_SIZE = 65536
+_MICROSECONDS_PER_SECOND = 1e6
+
+
+class Categorical(object):
+    """A column of string values stored as integer codes.
+
+    Attributes:
+        codes: An int32 array with one entry per row, holding the index into
+            categories of that row's value.
+        categories: A list of the distinct values in the column, which may
+            include None.
+    """
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.categories[self.codes[row]]
+
+    def code_of(self, value):
+        """Returns the code for value or -1 if value is not in the column."""
+        try:
+            return self.categories.index(value)
+        except ValueError:
+            return -1
+
+
+class ResultTable(object):
+    """A columnar table of NDT results.
+
+    Attributes:
+        filenames: A list of the filename of each result.
+        columns: A dictionary of the numeric columns, keyed by field name. Each
+            column in FLOAT_COLUMNS is a float64 array and each column in
+            TIME_COLUMNS is an int64 array of microseconds since the epoch.
+        categoricals: A dictionary of Categorical instances for each field in
+            CATEGORICAL_COLUMNS.
+        error_codes: An int32 array of codes into error_messages for every
+            error of every result, in row order.
+        error_offsets: An int64 array of length len(table) + 1 such that the
+            errors of row i are error_codes[error_offsets[i]:error_offsets[i +
+            1]].
+        error_messages: A list of the distinct error messages in the table.
+    """
+
+    def __init__(self, filenames, columns, categoricals, error_codes,
+                 error_offsets, error_messages):
+        self.filenames = filenames
+        self.columns = columns
+        self.categoricals = categoricals
+        self.error_codes = error_codes
+        self.error_offsets = error_offsets
+        self.error_messages = error_messages
+
+    @classmethod
+    def from_results(cls, results):
+        """Builds a ResultTable from a sequence of NdtResult objects.
+
+        Results are consumed one at a time, so results may be a generator such
+        as read_results.iter_results, and the corpus never needs to be held in
+        memory as NdtResult objects.
+
+        Args:
+            results: An iterable of (filename, result) tuples, where result is
+                an NdtResult instance.
+
+        Returns:
+            A ResultTable with one row per result, in iteration order.
+        """
+        builder = ResultTableBuilder()
+        for filename, result in results:
+            builder.append(filename, result)
+        return builder.build()
+
+    @classmethod
+    def from_fields(cls, records):
+        """Builds a ResultTable from a sequence of decoded result fields.
+
+        Args:
+            records: An iterable of (filename, fields) tuples, where fields is a
+                dictionary of every field in field_decoder.FIELDS, such as
+                those yielded by read_results.iter_fields.
+
+        Returns:
+            A ResultTable with one row per result, in iteration order.
+        """
+        builder = ResultTableBuilder()
+        for filename, fields in records:
+            builder.append_fields(filename, fields)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def take(self, rows):
+        """Returns a new ResultTable of some of the rows of this table.
+
+        Args:
+            rows: An array of row indexes, such as those returned by
+                query.select.
+
+        Returns:
+            A ResultTable with the given rows, in the given order.
+        """
+        rows = numpy.asarray(rows, dtype=numpy.int64)
+        columns = dict((field, column[rows])
+                       for field, column in self.columns.iteritems())
+        categoricals = dict(
+            (field, Categorical(categorical.codes[rows],
+                                categorical.categories))
+            for field, categorical in self.categoricals.iteritems())
+        starts = self.error_offsets[rows]
+        counts = self.error_offsets[rows + 1] - starts
+        error_offsets = numpy.zeros(len(rows) + 1, dtype=numpy.int64)
+        numpy.cumsum(counts, out=error_offsets[1:])
+        # The errors of each row are copied from its run in error_codes.
+        error_rows = numpy.repeat(starts - error_offsets[:-1], counts)
+        error_codes = self.error_codes[error_rows + numpy.arange(error_offsets[
+            -1])]
+        return ResultTable(
+            [self.filenames[row] for row in rows], columns, categoricals,
+            error_codes, error_offsets, self.error_messages)
+
+    def total_duration(self):
+        """Returns a float64 array of the total duration of each result (s).
+
+        Entries are NaN for results that did not complete.
+        """
+        return self._duration('start_time', 'end_time')
+
+    def c2s_duration(self):
+        """Returns a float64 array of the c2s duration of each result (s).
+
+        Entries are NaN for results in which the c2s test did not complete.
+        """
+        return self._duration('c2s_start_time', 'c2s_end_time')
+
+    def s2c_duration(self):
+        """Returns a float64 array of the s2c duration of each result (s).
+
+        Entries are NaN for results in which the s2c test did not complete.
+        """
+        return self._duration('s2c_start_time', 's2c_end_time')
+
+    def error_count(self):
+        """Returns an int64 array of the number of errors in each result."""
+        return numpy.diff(self.error_offsets)
+
+    def errors(self, row):
+        """Returns the list of error messages for the result in a row."""
+        start, end = self.error_offsets[row], self.error_offsets[row + 1]
+        return [self.error_messages[code]
+                for code in self.error_codes[start:end]]
+
+    def _duration(self, start_column, end_column):
+        start = self.columns[start_column]
+        end = self.columns[end_column]
+        durations = (end - start) / _MICROSECONDS_PER_SECOND
+        durations[(start == MISSING_TIME) | (end == MISSING_TIME)] = numpy.nan
+        return durations
+
+
+class ResultTableBuilder(object):
+    """Builds a ResultTable one result at a time."""
+
+    def __init__(self):
+        self._filenames = []
+        self._columns = {}
+        for name in FLOAT_COLUMNS:
+            self._columns[name] = _ColumnBuilder(numpy.float64)
+        for name in TIME_COLUMNS:
+            self._columns[name] = _ColumnBuilder(numpy.int64)
+        self._categoricals = {}
+        for name in CATEGORICAL_COLUMNS:
+            self._categoricals[name] = _CategoricalBuilder()
+        self._error_codes = _ColumnBuilder(numpy.int32)
+        self._error_offsets = _ColumnBuilder(numpy.int64)
+        self._error_offsets.append(0)
+        self._error_messages = _CategoricalBuilder()
+
+    def append(self, filename, result):
+        """Adds a result to the table.
+
+        Args:
+            filename: The filename of the result.
+            result: An NdtResult instance.
+        """
+        self.append_fields(filename, field_decoder.result_to_fields(result))
+
+    def append_fields(self, filename, fields):
+        """Adds a result to the table from a dictionary of its fields.
+
+        Args:
+            filename: The filename of the result.
+            fields: A dictionary with an entry for each field in FLOAT_COLUMNS,
+                TIME_COLUMNS (in microseconds since the epoch) and
+                CATEGORICAL_COLUMNS, and an 'errors' entry that is a list of
+                error messages. Missing values are None.
+        """
+        self._filenames.append(filename)
+        for name in FLOAT_COLUMNS:
+            value = fields[name]
+            self._columns[name].append(numpy.nan if value is None else value)
+        for name in TIME_COLUMNS:
+            value = fields[name]
+            self._columns[name].append(MISSING_TIME if value is None else value)
+        for name in CATEGORICAL_COLUMNS:
+            self._categoricals[name].append(fields[name])
+        for message in fields['errors']:
+            self._error_codes.append(self._error_messages.code_for(message))
+        self._error_offsets.append(self._error_codes.size)
+
+    def build(self):
+        """Returns a ResultTable of every result added so far."""
+        columns = {}
+        for name, column in self._columns.iteritems():
+            columns[name] = column.build()
+        categoricals = {}
+        for name, categorical in self._categoricals.iteritems():
+            categoricals[name] = categorical.build()
+        return ResultTable(
+            self._filenames, columns, categoricals, self._error_codes.build(),
+            self._error_offsets.build(), list(self._error_messages.categories))
+
+
+class _ColumnBuilder(object):
+    """Accumulates values of a single dtype in fixed-size NumPy chunks."""
+
+    def __init__(self, dtype):
+        self._dtype = dtype
+        self._chunks = []
+        self._chunk = numpy.empty(_CHUNK_SIZE, dtype=dtype)
+        self._chunk_size = 0
+        self.size = 0
+
+    def append(self, value):
+        if self._chunk_size == _CHUNK_SIZE:
+            self._chunks.append(self._chunk)
+            self._chunk = numpy.empty(_CHUNK_SIZE, dtype=self._dtype)
+            self._chunk_size = 0
+        self._chunk[self._chunk_size] = value
+        self._chunk_size += 1
+        self.size += 1
+
+    def build(self):
+        return numpy.concatenate(self._chunks + [self._chunk[:self._chunk_size]
+                                                ])
+
+
+class _CategoricalBuilder(object):
+    """Assigns integer codes to values in order of first appearance."""
+
+    def __init__(self):
+        self.categories = []
+        self._codes_by_value = {}
+        self._codes = _ColumnBuilder(numpy.int32)
+
+    def code_for(self, value):
+        code = self._codes_by_value.get(value)
+        if code is None:
+            code = len(self.categories)
+            self._codes_by_value[value] = code
+            self.categories.append(value)
+        return code
+
+    def append(self, value):
+        self._codes.append(self.code_for(value))
+
+    def build(self):
+        return Categorical(self._codes.build(), list(self.categories))
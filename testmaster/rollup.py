@@ -0,0 +1,188 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Calculates aggregate statistics of NDT results in fixed time windows.
+
+A Rollup assigns each result to a window (for example, the hour) containing its
+start time and keeps a RunningAggregate of each metric in summary.METRICS for
+each window and group of results. Results are added a ResultTable at a time:
+the rows are sorted by window and group, and each run of rows with the same
+window and group is added to its aggregates with vectorized operations. Only
+the windows that appear in newly added results are updated, so a Rollup can be
+kept up to date as new results arrive without recomputing earlier windows.
+"""
+
+import collections
+
+import aggregate
+import summary
+import timestamps
+
+# numpy and result_table are imported by the functions that need them rather
+# than here, so that tools which only offer rollups as an option, such as
+# ingest, do not load numpy unless a rollup is kept.
+
+# Supported window sizes, in seconds.
+WINDOWS = collections.OrderedDict([('1m', 60), ('1h', 3600), ('1d', 86400)])
+
+_MICROSECONDS_PER_SECOND = 1000000
+# Number of results to add to a rollup at a time in Rollup.add_records.
+_BATCH_SIZE = 65536
+_WINDOW_START_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+class Rollup(object):
+    """Keeps running aggregate statistics of NDT results in time windows.
+
+    Rollup objects can be pickled, so running statistics can be saved and
+    updated later with new results.
+
+    Attributes:
+        window: The name of the window size, from WINDOWS.
+        group_by: The list of fields by which results are grouped.
+        skipped_count: The number of results skipped because they have no
+            start time.
+    """
+
+    def __init__(self, window, group_by=()):
+        """Creates an empty rollup.
+
+        Args:
+            window: The name of a window size in WINDOWS.
+            group_by: A list of fields in summary.GROUP_FIELDS by which to
+                group results within each window.
+
+        Raises:
+            ValueError: window is not in WINDOWS or group_by contains a field
+                that is not in summary.GROUP_FIELDS.
+        """
+        if window not in WINDOWS:
+            raise ValueError('Unknown window size: %s' % window)
+        for field in group_by:
+            if field not in summary.GROUP_FIELDS:
+                raise ValueError('Cannot group results by %s' % field)
+        self.window = window
+        self.group_by = list(group_by)
+        self.skipped_count = 0
+        self._window_us = WINDOWS[window] * _MICROSECONDS_PER_SECOND
+        # Lists of RunningAggregates, one per metric, keyed by (start of window
+        # in microseconds since the epoch, group).
+        self._running_aggregates = {}
+
+    def add_table(self, table):
+        """Adds every result in a ResultTable to the rollup.
+
+        Args:
+            table: A ResultTable of results to add.
+        """
+        import numpy
+        import result_table
+        start_times = table.columns['start_time']
+        rows = numpy.flatnonzero(start_times != result_table.MISSING_TIME)
+        self.skipped_count += len(table) - len(rows)
+        if not len(rows):
+            return
+        keys = [start_times[rows] // self._window_us]
+        categoricals = [table.categoricals[field] for field in self.group_by]
+        keys.extend(categorical.codes[rows] for categorical in categoricals)
+        # lexsort sorts by its last key first, so the window is the primary key.
+        order = numpy.lexsort(keys[::-1])
+        keys = [key[order] for key in keys]
+        run_starts = _run_starts(keys)
+        run_ends = numpy.append(run_starts[1:], len(order))
+        metric_values = [_metric_column(table, metric)[rows][order]
+                         for metric in summary.METRICS]
+        for run_start, run_end in zip(run_starts, run_ends):
+            window_start = int(keys[0][run_start]) * self._window_us
+            group = tuple(categorical.categories[codes[run_start]]
+                          for categorical, codes in zip(categoricals, keys[1:]))
+            for running_aggregate, values in zip(
+                    self._aggregates_for(window_start, group), metric_values):
+                running_aggregate.add_array(values[run_start:run_end])
+
+    def add_records(self, records):
+        """Adds a sequence of decoded result fields to the rollup.
+
+        Records are added in batches, so only one batch is held in memory as a
+        ResultTable at a time.
+
+        Args:
+            records: An iterable of (filename, fields) tuples, where fields is a
+                dictionary of every field in field_decoder.FIELDS, such as
+                those yielded by read_results.iter_fields.
+        """
+        import result_table
+        builder = result_table.ResultTableBuilder()
+        for row, (filename, fields) in enumerate(records, 1):
+            builder.append_fields(filename, fields)
+            if row % _BATCH_SIZE == 0:
+                self.add_table(builder.build())
+                builder = result_table.ResultTableBuilder()
+        self.add_table(builder.build())
+
+    def add_results(self, results):
+        """Adds a sequence of results to the rollup.
+
+        Args:
+            results: An iterable of (filename, result) tuples, where result is
+                an NdtResult instance.
+        """
+        import result_table
+        self.add_table(result_table.ResultTable.from_results(results))
+
+    def summaries(self):
+        """Returns the current statistics of each window and group.
+
+        Returns:
+            A dictionary in the form returned by summary.summarize, keyed by
+            tuples of the start of the window (a UTC ISO 8601 timestamp)
+            followed by the values of the group_by fields, so it can be written
+            with summary.write_summary_csv(summaries, ['window_start'] +
+            group_by, output_file).
+        """
+        summaries = {}
+        for key, group_aggregates in self._running_aggregates.iteritems():
+            window_start, group = key
+            window_start = timestamps.us_to_datetime(window_start).strftime(
+                _WINDOW_START_FORMAT)
+            summaries[(window_start,) + group] = dict(zip(
+                summary.METRICS.iterkeys(), [running_aggregate.result(
+                ) for running_aggregate in group_aggregates]))
+        return summaries
+
+    def _aggregates_for(self, window_start, group):
+        key = (window_start, group)
+        group_aggregates = self._running_aggregates.get(key)
+        if group_aggregates is None:
+            group_aggregates = [aggregate.RunningAggregate()
+                                for _ in summary.METRICS]
+            self._running_aggregates[key] = group_aggregates
+        return group_aggregates
+
+
+def _run_starts(keys):
+    """Returns the indexes at which any of a list of sorted keys changes."""
+    import numpy
+    changes = numpy.zeros(len(keys[0]), dtype=bool)
+    changes[0] = True
+    for key in keys:
+        changes[1:] |= key[1:] != key[:-1]
+    return numpy.flatnonzero(changes)
+
+
+def _metric_column(table, metric):
+    """Returns a float64 array of a metric in summary.METRICS for each row."""
+    import result_table
+    if metric in result_table.FLOAT_COLUMNS:
+        return table.columns[metric]
+    return getattr(table, metric)()
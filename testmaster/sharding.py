@@ -0,0 +1,199 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Converts and summarizes a corpus of NDT results in shards.
+
+A corpus can be split into N shards that are processed independently, for
+example on different hosts, and then merged. Input paths are assigned to shards
+by a hash of their basename, so every host that sees the same inputs agrees on
+the assignment, whatever directory they are mounted at.
+
+Processing a shard writes a partial file containing:
+
+  * A header: the shard index and count and the summary's group_by fields.
+  * The shard's CSV rows (see csv_convert), sorted by filename. Each row is
+    tagged with the position of its result among all inputs (the index of its
+    path among the sorted input paths and its index within that path), so that
+    when several results share a filename, the merge keeps the same one as a
+    single-host run would: the last.
+  * An exact summary.Summary of the shard's results, which is mergeable.
+
+Merging the partial files of every shard k-way merges their rows and merges
+their summaries, producing the same CSV and statistics as a single-host run.
+"""
+
+import cPickle
+import itertools
+import marshal
+import os
+import zlib
+
+import compact_result
+import csv_convert
+import external_sort
+import field_decoder
+import read_results
+import summary
+
+# Version of the partial file format.
+_FORMAT_VERSION = 1
+# Marks the end of the rows in a partial file.
+_END_OF_ROWS = None
+
+
+def parse_shard(text):
+    """Parses a shard of the form 'index/count', such as '0/4'.
+
+    Args:
+        text: The shard to parse.
+
+    Returns:
+        An (index, count) tuple of integers.
+
+    Raises:
+        ValueError: The shard is malformed or index is not in [0, count).
+    """
+    index, separator, count = text.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        separator = None
+    if not separator or not 0 <= index < count:
+        raise ValueError('Expected a shard of the form index/count, with '
+                         '0 <= index < count: %s' % text)
+    return index, count
+
+
+def shard_paths(result_paths, index, count):
+    """Selects the input paths that belong to a shard.
+
+    Args:
+        result_paths: The list of all input paths.
+        index: The index of the shard.
+        count: The number of shards.
+
+    Returns:
+        A list of (position, path) tuples for each path in the shard, in
+        ascending order of path, where position is the index of the path among
+        all the sorted input paths.
+    """
+    return [(position, path)
+            for position, path in enumerate(sorted(result_paths))
+            if _shard_of(path, count) == index]
+
+
+def write_partial(result_paths,
+                  index,
+                  count,
+                  group_by,
+                  output_file,
+                  workers=1,
+                  memory_budget=float('inf'),
+                  temp_dir=None):
+    """Converts and summarizes the results of one shard of a corpus.
+
+    Args:
+        result_paths: The list of all input paths, on every shard.
+        index: The index of the shard to process.
+        count: The number of shards.
+        group_by: A list of fields in summary.GROUP_FIELDS by which to group the
+            summary.
+        output_file: A file opened for writing in binary mode, to which to
+            write the partial. marshal requires a real file object.
+        workers: The number of processes to use to parse input files.
+        memory_budget: The approximate number of bytes of rows to sort in
+            memory before spilling them to temporary files.
+        temp_dir: The directory in which to write temporary files, or None for
+            the system default.
+    """
+    shard_summary = summary.Summary(group_by, exact=True)
+    cPickle.dump(
+        {'version': _FORMAT_VERSION,
+         'shard': (index, count),
+         'group_by': shard_summary.group_by}, output_file,
+        cPickle.HIGHEST_PROTOCOL)
+    shard = shard_paths(result_paths, index, count)
+    path_records = read_results.iter_path_fields(
+        [path for _, path in shard], field_decoder.FIELDS, workers)
+    formatter = csv_convert.RowFormatter()
+
+    def rows():
+        for (position, _), records in itertools.izip(shard, path_records):
+            for member_index, (filename, fields) in enumerate(records):
+                shard_summary.add(compact_result.CompactResult(fields))
+                yield (filename, (position, member_index),
+                       formatter.format_fields(filename, fields))
+
+    for row in external_sort.sort_records(rows(), memory_budget, temp_dir):
+        marshal.dump(row, output_file)
+    marshal.dump(_END_OF_ROWS, output_file)
+    cPickle.dump(shard_summary, output_file, cPickle.HIGHEST_PROTOCOL)
+
+
+def merge_partials(partial_files, csv_file):
+    """Merges the partial files of every shard of a corpus.
+
+    Args:
+        partial_files: A list of files opened for reading in binary mode, one
+            for each shard, as written by write_partial.
+        csv_file: A file-like object to which to write the CSV of all results.
+
+    Returns:
+        The merged summary.Summary of all results.
+
+    Raises:
+        ValueError: The partial files are not of one of each shard of the same
+            corpus.
+    """
+    headers = [cPickle.load(partial_file) for partial_file in partial_files]
+    _check_headers(headers)
+    csv_convert.write_csv_header(csv_file)
+    for _, _, line in external_sort.merge_records([_read_rows(
+            partial_file) for partial_file in partial_files]):
+        csv_file.write(line)
+    merged_summary = summary.Summary(headers[0]['group_by'], exact=True)
+    for partial_file in partial_files:
+        merged_summary.merge(cPickle.load(partial_file))
+    return merged_summary
+
+
+def _shard_of(path, count):
+    # crc32 is stable across processes and hosts, unlike hash().
+    return (zlib.crc32(os.path.basename(path)) & 0xffffffff) % count
+
+
+def _read_rows(partial_file):
+    """Yields the rows of a partial file, leaving it at the summary."""
+    while True:
+        row = marshal.load(partial_file)
+        if row == _END_OF_ROWS:
+            return
+        yield row
+
+
+def _check_headers(headers):
+    if not headers:
+        raise ValueError('No partial files to merge')
+    for header in headers:
+        if header.get('version') != _FORMAT_VERSION:
+            raise ValueError('Unsupported partial file version: %s' %
+                             header.get('version'))
+        if header['group_by'] != headers[0]['group_by']:
+            raise ValueError('Partial files are grouped by different fields')
+    count = headers[0]['shard'][1]
+    shards = sorted(header['shard'] for header in headers)
+    if shards != [(index, count) for index in range(count)]:
+        raise ValueError('Expected one partial file for each of %d shards, '
+                         'got shards %s' % (count,
+                                            ', '.join('%d/%d' % shard
+                                                      for shard in shards)))
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Summarizes NDT results as aggregate statistics for each group of results.
+
+Given a pattern of files, finds the NDT result files (JSON) or result packages
+(zips of JSON), parses their contents and writes a CSV of the minimum, maximum,
+mean, median, standard deviation and count of each metric for each group of
+results, optionally within each minute, hour or day.
+"""
+
+import argparse
+import glob
+import sys
+
+import field_decoder
+import read_results
+import rollup
+import summary
+
+
+def main(args):
+    group_by = _group_by(args)
+    result_paths = sorted(glob.glob(args.pattern))
+    if args.window:
+        result_rollup = rollup.Rollup(args.window, group_by)
+        result_rollup.add_records(read_results.iter_fields(
+            result_paths, field_decoder.FIELDS, args.jobs))
+        summary.write_summary_csv(result_rollup.summaries(),
+                                  ['window_start'] + group_by, sys.stdout)
+        return
+    results = read_results.iter_results(result_paths, args.jobs)
+    summary.write_summary_csv(
+        summary.summarize(results, group_by, args.exact), group_by, sys.stdout)
+
+
+def _group_by(args):
+    return [field for field in args.group_by.split(',') if field]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        prog='NDT Result summarizer',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--pattern',
+                        required=True,
+                        help="Glob pattern of input files")
+    parser.add_argument('--group-by',
+                        default='',
+                        help=('Comma-separated list of fields by which to '
+                              'group results (any of %s)' %
+                              ', '.join(summary.GROUP_FIELDS)))
+    parser.add_argument('--window',
+                        choices=rollup.WINDOWS.keys(),
+                        help=('Summarize results separately for each time '
+                              'window of this size, by start time'))
+    parser.add_argument('--exact',
+                        action='store_true',
+                        help=('Keep every value so that medians are exact '
+                              'rather than estimated, as in the statistics '
+                              'of merged partial summaries (not with '
+                              '--window)'))
+    parser.add_argument('--jobs',
+                        type=int,
+                        default=1,
+                        help='Number of processes to use to parse input files')
+    args = parser.parse_args()
+    for field in _group_by(args):
+        if field not in summary.GROUP_FIELDS:
+            parser.error('Cannot group results by %s' % field)
+    if args.exact and args.window:
+        parser.error('--exact cannot be used with --window')
+    main(args)
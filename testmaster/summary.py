@@ -0,0 +1,163 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Calculates aggregate statistics of NDT results, grouped by result fields."""
+
+import collections
+import csv
+
+import aggregate
+import result_metrics
+
+# Result fields by which results may be grouped.
+GROUP_FIELDS = ('browser', 'browser_version', 'os', 'os_version', 'client',
+                'client_version')
+# Metrics to summarize, in output order, mapped to functions that calculate the
+# metric's value for an NdtResult.
+METRICS = collections.OrderedDict([
+    ('c2s_throughput', lambda result: result.c2s_result.throughput),
+    ('s2c_throughput', lambda result: result.s2c_result.throughput),
+    ('latency', lambda result: result.latency),
+    ('total_duration', result_metrics.total_duration),
+    ('c2s_duration', result_metrics.c2s_duration),
+    ('s2c_duration', result_metrics.s2c_duration),
+])
+_AGGREGATE_FIELDS = ('sample_count', 'minimum', 'maximum', 'mean', 'median',
+                     'standard_deviation')
+
+
+def summarize(results, group_by, exact=False):
+    """Calculates aggregate statistics for each metric of each group of results.
+
+    Makes a single pass over results, updating a RunningAggregate for each
+    metric of each group, so the results themselves are never held in memory.
+
+    Args:
+        results: An iterable of (filename, result) tuples, where result is an
+            NdtResult instance, such as the output of read_results.iter_results.
+        group_by: A list of fields in GROUP_FIELDS by which to group results.
+            If empty, all results form a single group.
+        exact: If True, keeps every value so that statistics are exact.
+
+    Returns:
+        A dictionary keyed by group, where each group is a tuple of the values
+        of the group_by fields. Each value is a dictionary mapping each metric
+        name in METRICS to an Aggregates named tuple.
+    """
+    result_summary = Summary(group_by, exact)
+    for _, result in results:
+        result_summary.add(result)
+    return result_summary.summaries()
+
+
+class Summary(object):
+    """Keeps running aggregate statistics of grouped NDT results.
+
+    Summary objects can be pickled, so running statistics can be saved and
+    updated later with new results, and summaries of different results can be
+    merged.
+    """
+
+    def __init__(self, group_by, exact=False):
+        """Creates an empty summary.
+
+        Args:
+            group_by: A list of fields in GROUP_FIELDS by which to group
+                results. If empty, all results form a single group.
+            exact: If True, keeps every value so that statistics are exact and
+                do not depend on the order in which results were added or
+                summaries merged (see aggregate.RunningAggregate).
+
+        Raises:
+            ValueError: group_by contains a field that is not in GROUP_FIELDS.
+        """
+        for field in group_by:
+            if field not in GROUP_FIELDS:
+                raise ValueError('Cannot group results by %s' % field)
+        self.group_by = list(group_by)
+        self.exact = exact
+        self._running_aggregates = {}
+
+    def add(self, result):
+        """Adds an NdtResult to the running statistics of its group."""
+        group = tuple(getattr(result, field) for field in self.group_by)
+        group_aggregates = self._running_aggregates.get(group)
+        if group_aggregates is None:
+            group_aggregates = self._new_group(group)
+        for running_aggregate, metric in zip(group_aggregates,
+                                             METRICS.itervalues()):
+            running_aggregate.add(metric(result))
+
+    def merge(self, other):
+        """Adds the statistics of another summary to this summary.
+
+        Args:
+            other: A Summary with the same group_by fields and value of exact.
+
+        Raises:
+            ValueError: other has different group_by fields or value of exact.
+        """
+        if other.group_by != self.group_by or other.exact != self.exact:
+            raise ValueError('Cannot merge summaries of different groups')
+        for group, other_aggregates in other._running_aggregates.iteritems():
+            group_aggregates = self._running_aggregates.get(group)
+            if group_aggregates is None:
+                group_aggregates = self._new_group(group)
+            for running_aggregate, other_aggregate in zip(group_aggregates,
+                                                          other_aggregates):
+                running_aggregate.merge(other_aggregate)
+
+    def summaries(self):
+        """Returns the current statistics, in the same form as summarize."""
+        summaries = {}
+        for group, group_aggregates in self._running_aggregates.iteritems():
+            summaries[group] = dict(zip(METRICS.iterkeys(), [
+                running_aggregate.result(
+                ) for running_aggregate in group_aggregates
+            ]))
+        return summaries
+
+    def _new_group(self, group):
+        group_aggregates = [aggregate.RunningAggregate(self.exact)
+                            for _ in METRICS]
+        self._running_aggregates[group] = group_aggregates
+        return group_aggregates
+
+
+def write_summary_csv(summaries, group_by, output_file):
+    """Writes the output of summarize to a file as CSV.
+
+    Writes one row for each metric of each group, in ascending order of group.
+
+    Args:
+        summaries: A dictionary of aggregate statistics, as returned by
+            summarize.
+        group_by: The list of fields by which summaries were grouped.
+        output_file: A file-like object to which to write the CSV.
+    """
+    csv_writer = csv.writer(output_file)
+    csv_writer.writerow(list(group_by) + ['metric'] + list(_AGGREGATE_FIELDS))
+    for group in sorted(summaries.keys()):
+        for metric in METRICS:
+            aggregates = summaries[group][metric]
+            csv_writer.writerow([_format_value(
+                value) for value in group] + [metric] + [_format_value(getattr(
+                    aggregates, field)) for field in _AGGREGATE_FIELDS])
+
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return '%.3f' % value
+    return value
@@ -0,0 +1,94 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Converts between timestamps and integer microseconds since the epoch."""
+
+import datetime
+import re
+
+# pytz is imported only by us_to_datetime: importing it is slow relative to
+# converting a few results, and the other conversions do not need it.
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_MICROSECONDS_PER_SECOND = 1000000
+_SECONDS_PER_DAY = 86400
+_ISO8601_PATTERN = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?Z\Z')
+
+
+def datetime_to_us(timestamp):
+    """Converts a timezone-aware datetime to microseconds since the epoch.
+
+    Args:
+        timestamp: A timezone-aware datetime instance or None.
+
+    Returns:
+        The number of microseconds between the epoch and timestamp as an
+        integer, or None if timestamp is None.
+    """
+    if timestamp is None:
+        return None
+    delta = timestamp.replace(tzinfo=None) - timestamp.utcoffset() - _EPOCH
+    return ((delta.days * _SECONDS_PER_DAY + delta.seconds) *
+            _MICROSECONDS_PER_SECOND + delta.microseconds)
+
+
+def us_to_datetime(timestamp_us):
+    """Converts microseconds since the epoch to a UTC datetime.
+
+    Args:
+        timestamp_us: An integer number of microseconds since the epoch or None.
+
+    Returns:
+        A datetime instance in UTC, or None if timestamp_us is None.
+    """
+    if timestamp_us is None:
+        return None
+    import pytz
+    return (_EPOCH + datetime.timedelta(microseconds=timestamp_us)).replace(
+        tzinfo=pytz.utc)
+
+
+def iso8601_to_us(timestamp):
+    """Parses a UTC ISO 8601 timestamp into microseconds since the epoch.
+
+    Accepts timestamps of the form '2016-05-24T16:55:22.677309Z', as written by
+    the NDT client wrapper, with between zero and six digits of fractional
+    seconds. This is several times faster than parsing the timestamp into a
+    datetime with strptime and converting the datetime with datetime_to_us.
+
+    Args:
+        timestamp: A timestamp string or None.
+
+    Returns:
+        The number of microseconds between the epoch and timestamp as an
+        integer, or None if timestamp is None.
+
+    Raises:
+        ValueError: timestamp is not a UTC ISO 8601 timestamp of the expected
+            form.
+    """
+    if timestamp is None:
+        return None
+    match = _ISO8601_PATTERN.match(timestamp)
+    if not match:
+        raise ValueError('Invalid timestamp: %r' % timestamp)
+    year, month, day, hour, minute, second, fraction = match.groups()
+    hour, minute, second = int(hour), int(minute), int(second)
+    if hour > 23 or minute > 59 or second > 59:
+        raise ValueError('Invalid timestamp: %r' % timestamp)
+    days = (datetime.date(
+        int(year), int(month), int(day)).toordinal() - _EPOCH_ORDINAL)
+    microseconds = int(fraction.ljust(6, '0')) if fraction else 0
+    return ((days * _SECONDS_PER_DAY + hour * 3600 + minute * 60 + second) *
+            _MICROSECONDS_PER_SECOND + microseconds)
@@ -0,0 +1,104 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Watches a directory for new files by polling."""
+
+import os
+import stat
+import time
+
+# Directory modification times may be as coarse as two seconds (on FAT), so a
+# file added within that long of a listing may not change the directory's
+# modification time. The directory is listed again until its modification time
+# is older than this.
+_MTIME_RESOLUTION = 2.0
+
+
+class DirectoryWatcher(object):
+    """Finds files that have appeared in a directory since the last poll.
+
+    Files are identified by name. The directory is listed only when its
+    modification time changes, which happens whenever an entry is added,
+    removed or renamed, and only files whose names have not been reported
+    before are stat-ed, so the cost of a poll does not grow with the number of
+    files already reported. A file that is modified after it was reported is
+    not reported again.
+
+    Files that were modified very recently may still be being written, so they
+    are not reported until they have been unchanged for settle_time seconds.
+
+    Attributes:
+        seen: A set of the names of every file reported so far. It may be saved
+            and passed to a new DirectoryWatcher to resume watching without
+            reporting the same files again.
+    """
+
+    def __init__(self, directory, settle_time=0, seen=None):
+        """Creates a watcher for a directory.
+
+        Args:
+            directory: Path of the directory to watch.
+            settle_time: Number of seconds a file must go unmodified before it
+                is reported.
+            seen: A set of the names of previously reported files, as in the
+                seen attribute of another DirectoryWatcher.
+        """
+        self._directory = directory
+        self._settle_time = settle_time
+        self.seen = seen if seen is not None else set()
+        # Names of new files that have not yet settled.
+        self._pending = set()
+        # Names of entries that are not regular files, such as subdirectories.
+        self._ignored = set()
+        # The modification time of the directory when it was last listed, or
+        # None if it must be listed again on the next poll.
+        self._listed_mtime = None
+
+    def poll(self):
+        """Returns the files that are new since the last poll.
+
+        Stats the directory, lists it only if it has changed and stats only new
+        files. The contents of files are never read.
+
+        Returns:
+            A sorted list of paths of new files.
+        """
+        now = time.time()
+        directory_mtime = os.stat(self._directory).st_mtime
+        if directory_mtime != self._listed_mtime:
+            for filename in os.listdir(self._directory):
+                if filename not in self.seen and filename not in self._ignored:
+                    self._pending.add(filename)
+            self._listed_mtime = None
+            if directory_mtime < now - _MTIME_RESOLUTION:
+                self._listed_mtime = directory_mtime
+        new_paths = []
+        settled_before = now - self._settle_time
+        for filename in list(self._pending):
+            path = os.path.join(self._directory, filename)
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                # The file was deleted after we listed it.
+                self._pending.discard(filename)
+                continue
+            if not stat.S_ISREG(file_stat.st_mode):
+                self._pending.discard(filename)
+                self._ignored.add(filename)
+                continue
+            if file_stat.st_mtime > settled_before:
+                continue
+            self._pending.discard(filename)
+            self.seen.add(filename)
+            new_paths.append(path)
+        return sorted(new_paths)
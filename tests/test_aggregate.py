@@ -15,6 +15,8 @@
 from __future__ import absolute_import
 import unittest
 
+import numpy
+
 from testmaster import aggregate
 
 
@@ -47,3 +49,119 @@ class AggregateTest(unittest.TestCase):
         self.assertAlmostEqual(10.0, aggregate_stats.median)
         self.assertAlmostEqual(5.888, aggregate_stats.standard_deviation, 3)
         self.assertEqual(3, aggregate_stats.sample_count)
+
+    def test_aggregate_array_ignores_NaN_values(self):
+        aggregate_stats = aggregate.aggregate_array(numpy.array(
+            [0.0, 10.0, numpy.nan, 14.0]))
+        self.assertAlmostEqual(0.0, aggregate_stats.minimum)
+        self.assertAlmostEqual(14.0, aggregate_stats.maximum)
+        self.assertAlmostEqual(8.0, aggregate_stats.mean)
+        self.assertAlmostEqual(10.0, aggregate_stats.median)
+        self.assertAlmostEqual(5.888, aggregate_stats.standard_deviation, 3)
+        self.assertEqual(3, aggregate_stats.sample_count)
+
+
+class RunningAggregateTest(unittest.TestCase):
+
+    def test_running_aggregate_matches_aggregate_for_few_values(self):
+        running_aggregate = aggregate.RunningAggregate()
+        for value in [0.0, 10.0, None, 14.0]:
+            running_aggregate.add(value)
+        aggregate_stats = running_aggregate.result()
+        self.assertAlmostEqual(0.0, aggregate_stats.minimum)
+        self.assertAlmostEqual(14.0, aggregate_stats.maximum)
+        self.assertAlmostEqual(8.0, aggregate_stats.mean)
+        self.assertAlmostEqual(10.0, aggregate_stats.median)
+        self.assertAlmostEqual(5.888, aggregate_stats.standard_deviation, 3)
+        self.assertEqual(3, aggregate_stats.sample_count)
+
+    def test_running_aggregate_estimates_median_of_many_values(self):
+        running_aggregate = aggregate.RunningAggregate()
+        for value in range(1001):
+            running_aggregate.add(value)
+        aggregate_stats = running_aggregate.result()
+        self.assertAlmostEqual(0.0, aggregate_stats.minimum)
+        self.assertAlmostEqual(1000.0, aggregate_stats.maximum)
+        self.assertAlmostEqual(500.0, aggregate_stats.mean)
+        self.assertAlmostEqual(500.0, aggregate_stats.median, delta=10.0)
+        self.assertAlmostEqual(289.0, aggregate_stats.standard_deviation, 0)
+        self.assertEqual(1001, aggregate_stats.sample_count)
+
+    def test_running_aggregate_with_no_values(self):
+        aggregate_stats = aggregate.RunningAggregate().result()
+        self.assertIsNone(aggregate_stats.mean)
+        self.assertEqual(0, aggregate_stats.sample_count)
+
+    def test_merged_aggregates_match_single_aggregate(self):
+        merged_aggregate = aggregate.RunningAggregate()
+        other_aggregate = aggregate.RunningAggregate()
+        for value in range(1000):
+            merged_aggregate.add(value)
+            other_aggregate.add(1000 + value)
+        merged_aggregate.merge(other_aggregate)
+        aggregate_stats = merged_aggregate.result()
+        self.assertAlmostEqual(0.0, aggregate_stats.minimum)
+        self.assertAlmostEqual(1999.0, aggregate_stats.maximum)
+        self.assertAlmostEqual(999.5, aggregate_stats.mean)
+        self.assertAlmostEqual(1000.0, aggregate_stats.median, delta=20.0)
+        self.assertAlmostEqual(577.350, aggregate_stats.standard_deviation, 3)
+        self.assertEqual(2000, aggregate_stats.sample_count)
+        quantiles = merged_aggregate.quantiles()
+        self.assertAlmostEqual(1800.0, quantiles.p90, delta=20.0)
+        self.assertAlmostEqual(1980.0, quantiles.p99, delta=20.0)
+
+    def test_merge_into_empty_aggregate(self):
+        empty_aggregate = aggregate.RunningAggregate()
+        other_aggregate = aggregate.RunningAggregate()
+        other_aggregate.add(5.0)
+        empty_aggregate.merge(other_aggregate)
+        self.assertEqual(aggregate.aggregate([5.0]), empty_aggregate.result())
+
+    def test_exact_mode_matches_aggregate(self):
+        values = [float(value % 7) for value in range(1000)]
+        exact_aggregate = aggregate.RunningAggregate(exact=True)
+        other_aggregate = aggregate.RunningAggregate(exact=True)
+        for value in values[:500]:
+            exact_aggregate.add(value)
+        for value in values[500:]:
+            other_aggregate.add(value)
+        exact_aggregate.merge(other_aggregate)
+        self.assertEqual(
+            aggregate.aggregate(sorted(values)), exact_aggregate.result())
+        self.assertEqual(
+            aggregate.Quantiles(3.0, 6.0, 6.0, 6.0),
+            exact_aggregate.quantiles())
+
+    def test_exact_mode_does_not_depend_on_order(self):
+        values = [0.1 * value for value in range(1000)]
+        forward_aggregate = aggregate.RunningAggregate(exact=True)
+        reverse_aggregate = aggregate.RunningAggregate(exact=True)
+        for value in values:
+            forward_aggregate.add(value)
+        for value in reversed(values):
+            reverse_aggregate.add(value)
+        self.assertEqual(forward_aggregate.result(), reverse_aggregate.result())
+
+    def test_cannot_merge_exact_and_approximate_aggregates(self):
+        with self.assertRaises(ValueError):
+            aggregate.RunningAggregate(
+                exact=True).merge(aggregate.RunningAggregate())
+
+    def test_add_array_matches_add(self):
+        values = [float(value % 13) for value in range(500)]
+        added_aggregate = aggregate.RunningAggregate()
+        for value in values:
+            added_aggregate.add(value)
+        array_aggregate = aggregate.RunningAggregate()
+        array_aggregate.add(values[0])
+        array_aggregate.add_array(numpy.array(values[1:] + [numpy.nan]))
+        array_aggregate.add_array(numpy.array([]))
+        expected = added_aggregate.result()
+        actual = array_aggregate.result()
+        self.assertEqual(expected.sample_count, actual.sample_count)
+        self.assertEqual(expected.minimum, actual.minimum)
+        self.assertEqual(expected.maximum, actual.maximum)
+        self.assertAlmostEqual(expected.mean, actual.mean)
+        self.assertAlmostEqual(expected.standard_deviation,
+                               actual.standard_deviation)
+        self.assertEqual(expected.median, actual.median)
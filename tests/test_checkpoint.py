@@ -0,0 +1,169 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from testmaster import checkpoint
+from testmaster import csv_convert
+from testmaster import pipeline_stats
+from testmaster import read_results
+
+
+def testdata_path(filename):
+    return os.path.join(os.path.dirname(__file__), 'testdata', filename)
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        pipeline_stats.reset()
+        self.temp_dir = tempfile.mkdtemp()
+        with open(testdata_path('raw-result.json')) as raw_result_file:
+            raw_result = json.load(raw_result_file)
+        self.result_paths = []
+        for index in range(7):
+            raw_result['latency'] = float(index)
+            path = self.temp_path('result-%d.json' % index)
+            with open(path, 'w') as result_file:
+                json.dump(raw_result, result_file)
+            self.result_paths.append(path)
+        self.result_paths.insert(3, testdata_path('result-package.zip'))
+        self.output_path = self.temp_path('output.csv')
+        self.journal_path = self.temp_path('journal')
+        self.quarantine_path = self.temp_path('quarantine.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+        pipeline_stats.reset()
+
+    def temp_path(self, filename):
+        return os.path.join(self.temp_dir, filename)
+
+    def convert(self, result_paths=None, workers=1):
+        checkpoint.convert(result_paths or self.result_paths, self.output_path,
+                           self.journal_path, self.quarantine_path, 3, workers)
+
+    def expected_csv(self, result_paths):
+        output = io.BytesIO()
+        csv_convert.write_ndt_fields_csv(
+            read_results.iter_fields(result_paths, csv_convert.CSV_FIELDS),
+            output)
+        return output.getvalue()
+
+    def read(self, path):
+        with open(path, 'rb') as input_file:
+            return input_file.read()
+
+    def quarantined(self):
+        with open(self.quarantine_path, 'rb') as quarantine_file:
+            return list(csv.reader(quarantine_file))
+
+    def counter(self, name):
+        return pipeline_stats.snapshot()['counters'].get(name)
+
+    def test_matches_streamed_csv(self):
+        self.convert()
+        self.assertEqual(
+            self.expected_csv(self.result_paths), self.read(self.output_path))
+        self.assertEqual([['path', 'error']], self.quarantined())
+        self.assertEqual(3, self.counter('checkpoints_written'))
+
+    def test_parallel_matches_serial(self):
+        self.convert(workers=2)
+        self.assertEqual(
+            self.expected_csv(self.result_paths), self.read(self.output_path))
+
+    def test_quarantines_bad_inputs(self):
+        good_paths = list(self.result_paths)
+        corrupt_path = self.temp_path('corrupt.json')
+        with open(corrupt_path, 'w') as corrupt_file:
+            corrupt_file.write('{"start_time": ')
+        truncated_path = self.temp_path('truncated.zip')
+        with open(truncated_path, 'wb') as truncated_file:
+            truncated_file.write(self.read(testdata_path(
+                'result-package.zip'))[:-100])
+        self.result_paths[1:1] = [corrupt_path, self.temp_path('missing.json')]
+        self.result_paths.append(truncated_path)
+        self.convert()
+        self.assertEqual(
+            self.expected_csv(good_paths), self.read(self.output_path))
+        self.assertEqual(
+            [corrupt_path, self.temp_path('missing.json'), truncated_path],
+            [path for path, _ in self.quarantined()[1:]])
+        self.assertTrue(all(error for _, error in self.quarantined()[1:]))
+        self.assertEqual(3, self.counter('inputs_quarantined'))
+
+    def test_quarantines_json_that_is_not_a_result(self):
+        good_paths = list(self.result_paths)
+        array_path = self.temp_path('array.json')
+        with open(array_path, 'w') as array_file:
+            array_file.write('[1, 2]')
+        self.result_paths.insert(1, array_path)
+        self.convert()
+        self.assertEqual(
+            self.expected_csv(good_paths), self.read(self.output_path))
+        self.assertEqual([array_path], [path
+                                        for path, _ in self.quarantined()[1:]])
+
+    def test_resumes_from_last_checkpoint(self):
+        self.convert()
+        expected_output = self.read(self.output_path)
+        # Simulate a run interrupted during its second batch: the journal has a
+        # single checkpoint and a partly written one, and rows after the
+        # checkpoint are partly written.
+        journal_lines = self.read(self.journal_path).splitlines(True)
+        first_checkpoint = json.loads(journal_lines[1])
+        with open(self.journal_path, 'wb') as journal_file:
+            journal_file.writelines(journal_lines[:2])
+            journal_file.write(journal_lines[2][:10])
+        with open(self.output_path, 'r+b') as output_file:
+            output_file.truncate(first_checkpoint['output_bytes'] + 20)
+        pipeline_stats.reset()
+        self.convert()
+        self.assertEqual(expected_output, self.read(self.output_path))
+        self.assertEqual(3, self.counter('inputs_resumed'))
+        self.assertEqual(2, self.counter('checkpoints_written'))
+        self.assertEqual(4, len(self.read(self.journal_path).splitlines()))
+
+    def test_resuming_a_finished_run_converts_nothing(self):
+        self.convert()
+        expected_output = self.read(self.output_path)
+        pipeline_stats.reset()
+        self.convert()
+        self.assertEqual(expected_output, self.read(self.output_path))
+        self.assertEqual(len(self.result_paths), self.counter('inputs_resumed'))
+        self.assertIsNone(self.counter('checkpoints_written'))
+
+    def test_rejects_journal_of_different_inputs(self):
+        self.convert()
+        with self.assertRaises(ValueError):
+            self.convert(self.result_paths[1:])
+
+    def test_rejects_output_shorter_than_checkpoint(self):
+        self.convert()
+        with open(self.output_path, 'r+b') as output_file:
+            output_file.truncate(10)
+        with self.assertRaises(ValueError):
+            self.convert()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import unittest
+
+from testmaster import client_log
+from testmaster import timestamps
+
+BANJO_LOG = """\
+2016-05-24 19:17:20,862 __main__     INFO     starting fake mlab-ns server on port 50595
+2016-05-24 19:17:22,049 __main__     INFO     starting iteration 1...
+2016-05-24 19:17:22,049 banjo_driver INFO     starting banjo test
+2016-05-24 19:17:24,292 banjo_driver INFO     loading URL: http://localhost:8888/banjo
+2016-05-24 19:17:25,519 banjo_driver INFO     page loaded, starting UI flow
+2016-05-24 19:17:25,815 banjo_driver INFO     clicked "Run Test" button
+2016-05-24 19:17:25,924 fake_mlabns  INFO     "GET /ndt_ssl HTTP/1.1" 200 -
+2016-05-24 19:17:34,596 banjo_driver INFO     s2c test started
+2016-05-24 19:17:44,456 banjo_driver INFO     s2c test finished
+2016-05-24 19:17:51,081 banjo_driver INFO     c2s test started
+2016-05-24 19:18:01,611 banjo_driver INFO     c2s test ended
+2016-05-24 19:18:01,861 banjo_driver INFO     banjo test ended
+starting iteration 1...
+{
+    "c2s_start_time": "2016-05-24T19:17:51.081000Z"
+}
+""".splitlines(True)
+
+
+def log_time_us(text):
+    return timestamps.iso8601_to_us('2016-05-24T%sZ' % text)
+
+
+class ClientLogTest(unittest.TestCase):
+
+    def test_is_client_log(self):
+        self.assertTrue(client_log.is_client_log(
+            'logs/client_wrapper-win-log-test1-2016-05-24T191603.log'))
+        self.assertFalse(client_log.is_client_log('client_wrapper.json'))
+        self.assertFalse(client_log.is_client_log('logs/server.log'))
+
+    def test_iter_events_skips_irrelevant_lines(self):
+        self.assertEqual(
+            [(log_time_us('19:17:22.049'), 'iteration_start'),
+             (log_time_us('19:17:22.049'), 'test_start'),
+             (log_time_us('19:17:24.292'), 'page_load_start'),
+             (log_time_us('19:17:25.519'), 'page_loaded'),
+             (log_time_us('19:17:25.815'), 'start_clicked'),
+             (log_time_us('19:17:34.596'), 's2c_start'),
+             (log_time_us('19:17:44.456'), 's2c_end'),
+             (log_time_us('19:17:51.081'), 'c2s_start'),
+             (log_time_us('19:18:01.611'), 'c2s_end'),
+             (log_time_us('19:18:01.861'), 'test_end')],
+            list(client_log.iter_events(BANJO_LOG)))
+
+    def test_iter_events_converts_local_time_to_utc(self):
+        # A log written four hours west of UTC (EDT).
+        event = next(client_log.iter_events(BANJO_LOG, -4 * 3600 * 10**6))
+        self.assertEqual(log_time_us('23:17:22.049'), event.timestamp_us)
+
+    def test_iteration_timings_follow_test_order(self):
+        iterations = list(client_log.iter_iteration_timings(
+            client_log.iter_events(BANJO_LOG)))
+        self.assertEqual(1, len(iterations))
+        timings = iterations[0].timings
+        self.assertEqual(client_log.PHASES.keys(),
+                         sorted(timings,
+                                key=client_log.PHASES.keys().index))
+        self.assertAlmostEqual(2.243, timings['browser_launch'])
+        self.assertAlmostEqual(1.227, timings['page_load'])
+        self.assertAlmostEqual(0.296, timings['ui_flow'])
+        # The banjo client runs s2c first, so setup ends when s2c starts and
+        # teardown starts when c2s ends.
+        self.assertAlmostEqual(8.781, timings['test_setup'])
+        self.assertAlmostEqual(10.53, timings['c2s'])
+        self.assertAlmostEqual(9.86, timings['s2c'])
+        self.assertAlmostEqual(0.25, timings['teardown'])
+        self.assertAlmostEqual(39.812, timings['total'])
+
+    def test_missing_events_leave_phases_unknown(self):
+        iterations = list(client_log.iter_iteration_timings(
+            client_log.iter_events(BANJO_LOG[:9])))
+        timings = iterations[0].timings
+        self.assertAlmostEqual(9.86, timings['s2c'])
+        self.assertIsNone(timings['c2s'])
+        self.assertIsNone(timings['teardown'])
+        self.assertIsNone(timings['total'])
+
+    def test_link_timings(self):
+        iterations = [
+            client_log.IterationTimings(3000000, 4000000, {'total': 2}),
+            client_log.IterationTimings(1000000, 2000000, {'total': 1})
+        ]
+        # A result may appear to start up to a millisecond before its iteration.
+        self.assertEqual(
+            [{'total': 1}, {'total': 2}, None, None], client_log.link_timings(
+                [1500000, 2999500, 10000000, None], iterations))
+
+    def test_link_timings_prefers_latest_overlapping_iteration(self):
+        # Iterations from two logs, one of which spans the others.
+        iterations = [
+            client_log.IterationTimings(1000000, 9000000, {'total': 8}),
+            client_log.IterationTimings(2000000, 3000000, {'total': 1}),
+            client_log.IterationTimings(4000000, 5000000, {'total': 1})
+        ]
+        self.assertEqual(
+            [{'total': 1}, {'total': 8}, {'total': 1}], client_log.link_timings(
+                [2500000, 3500000, 4500000], iterations))
+
+    def test_iter_phase_timings_reads_packages(self):
+        results = list(client_log.iter_phase_timings(
+            ['tests/testdata/result-package.zip',
+             'tests/testdata/raw-result.json']))
+        self.assertEqual(1, len(results))
+        filename, timings = results[0]
+        self.assertEqual('packaged-result.json', filename)
+        self.assertAlmostEqual(11.546, timings['c2s'])
+        self.assertAlmostEqual(44.249, timings['total'])
+
+
+if __name__ == '__main__':
+    unittest.main()
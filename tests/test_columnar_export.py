@@ -0,0 +1,118 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from testmaster import columnar_export
+from testmaster import result_table
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+COMPLETED_FIELDS = {
+    'c2s_throughput': 0.938,
+    's2c_throughput': 1.01,
+    'latency': 564.0,
+    'start_time': 1464108922677309,
+    'end_time': 1464108958756734,
+    'c2s_start_time': 1464108934074628,
+    'c2s_end_time': 1464108946944071,
+    's2c_start_time': 1464108946944247,
+    's2c_end_time': 1464108958324334,
+    'browser': 'chrome',
+    'browser_version': '50.0.2661.86',
+    'os': 'OSX',
+    'os_version': '10.11.3',
+    'client': 'ndt_js',
+    'client_version': None,
+    'errors': [],
+}
+FAILED_FIELDS = {
+    'c2s_throughput': None,
+    's2c_throughput': None,
+    'latency': None,
+    'start_time': 1464117483924000,
+    'end_time': 1464117528173000,
+    'c2s_start_time': 1464117515219000,
+    'c2s_end_time': None,
+    's2c_start_time': None,
+    's2c_end_time': None,
+    'browser': 'firefox',
+    'browser_version': '45.0.1',
+    'os': 'Windows',
+    'os_version': '2012ServerR2',
+    'client': 'ndt_js',
+    'client_version': '1.0',
+    'errors': ['dummy c2s error', 'dummy s2c error'],
+}
+
+
+class ColumnarExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        builder = result_table.ResultTableBuilder()
+        builder.append_fields('completed.json', COMPLETED_FIELDS)
+        builder.append_fields('failed.json', FAILED_FIELDS)
+        self.table = builder.build()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_npz_round_trip_preserves_table(self):
+        path = os.path.join(self.temp_dir, 'results.npz')
+        columnar_export.write_npz(self.table, path)
+        loaded = columnar_export.read_npz(path)
+        self.assertEqual(['completed.json', 'failed.json'], loaded.filenames)
+        for name, column in self.table.columns.iteritems():
+            numpy.testing.assert_array_equal(column, loaded.columns[name])
+        self.assertEqual(numpy.int64, loaded.columns['start_time'].dtype)
+        for name in result_table.CATEGORICAL_COLUMNS:
+            self.assertEqual(
+                [self.table.categoricals[name][row]
+                 for row in range(2)], [loaded.categoricals[name][row]
+                                        for row in range(2)])
+        self.assertEqual([], loaded.errors(0))
+        self.assertEqual(['dummy c2s error', 'dummy s2c error'],
+                         loaded.errors(1))
+
+    def test_npz_includes_durations(self):
+        path = os.path.join(self.temp_dir, 'results.npz')
+        columnar_export.write_npz(self.table, path)
+        archive = numpy.load(path)
+        self.assertAlmostEqual(36.079425, archive['total_duration'][0])
+        self.assertTrue(numpy.isnan(archive['c2s_duration'][1]))
+        self.assertEqual([-1, 0], list(archive['client_version_codes']))
+        archive.close()
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet_has_typed_columns(self):
+        path = os.path.join(self.temp_dir, 'results.parquet')
+        columnar_export.write_parquet(self.table, path)
+        table = pyarrow.parquet.read_table(path).to_pydict()
+        self.assertEqual(['completed.json', 'failed.json'], table['filename'])
+        self.assertEqual([0.938, None], table['c2s_throughput'])
+        self.assertEqual(['chrome', 'firefox'], table['browser'])
+        self.assertEqual([None, '1.0'], table['client_version'])
+        self.assertEqual(
+            [[], ['dummy c2s error', 'dummy s2c error']], table['errors'])
+        self.assertIsNone(table['s2c_end_time'][1])
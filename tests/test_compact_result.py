@@ -0,0 +1,154 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import datetime
+import pickle
+import sys
+import unittest
+
+import pytz
+
+from testmaster import compact_result
+from testmaster import csv_convert
+from testmaster import field_decoder
+from testmaster import result_metrics
+from testmaster.ndt_e2e_clientworker.client_wrapper import results
+
+COMPLETE_RESULT = results.NdtResult(
+    browser='chrome',
+    browser_version='50.0.2661.86',
+    end_time=datetime.datetime(2016, 5, 24, 16, 55, 58, 756734, pytz.utc),
+    client='ndt_js',
+    client_version=None,
+    os='OSX',
+    os_version='10.11.3',
+    start_time=datetime.datetime(2016, 5, 24, 16, 55, 22, 677309, pytz.utc),
+    c2s_result=results.NdtSingleTestResult(
+        start_time=datetime.datetime(2016, 5, 24, 16, 55, 34, 74628, pytz.utc),
+        end_time=datetime.datetime(2016, 5, 24, 16, 55, 46, 944071, pytz.utc),
+        throughput=0.938),
+    s2c_result=results.NdtSingleTestResult(
+        start_time=datetime.datetime(2016, 5, 24, 16, 55, 46, 944247, pytz.utc),
+        end_time=datetime.datetime(2016, 5, 24, 16, 55, 58, 324334, pytz.utc),
+        throughput=1.01),
+    latency=564.0)
+# A result in which s2c and c2s tests fail to complete and generate errors.
+MISSING_FIELDS_RESULT = results.NdtResult(
+    end_time=datetime.datetime(2016, 5, 24, 19, 18, 48, 173000, pytz.utc),
+    start_time=datetime.datetime(2016, 5, 24, 19, 18, 3, 924000, pytz.utc),
+    c2s_result=results.NdtSingleTestResult(start_time=datetime.datetime(
+        2016, 5, 24, 19, 18, 35, 219000, pytz.utc)),
+    s2c_result=results.NdtSingleTestResult(start_time=datetime.datetime(
+        2016, 5, 24, 19, 18, 15, 991000, pytz.utc)),
+    errors=[results.TestError('dummy s2c error'),
+            results.TestError('dummy c2s error')])
+
+
+class CompactResultTest(unittest.TestCase):
+
+    def test_has_same_fields_as_ndt_result(self):
+        for result in (COMPLETE_RESULT, MISSING_FIELDS_RESULT):
+            compact = compact_result.CompactResult.from_result(result)
+            self.assertEqual(result.start_time, compact.start_time)
+            self.assertEqual(result.end_time, compact.end_time)
+            for test_result, compact_test_result in (
+                (result.c2s_result, compact.c2s_result),
+                (result.s2c_result, compact.s2c_result)):
+                self.assertEqual(test_result.start_time,
+                                 compact_test_result.start_time)
+                self.assertEqual(test_result.end_time,
+                                 compact_test_result.end_time)
+                self.assertEqual(test_result.throughput,
+                                 compact_test_result.throughput)
+            self.assertEqual(result.latency, compact.latency)
+            self.assertEqual(result.browser_version, compact.browser_version)
+            self.assertEqual(
+                [error.message
+                 for error in result.errors], [error.message
+                                               for error in compact.errors])
+            self.assertDictEqual(
+                field_decoder.result_to_fields(result), compact.to_fields())
+
+    def test_result_metrics_match_ndt_result(self):
+        for result in (COMPLETE_RESULT, MISSING_FIELDS_RESULT):
+            compact = compact_result.CompactResult.from_result(result)
+            for metric in (result_metrics.total_duration,
+                           result_metrics.c2s_duration,
+                           result_metrics.s2c_duration):
+                self.assertEqual(metric(result), metric(compact))
+
+    def test_produces_same_csv_as_ndt_result(self):
+        ndt_results = {'a.json': COMPLETE_RESULT,
+                       'b.json': MISSING_FIELDS_RESULT}
+        compact_results = {
+            filename: compact_result.CompactResult.from_result(result)
+            for filename, result in ndt_results.iteritems()
+        }
+        self.assertEqual(
+            csv_convert.ndt_results_to_csv(ndt_results),
+            csv_convert.ndt_results_to_csv(compact_results))
+
+    def test_shares_strings_and_errors_across_results(self):
+        first = compact_result.CompactResult.from_result(MISSING_FIELDS_RESULT)
+        fields = field_decoder.result_to_fields(MISSING_FIELDS_RESULT)
+        # Copies of the strings, as decoding a second result would produce.
+        fields['browser'] = ''.join(['fire', 'fox'])
+        fields['errors'] = [''.join(message) for message in fields['errors']]
+        second = compact_result.CompactResult(fields)
+        third = compact_result.CompactResult(dict(fields))
+        self.assertIs(second.browser, third.browser)
+        self.assertIs(first.errors[0], second.errors[0])
+
+    def test_shares_a_bounded_number_of_values(self):
+        original_max = compact_result._MAX_SHARED_VALUES
+        original_strings = compact_result._strings
+        original_errors = compact_result._errors
+        compact_result._MAX_SHARED_VALUES = 2
+        compact_result._strings = {}
+        compact_result._errors = {}
+        try:
+            fields = field_decoder.result_to_fields(MISSING_FIELDS_RESULT)
+            for index in range(10):
+                fields['browser'] = 'browser %d' % index
+                fields['errors'] = ['error %d' % index]
+                compact = compact_result.CompactResult(fields)
+                self.assertEqual('browser %d' % index, compact.browser)
+                self.assertEqual('error %d' % index, compact.errors[0].message)
+            self.assertEqual(2, len(compact_result._strings))
+            self.assertEqual(2, len(compact_result._errors))
+        finally:
+            compact_result._MAX_SHARED_VALUES = original_max
+            compact_result._strings = original_strings
+            compact_result._errors = original_errors
+
+    def test_is_much_smaller_than_ndt_result(self):
+        compact = compact_result.CompactResult.from_result(COMPLETE_RESULT)
+        self.assertFalse(hasattr(compact, '__dict__'))
+        # The object itself and its packed numbers; strings and errors are
+        # shared.
+        self.assertLess(
+            sys.getsizeof(compact) + sys.getsizeof(compact._numbers), 250)
+
+    def test_pickles(self):
+        compact = compact_result.CompactResult.from_result(
+            MISSING_FIELDS_RESULT)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertDictEqual(
+                compact.to_fields(),
+                pickle.loads(pickle.dumps(compact, protocol)).to_fields())
+
+
+if __name__ == '__main__':
+    unittest.main()
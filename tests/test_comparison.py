@@ -0,0 +1,145 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import unittest
+
+import numpy
+
+from testmaster import comparison
+from testmaster import field_decoder
+from testmaster import result_table
+
+
+def make_table(rows):
+    """Builds a ResultTable from (client_version, latency) tuples."""
+    records = []
+    for index, (client_version, latency) in enumerate(rows):
+        fields = dict.fromkeys(field_decoder.FIELDS)
+        fields['client_version'] = client_version
+        fields['latency'] = latency
+        fields['errors'] = []
+        records.append(('%d.json' % index, fields))
+    return result_table.ResultTable.from_fields(records)
+
+
+def explicit_bootstrap(values, statistic, resamples, random_state):
+    """Bootstraps a statistic by drawing every resample explicitly."""
+    indexes = random_state.randint(0, len(values), (resamples, len(values)))
+    return statistic(values[indexes], axis=1)
+
+
+class ComparisonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.random_state = numpy.random.RandomState(0)
+
+    def assertDistributionsClose(self, expected, actual):
+        """Checks that percentiles of two samples agree to within 3%."""
+        percentiles = [2.5, 25, 50, 75, 97.5]
+        for expected_value, actual_value in zip(
+                numpy.percentile(expected, percentiles),
+                numpy.percentile(actual, percentiles)):
+            self.assertAlmostEqual(expected_value,
+                                   actual_value,
+                                   delta=0.03 * abs(expected_value))
+
+    def test_parse_filter(self):
+        self.assertDictEqual(
+            {'client_version': '1.2',
+             'browser': 'chrome'},
+            comparison.parse_filter('client_version=1.2, browser=chrome'))
+        with self.assertRaises(ValueError):
+            comparison.parse_filter('client_version')
+        with self.assertRaises(ValueError):
+            comparison.parse_filter('latency=10')
+
+    def test_filter_rows(self):
+        table = make_table([('1.0', 1.0), ('1.1', 2.0), ('1.0', 3.0)])
+        self.assertEqual(
+            [True, False, True],
+            comparison.filter_rows(table, {'client_version': '1.0'}).tolist())
+        self.assertEqual(
+            [False, False, False],
+            comparison.filter_rows(table, {'client_version': '2.0'}).tolist())
+
+    def test_bootstrap_medians_match_explicit_resampling(self):
+        for count in (7, 8, 500):
+            values = numpy.sort(self.random_state.lognormal(size=count))
+            self.assertDistributionsClose(
+                explicit_bootstrap(values, numpy.median, 20000,
+                                   self.random_state),
+                comparison.bootstrap_medians(values, 20000, self.random_state))
+
+    def test_bootstrap_means_match_explicit_resampling(self):
+        for count in (7, 2000):
+            values = numpy.sort(self.random_state.lognormal(size=count))
+            self.assertDistributionsClose(
+                explicit_bootstrap(values, numpy.mean, 20000,
+                                   self.random_state),
+                comparison.bootstrap_means(values, 20000, self.random_state))
+
+    def test_detects_shifted_population(self):
+        baseline = self.random_state.normal(100.0, 10.0, 2000)
+        candidate = self.random_state.normal(110.0, 10.0, 2000)
+        median, mean = comparison.compare('latency',
+                                          baseline,
+                                          candidate,
+                                          random_state=self.random_state)
+        self.assertEqual('median', median.statistic)
+        self.assertEqual('mean', mean.statistic)
+        for result in (median, mean):
+            self.assertAlmostEqual(10.0, result.difference, delta=1.5)
+            self.assertLess(result.lower, result.difference)
+            self.assertGreater(result.upper, result.difference)
+            self.assertTrue(result.significant)
+            self.assertEqual(2000, result.candidate_count)
+
+    def test_identical_populations_are_not_significantly_different(self):
+        values = self.random_state.normal(100.0, 10.0, 2000)
+        for result in comparison.compare('latency',
+                                         values,
+                                         values.copy(),
+                                         random_state=self.random_state):
+            self.assertEqual(0.0, result.difference)
+            self.assertFalse(result.significant)
+
+    def test_ignores_missing_values(self):
+        results = comparison.compare('latency',
+                                     numpy.array([1.0, numpy.nan, 3.0]),
+                                     numpy.array([numpy.nan]),
+                                     random_state=self.random_state)
+        for result in results:
+            self.assertEqual(2, result.baseline_count)
+            self.assertEqual(0, result.candidate_count)
+            self.assertIsNone(result.difference)
+
+    def test_compare_tables(self):
+        table = make_table([('1.0', 10.0), ('1.1', 30.0), ('1.0', 20.0), (
+            '1.1', 40.0)])
+        results = comparison.compare_tables(
+            table,
+            comparison.filter_rows(table, {'client_version': '1.0'}),
+            comparison.filter_rows(table, {'client_version': '1.1'}),
+            ['latency'],
+            resamples=1000,
+            random_state=self.random_state)
+        self.assertEqual(
+            [('latency', 'median', 15.0, 35.0, 20.0),
+             ('latency', 'mean', 15.0, 35.0, 20.0)], [result[:5]
+                                                      for result in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
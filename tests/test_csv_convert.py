@@ -14,11 +14,13 @@
 
 from __future__ import absolute_import
 import datetime
+import io
 import unittest
 
 import pytz
 
 from testmaster import csv_convert
+from testmaster import field_decoder
 from testmaster.ndt_e2e_clientworker.client_wrapper import results
 
 # An NDT result in which no errors occur and both s2c and c2s complete
@@ -73,3 +75,49 @@ missing-fields.json,44.2,,,,,,1,"dummy s2c error,dummy c2s error"
 no-errors.json,36.1,0.9,12.9,1.0,11.4,15.0,0,
 """
         self.assertCSVsEqual(expected_csv, actual_csv)
+
+    def test_write_ndt_results_csv_preserves_input_order(self):
+        results = [('no-errors.json', NO_ERRORS_RESULT),
+                   ('missing-fields.json', MISSING_FIELDS_RESULT)]
+        output = io.BytesIO()
+        csv_convert.write_ndt_results_csv(iter(results), output)
+        expected_csv = """Filename,Total Duration (s),Upload Throughput (Mbps),Upload Duration (s),Download Througput (Mbps),Download Duration (s),Latency (ms),Error occurred?,Error List
+no-errors.json,36.1,0.9,12.9,1.0,11.4,15.0,0,
+missing-fields.json,44.2,,,,,,1,"dummy s2c error,dummy c2s error"
+"""
+        self.assertCSVsEqual(expected_csv, output.getvalue())
+
+    def test_fields_produce_same_csv_as_results(self):
+        results = {
+            'no-errors.json': NO_ERRORS_RESULT,
+            'missing-fields.json': MISSING_FIELDS_RESULT,
+        }
+        records = {}
+        for filename, result in results.iteritems():
+            fields = field_decoder.result_to_fields(result)
+            records[filename] = {name: fields[name]
+                                 for name in csv_convert.CSV_FIELDS}
+        self.assertCSVsEqual(
+            csv_convert.ndt_results_to_csv(results),
+            csv_convert.ndt_fields_to_csv(records))
+
+    def test_sorted_csv_matches_in_memory_sort(self):
+        results = [('no-errors.json', NO_ERRORS_RESULT),
+                   ('missing-fields.json', NO_ERRORS_RESULT),
+                   ('missing-fields.json', MISSING_FIELDS_RESULT)]
+        for memory_budget in (1, 10 * 1024 * 1024):
+            output = io.BytesIO()
+            csv_convert.write_sorted_ndt_results_csv(
+                iter(results), output, memory_budget)
+            self.assertEqual(
+                csv_convert.ndt_results_to_csv(dict(results)),
+                output.getvalue())
+
+    def test_sorted_fields_csv_matches_in_memory_sort(self):
+        records = [(filename, field_decoder.result_to_fields(result))
+                   for filename, result in (('b.json', NO_ERRORS_RESULT), (
+                       'a.json', MISSING_FIELDS_RESULT))]
+        output = io.BytesIO()
+        csv_convert.write_sorted_ndt_fields_csv(iter(records), output, 1)
+        self.assertEqual(
+            csv_convert.ndt_fields_to_csv(dict(records)), output.getvalue())
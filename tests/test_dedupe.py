@@ -0,0 +1,120 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from testmaster import dedupe
+
+
+class ParseFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.decoded = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def decode(self, raw_contents):
+        self.decoded.append(raw_contents)
+        return json.loads(raw_contents)
+
+    def write_raw(self, relative_path, contents):
+        path = os.path.join(self.temp_dir, relative_path)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as raw_file:
+            raw_file.write(contents)
+        return path
+
+    def write_package(self, filename, members):
+        path = os.path.join(self.temp_dir, filename)
+        with zipfile.ZipFile(path, 'w') as package:
+            for name, contents in members:
+                package.writestr(name, contents)
+        return path
+
+    def parse(self, policy):
+        self.decoded = []
+        return dedupe.parse_files(self.paths, policy, self.decode)
+
+    def make_conflict(self):
+        self.paths = [
+            self.write_raw('a/result.json', '{"latency": 1}'),
+            self.write_package('b.zip', [('x/result.json', '{"latency": 2}'),
+                                         ('other.json', '{"latency": 3}')]),
+            self.write_raw('c/result.json', '{"latency": 1}'),
+        ]
+
+    def test_identical_results_are_decoded_once(self):
+        self.make_conflict()
+        index = self.parse(dedupe.KEEP_FIRST)
+        self.assertEqual(3, len(self.decoded))
+        self.assertEqual(1, index.duplicate_count)
+
+    def test_keep_first(self):
+        self.make_conflict()
+        index = self.parse(dedupe.KEEP_FIRST)
+        self.assertDictEqual(
+            {'result.json': {'latency': 1},
+             'other.json': {'latency': 3}}, index.results())
+        conflict, = index.conflicts()
+        self.assertEqual('result.json', conflict.filename)
+        self.assertEqual(
+            [self.paths[0], self.paths[1] + '/x/result.json'],
+            [str(source) for source in conflict.sources])
+        self.assertEqual([self.paths[0]], [str(source)
+                                           for source in conflict.kept])
+
+    def test_keep_last_keeps_last_result_read(self):
+        self.make_conflict()
+        index = self.parse(dedupe.KEEP_LAST)
+        self.assertDictEqual(
+            {'result.json': {'latency': 1},
+             'other.json': {'latency': 3}}, index.results())
+        conflict, = index.conflicts()
+        self.assertEqual([self.paths[2]], [str(source)
+                                           for source in conflict.kept])
+
+    def test_keep_all_keys_conflicts_by_source(self):
+        self.make_conflict()
+        index = self.parse(dedupe.KEEP_ALL)
+        self.assertDictEqual(
+            {self.paths[0]: {'latency': 1},
+             self.paths[1] + '/x/result.json': {'latency': 2},
+             'other.json': {'latency': 3}}, index.results())
+
+    def test_no_conflicts(self):
+        self.paths = [self.write_raw('a/first.json', '{}'),
+                      self.write_raw('a/second.json', '{}')]
+        index = self.parse(dedupe.KEEP_ALL)
+        self.assertDictEqual(
+            {'first.json': {},
+             'second.json': {}}, index.results())
+        self.assertEqual([], index.conflicts())
+        self.assertEqual(0, index.duplicate_count)
+
+    def test_rejects_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            dedupe.ResultIndex('keep-some', self.decode)
+
+
+if __name__ == '__main__':
+    unittest.main()
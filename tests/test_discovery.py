@@ -0,0 +1,85 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+
+from testmaster import discovery
+
+
+class FindResultFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for relative_path in ['a/2016-05-24/host1/result-1.json',
+                              'a/2016-05-24/host1/client_wrapper.log',
+                              'a/2016-05-24/host2/package.zip',
+                              'a/2016-05-25/host1/result-2.json',
+                              'a/2016-05-25/logs/result-3.json', 'a/top.json',
+                              'b/result-4.json']:
+            path = os.path.join(self.temp_dir, relative_path)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as output_file:
+                output_file.write('{}')
+        self.root_a = os.path.join(self.temp_dir, 'a')
+        self.root_b = os.path.join(self.temp_dir, 'b')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def relative_paths(self, paths):
+        return [os.path.relpath(path, self.temp_dir) for path in paths]
+
+    def test_finds_candidates_recursively_in_each_root(self):
+        self.assertEqual(
+            ['b/result-4.json', 'a/2016-05-24/host1/result-1.json',
+             'a/2016-05-24/host2/package.zip',
+             'a/2016-05-25/host1/result-2.json',
+             'a/2016-05-25/logs/result-3.json', 'a/top.json'],
+            self.relative_paths(discovery.find_result_files([self.root_b,
+                                                             self.root_a])))
+
+    def test_include_and_exclude_patterns(self):
+        self.assertEqual(
+            ['a/2016-05-24/host1/client_wrapper.log',
+             'a/2016-05-24/host1/result-1.json',
+             'a/2016-05-25/host1/result-2.json'],
+            self.relative_paths(discovery.find_result_files(
+                [self.root_a],
+                include=['*.json', '*.log'],
+                exclude=['logs', 'top.json', '*/host2'])))
+
+    def test_does_not_follow_directory_symlinks(self):
+        os.symlink(self.root_a, os.path.join(self.root_a, 'loop'))
+        self.assertEqual(5, len(discovery.find_result_files([self.root_a])))
+
+    def test_listdir_fallback_matches_scandir(self):
+        expected = discovery.find_result_files([self.root_a, self.root_b])
+        scandir = discovery._scandir
+        discovery._scandir = None
+        try:
+            self.assertEqual(expected,
+                             discovery.find_result_files(
+                                 [self.root_a, self.root_b],
+                                 threads=1))
+        finally:
+            discovery._scandir = scandir
+
+
+if __name__ == '__main__':
+    unittest.main()
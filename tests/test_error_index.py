@@ -0,0 +1,142 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import io
+import unittest
+
+from testmaster import error_index
+from testmaster import field_decoder
+from testmaster import result_table
+
+TIMEOUT = 'Timed out waiting for page to load.'
+NO_BUTTON = 'Could not find start button.'
+CRASH = 'Browser crashed.'
+
+# (browser, os, errors) of each result.
+RESULTS = [('chrome', 'OSX', [TIMEOUT]), ('chrome', 'OSX', []),
+           ('firefox', 'OSX', [TIMEOUT, NO_BUTTON]),
+           ('firefox', 'Windows', [NO_BUTTON, TIMEOUT, TIMEOUT]),
+           ('chrome', 'Windows', [CRASH])]
+
+
+def make_records(results, first_index=0):
+    """Builds (filename, fields) records from (browser, os, errors) tuples."""
+    records = []
+    for index, (browser, os_name, errors) in enumerate(results, first_index):
+        fields = dict.fromkeys(field_decoder.FIELDS)
+        fields['browser'] = browser
+        fields['os'] = os_name
+        fields['errors'] = errors
+        records.append(('%d.json' % index, fields))
+    return records
+
+
+def make_table(results, first_index=0):
+    return result_table.ResultTable.from_fields(make_records(results,
+                                                             first_index))
+
+
+class ErrorIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = error_index.ErrorIndex(['browser', 'os'])
+        self.index.add_table(make_table(RESULTS))
+
+    def test_interns_messages_in_order_of_first_appearance(self):
+        self.assertEqual([TIMEOUT, NO_BUTTON, CRASH], self.index.messages)
+        self.assertEqual(5, len(self.index))
+        self.assertEqual(4, self.index.failed_count)
+
+    def test_results_with_returns_result_ids_in_order(self):
+        self.assertEqual([0, 2, 3], self.index.results_with(TIMEOUT).tolist())
+        self.assertEqual([2, 3], self.index.results_with(NO_BUTTON).tolist())
+        self.assertEqual([], self.index.results_with('Unknown').tolist())
+        self.assertEqual(
+            '4.json', self.index.filenames[self.index.results_with(CRASH)[0]])
+
+    def test_error_counts_count_each_result_once(self):
+        self.assertDictEqual(
+            {TIMEOUT: 3,
+             NO_BUTTON: 2,
+             CRASH: 1}, self.index.error_counts())
+
+    def test_error_rates_by_field_value(self):
+        rates = self.index.error_rates('browser')
+        self.assertEqual(
+            error_index.ErrorRate(3, 1, 1 / 3.0), rates[('chrome', TIMEOUT)])
+        self.assertEqual(
+            error_index.ErrorRate(2, 2, 1.0), rates[('firefox', TIMEOUT)])
+        self.assertNotIn(('firefox', CRASH), rates)
+        self.assertEqual(
+            error_index.ErrorRate(2, 1, 0.5),
+            self.index.error_rates('os')[('Windows', CRASH)])
+
+    def test_cooccurrences_count_pairs_of_errors(self):
+        self.assertDictEqual({(TIMEOUT, NO_BUTTON): 2},
+                             self.index.cooccurrences())
+
+    def test_incremental_tables_match_single_table(self):
+        index = error_index.ErrorIndex(['browser', 'os'])
+        index.add_table(make_table(RESULTS[:2]))
+        index.add_table(make_table([]))
+        index.add_table(make_table(RESULTS[2:], first_index=2))
+        self.assertEqual(self.index.filenames, index.filenames)
+        self.assertDictEqual(self.index.error_counts(), index.error_counts())
+        self.assertDictEqual(
+            self.index.error_rates('browser'), index.error_rates('browser'))
+        self.assertDictEqual(self.index.cooccurrences(), index.cooccurrences())
+        self.assertEqual([0, 2, 3], index.results_with(TIMEOUT).tolist())
+
+    def test_add_records_matches_add_table(self):
+        index = error_index.ErrorIndex(['browser', 'os'])
+        index.add_records(make_records(RESULTS))
+        self.assertDictEqual(self.index.error_counts(), index.error_counts())
+        self.assertEqual(self.index.failed_count, index.failed_count)
+
+    def test_rejects_unknown_rate_field(self):
+        with self.assertRaises(ValueError):
+            error_index.ErrorIndex(['latency'])
+
+    def test_write_counts_csv(self):
+        output = io.BytesIO()
+        error_index.write_counts_csv(self.index, output)
+        self.assertEqual(
+            ['error,results,rate', TIMEOUT + ',3,0.6000',
+             NO_BUTTON + ',2,0.4000', CRASH + ',1,0.2000'],
+            output.getvalue().splitlines())
+
+    def test_write_rates_csv(self):
+        index = error_index.ErrorIndex(['browser'])
+        index.add_table(make_table(RESULTS))
+        output = io.BytesIO()
+        error_index.write_rates_csv(index, output)
+        self.assertEqual(
+            ['field,value,error,results,error_results,rate',
+             'browser,chrome,%s,3,1,0.3333' % CRASH,
+             'browser,chrome,%s,3,1,0.3333' % TIMEOUT,
+             'browser,firefox,%s,2,2,1.0000' % NO_BUTTON,
+             'browser,firefox,%s,2,2,1.0000' % TIMEOUT],
+            output.getvalue().splitlines())
+
+    def test_write_cooccurrence_csv(self):
+        output = io.BytesIO()
+        error_index.write_cooccurrence_csv(self.index, output)
+        self.assertEqual(
+            ['error,other_error,results',
+             '%s,%s,2' % (TIMEOUT, NO_BUTTON)], output.getvalue().splitlines())
+
+
+if __name__ == '__main__':
+    unittest.main()
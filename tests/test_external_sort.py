@@ -0,0 +1,88 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from testmaster import external_sort
+from testmaster import pipeline_stats
+
+
+def in_memory_sort(keyed_lines):
+    return [line for _, line in sorted(dict(keyed_lines).items())]
+
+
+class SortLinesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        random_state = random.Random(0)
+        self.keyed_lines = []
+        for index in range(2000):
+            key = '%04d.json' % random_state.randint(0, 1500)
+            self.keyed_lines.append((key, '%s,%d\r\n' % (key, index)))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def sort_lines(self, memory_budget):
+        return list(external_sort.sort_lines(
+            iter(self.keyed_lines), memory_budget, self.temp_dir))
+
+    def test_sorts_in_memory_within_budget(self):
+        self.assertEqual(
+            in_memory_sort(self.keyed_lines), self.sort_lines(10 * 1024 * 1024))
+
+    def test_spilled_runs_match_in_memory_sort(self):
+        self.assertEqual(
+            in_memory_sort(self.keyed_lines), self.sort_lines(10000))
+
+    def test_merges_runs_in_levels(self):
+        original_fanout = external_sort._MERGE_FANOUT
+        external_sort._MERGE_FANOUT = 2
+        pipeline_stats.reset()
+        try:
+            # Spills a run for every line.
+            self.assertEqual(
+                in_memory_sort(self.keyed_lines), self.sort_lines(1))
+            records_written = pipeline_stats.snapshot()['counters'][
+                'sort_records_written']
+        finally:
+            external_sort._MERGE_FANOUT = original_fanout
+            pipeline_stats.reset()
+        # Each line is rewritten about once per level (log2 of 2000 levels),
+        # not once for every merge.
+        self.assertLess(records_written, len(self.keyed_lines) * 12)
+
+    def test_last_line_with_each_key_wins(self):
+        self.keyed_lines = [('b', 'b1'), ('a', 'a1'), ('b', 'b2'), ('a', 'a2'),
+                            ('b', 'b3')]
+        for memory_budget in (1, 1024):
+            self.assertEqual(['a2', 'b3'], self.sort_lines(memory_budget))
+
+    def test_empty_input(self):
+        self.keyed_lines = []
+        self.assertEqual([], self.sort_lines(1))
+
+    def test_removes_temporary_files(self):
+        self.sort_lines(1)
+        self.assertEqual([], os.listdir(self.temp_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import json
+import os
+import unittest
+
+from testmaster import field_decoder
+from testmaster.ndt_e2e_clientworker.client_wrapper import result_decoder
+
+
+def read_testdata(filename):
+    with open(os.path.join(
+            os.path.dirname(__file__), 'testdata', filename)) as testdata_file:
+        return testdata_file.read()
+
+
+def decode_slowly(raw_contents):
+    return field_decoder.result_to_fields(result_decoder.NdtResultDecoder(
+    ).decode(raw_contents))
+
+
+class FieldDecoderTest(unittest.TestCase):
+
+    def test_decodes_all_fields_like_the_result_decoder(self):
+        raw_contents = read_testdata('raw-result.json')
+        self.assertDictEqual(
+            decode_slowly(raw_contents),
+            field_decoder.decode_fields(raw_contents))
+
+    def test_decodes_only_requested_fields(self):
+        raw_contents = read_testdata('raw-result.json')
+        self.assertDictEqual(
+            {'latency': 564.0,
+             'start_time': 1464108922677309}, field_decoder.decode_fields(
+                 raw_contents, ['latency', 'start_time']))
+
+    def test_decodes_errors_and_missing_fields(self):
+        raw_contents = json.dumps({
+            'start_time': '2016-05-24T19:18:03.924000Z',
+            'c2s_start_time': None,
+            'errors': [{'message': 'dummy s2c error',
+                        'timestamp': '2016-05-24T19:18:48.173000Z'}],
+        })
+        fields = field_decoder.decode_fields(raw_contents)
+        self.assertDictEqual(decode_slowly(raw_contents), fields)
+        self.assertEqual(['dummy s2c error'], fields['errors'])
+        self.assertIsNone(fields['c2s_start_time'])
+        self.assertIsNone(fields['latency'])
+
+    def test_rejects_unknown_fields(self):
+        with self.assertRaises(ValueError):
+            field_decoder.decode_fields('{}', ['latency', 'not_a_field'])
+
+    def test_rejects_json_that_is_not_a_result(self):
+        for raw_contents in ['[1, 2]', '{"errors": [{"timestamp": null}]}']:
+            with self.assertRaises(ValueError):
+                field_decoder.decode_fields(raw_contents)
+            with self.assertRaises(ValueError):
+                field_decoder.decode_result(result_decoder.NdtResultDecoder(),
+                                            raw_contents)
+
+
+if __name__ == '__main__':
+    unittest.main()
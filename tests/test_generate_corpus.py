@@ -0,0 +1,89 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from benchmarks import generate_corpus
+
+# Fields that every raw result file contains.
+RESULT_FIELDS = ['browser', 'browser_version', 'c2s_end_time', 'c2s_start_time',
+                 'c2s_throughput', 'client', 'client_version', 'end_time',
+                 'errors', 'latency', 'os', 'os_version', 's2c_end_time',
+                 's2c_start_time', 's2c_throughput', 'start_time']
+
+
+class GenerateCorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.corpus_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.corpus_dir)
+
+    def test_writes_requested_number_of_files(self):
+        result_count = generate_corpus.generate_corpus(self.corpus_dir,
+                                                       raw_count=3,
+                                                       package_count=2,
+                                                       results_per_package=4,
+                                                       junk_count=1)
+        self.assertEqual(11, result_count)
+        self.assertItemsEqual(
+            ['raw-000000.json', 'raw-000001.json', 'raw-000002.json',
+             'package-000000.zip', 'package-000001.zip', 'garbage-000000.txt'],
+            os.listdir(self.corpus_dir))
+        with zipfile.ZipFile(os.path.join(self.corpus_dir,
+                                          'package-000001.zip')) as package:
+            member_names = package.namelist()
+        self.assertEqual(6, len(member_names))
+        self.assertEqual(
+            4, len([name for name in member_names if name.endswith('.json')]))
+        self.assertIn('garbage.txt', member_names)
+
+    def test_results_are_shaped_like_raw_results(self):
+        generate_corpus.generate_corpus(self.corpus_dir,
+                                        raw_count=1,
+                                        package_count=0)
+        with open(os.path.join(self.corpus_dir, 'raw-000000.json')) as raw:
+            result = json.load(raw)
+        self.assertItemsEqual(RESULT_FIELDS, result.keys())
+
+    def test_error_rate_of_one_fails_every_result(self):
+        generate_corpus.generate_corpus(self.corpus_dir,
+                                        raw_count=5,
+                                        package_count=0,
+                                        error_rate=1.0)
+        for index in range(5):
+            path = os.path.join(self.corpus_dir, 'raw-%06d.json' % index)
+            with open(path) as raw:
+                result = json.load(raw)
+            self.assertEqual(1, len(result['errors']))
+            self.assertIsNone(result['s2c_throughput'])
+
+    def test_corpus_is_reproducible(self):
+        other_dir = tempfile.mkdtemp()
+        try:
+            generate_corpus.generate_corpus(self.corpus_dir, 2, 0, seed=7)
+            generate_corpus.generate_corpus(other_dir, 2, 0, seed=7)
+            for filename in ['raw-000000.json', 'raw-000001.json']:
+                with open(os.path.join(self.corpus_dir, filename)) as first:
+                    with open(os.path.join(other_dir, filename)) as second:
+                        self.assertEqual(first.read(), second.read())
+        finally:
+            shutil.rmtree(other_dir)
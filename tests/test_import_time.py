@@ -0,0 +1,45 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import unittest
+
+from benchmarks import import_time
+
+
+class ImportTimeTest(unittest.TestCase):
+    """Catches startup regressions in the tools run on just a few files."""
+
+    def assertDefersHeavyImports(self, module):
+        self.assertEqual((),
+                         import_time.measure_import(module,
+                                                    repeat=1).heavy_modules)
+
+    def test_json_to_csv_defers_heavy_imports(self):
+        self.assertDefersHeavyImports('json_to_csv')
+
+    def test_summary_defers_heavy_imports(self):
+        self.assertDefersHeavyImports('summary')
+
+    def test_ingest_defers_heavy_imports(self):
+        self.assertDefersHeavyImports('ingest')
+
+    def test_reports_heavy_modules(self):
+        measured = import_time.measure_import('result_table', repeat=2)
+        self.assertEqual(('numpy',), measured.heavy_modules)
+        self.assertGreater(measured.seconds, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import absolute_import
+import argparse
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import zipfile
+
+from testmaster import ingest
+
+
+def testdata_path(filename):
+    return os.path.join(os.path.dirname(__file__), 'testdata', filename)
+
+
+class IngestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.watch_dir = os.path.join(self.temp_dir, 'results')
+        os.mkdir(self.watch_dir)
+        self.output_path = os.path.join(self.temp_dir, 'output.csv')
+        with open(testdata_path('raw-result.json')) as raw_result_file:
+            self.raw_result = json.load(raw_result_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_result(self, filename, latency):
+        self.raw_result['latency'] = latency
+        self.write_file(filename, json.dumps(self.raw_result))
+
+    def write_file(self, filename, contents):
+        """Writes a file to the watched directory, old enough to be settled."""
+        path = os.path.join(self.watch_dir, filename)
+        with open(path, 'w') as result_file:
+            result_file.write(contents)
+        modified_time = time.time() - 60
+        os.utime(path, (modified_time, modified_time))
+
+    def ingest(self, group_by=''):
+        ingest.main(argparse.Namespace(watch=self.watch_dir,
+                                       output=self.output_path,
+                                       summary=None,
+                                       rollup=None,
+                                       window='1h',
+                                       group_by=group_by,
+                                       quarantine=None,
+                                       state=None,
+                                       interval=0,
+                                       settle_time=0,
+                                       once=True))
+
+    def output_latencies(self):
+        with open(self.output_path, 'rb') as output_file:
+            return [row['Latency (ms)'] for row in csv.DictReader(output_file)]
+
+    def quarantined(self):
+        with open(self.output_path + '.quarantine', 'rb') as quarantine_file:
+            return [row[0] for row in csv.reader(quarantine_file)][1:]
+
+    def test_ingests_each_file_once(self):
+        self.write_result('a.json', 1.0)
+        self.ingest()
+        self.write_result('a.json', 2.0)
+        self.write_result('b.json', 3.0)
+        self.ingest()
+        self.assertEqual(['1.0', '3.0'], self.output_latencies())
+
+    def test_quarantines_unparseable_files(self):
+        self.write_result('a.json', 1.0)
+        self.write_file('b.json', '{"latency": ')
+        self.write_file('b2.json', '[1, 2]')
+        with open(testdata_path('result-package.zip'), 'rb') as package_file:
+            package = package_file.read()
+        self.write_file('c.zip', package[:len(package) // 2])
+        self.ingest()
+        self.assertEqual(['1.0'], self.output_latencies())
+        self.assertEqual(
+            [os.path.join(self.watch_dir, 'b.json'),
+             os.path.join(self.watch_dir, 'b2.json'),
+             os.path.join(self.watch_dir, 'c.zip')], self.quarantined())
+        # Quarantined files are not retried.
+        self.ingest()
+        self.assertEqual(3, len(self.quarantined()))
+
+    def test_quarantines_packages_with_a_bad_member(self):
+        self.write_result('a.json', 1.0)
+        package_path = os.path.join(self.temp_dir, 'mixed.zip')
+        with zipfile.ZipFile(package_path, 'w') as package:
+            self.raw_result['latency'] = 2.0
+            package.writestr('good.json', json.dumps(self.raw_result))
+            package.writestr('bad.json', '{"latency": ')
+        with open(package_path, 'rb') as package_file:
+            self.write_file('mixed.zip', package_file.read())
+        self.ingest()
+        # None of the package's results are kept, not even those before its bad
+        # member.
+        self.assertEqual(['1.0'], self.output_latencies())
+        self.assertEqual(
+            [os.path.join(self.watch_dir, 'mixed.zip')], self.quarantined())
+
+    def test_rejects_change_of_grouping(self):
+        self.ingest()
+        with self.assertRaises(ValueError):
+            self.ingest(group_by='browser')
+
+    def test_discards_rows_of_interrupted_batch(self):
+        self.write_result('a.json', 1.0)
+        self.ingest()
+        # Simulate a batch that was interrupted after appending its rows and
+        # logging its file as seen, but before its state was saved.
+        self.write_result('b.json', 2.0)
+        with open(self.output_path, 'ab') as output_file:
+            output_file.write('b.json,partial')
+        with open(self.output_path + '.state.seen', 'ab') as seen_file:
+            seen_file.write('b.json\n')
+        self.ingest()
+        self.assertEqual(['1.0', '2.0'], self.output_latencies())
+
+    def test_refuses_output_without_state(self):
+        with open(self.output_path, 'wb') as output_file:
+            output_file.write('existing rows\n')
+        with self.assertRaises(ValueError):
+            self.ingest()
+
+
+if __name__ == '__main__':
+    unittest.main()
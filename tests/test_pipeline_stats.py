@@ -0,0 +1,134 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import io
+import unittest
+
+from testmaster import pipeline_stats
+
+
+class PipelineStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        pipeline_stats.reset()
+        self.clock_time = 0.0
+        self.original_clock = pipeline_stats._clock
+        pipeline_stats._clock = lambda: self.clock_time
+
+    def tearDown(self):
+        pipeline_stats._clock = self.original_clock
+        pipeline_stats.reset()
+
+    def test_count_accumulates_increments(self):
+        pipeline_stats.count('files_seen')
+        pipeline_stats.count('files_seen')
+        pipeline_stats.count('bytes_read', 100)
+        self.assertDictEqual(
+            {'files_seen': 2,
+             'bytes_read': 100}, pipeline_stats.snapshot()['counters'])
+
+    def test_record_adds_counters_and_stage_times(self):
+        pipeline_stats.count('files_seen')
+        pipeline_stats.record(
+            {'files_seen': 2,
+             'bytes_read': 100}, {'read': 1.5})
+        pipeline_stats.record({}, {'read': 0.5, 'decode': 1.0})
+        stats = pipeline_stats.snapshot()
+        self.assertDictEqual(
+            {'files_seen': 3,
+             'bytes_read': 100}, stats['counters'])
+        self.assertDictEqual({'read': 2.0,
+                              'decode': 1.0}, stats['stage_seconds'])
+
+    def test_exclusive_timer_excludes_recorded_stages(self):
+        with pipeline_stats.exclusive_timer('write_csv'):
+            self.clock_time += 3.0
+            pipeline_stats.record({}, {'read': 2.0})
+        self.assertDictEqual(
+            {'read': 2.0,
+             'write_csv': 1.0}, pipeline_stats.snapshot()['stage_seconds'])
+
+    def test_timer_adds_elapsed_time_even_on_error(self):
+        with pipeline_stats.timer('decode'):
+            self.clock_time += 1.5
+        with self.assertRaises(ValueError):
+            with pipeline_stats.timer('decode'):
+                self.clock_time += 0.5
+                raise ValueError('bad result')
+        self.assertDictEqual({'decode': 2.0},
+                             pipeline_stats.snapshot()['stage_seconds'])
+
+    def test_exclusive_timer_excludes_inner_stages(self):
+
+        def decoded_items():
+            for item in ['a', 'b']:
+                with pipeline_stats.timer('decode'):
+                    self.clock_time += 1.0
+                yield item
+
+        with pipeline_stats.exclusive_timer('write_csv'):
+            for _ in decoded_items():
+                self.clock_time += 0.5
+        self.assertDictEqual(
+            {'decode': 2.0,
+             'write_csv': 1.0}, pipeline_stats.snapshot()['stage_seconds'])
+
+    def test_timed_counts_only_time_spent_producing_items(self):
+
+        def slow_items():
+            for item in ['a', 'b']:
+                self.clock_time += 1.0
+                yield item
+
+        items = []
+        for item in pipeline_stats.timed(slow_items(), 'read'):
+            # Time spent by the consumer is not counted.
+            self.clock_time += 10.0
+            items.append(item)
+        self.assertEqual(['a', 'b'], items)
+        self.assertDictEqual({'read': 2.0},
+                             pipeline_stats.snapshot()['stage_seconds'])
+
+    def test_snapshot_is_unaffected_by_later_updates(self):
+        pipeline_stats.count('rows_written')
+        stats = pipeline_stats.snapshot()
+        pipeline_stats.count('rows_written')
+        self.assertEqual(1, stats['counters']['rows_written'])
+
+    def test_reset_clears_statistics(self):
+        pipeline_stats.count('rows_written')
+        pipeline_stats.add_time('write_csv', 1.0)
+        pipeline_stats.reset()
+        self.assertDictEqual(
+            {'counters': {},
+             'stage_seconds': {}}, pipeline_stats.snapshot())
+
+    def test_write_report_lists_stages_by_time_then_counters(self):
+        stats = {'counters': {'rows_written': 3,
+                              'files_seen': 2},
+                 'stage_seconds': {'read': 1.0,
+                                   'decode': 2.0}}
+        output = io.BytesIO()
+        pipeline_stats.write_report(stats, 4.0, output)
+        lines = [line.split() for line in output.getvalue().splitlines()]
+        self.assertEqual(
+            [['stage', 'seconds', '%'], ['decode', '2.000', '50.0'],
+             ['read', '1.000', '25.0'], ['other', '1.000', '25.0'],
+             ['total', '4.000'], [], ['counter', 'value'], ['files_seen', '2'],
+             ['rows_written', '3']], lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
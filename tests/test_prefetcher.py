@@ -0,0 +1,83 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import threading
+import time
+import unittest
+
+from testmaster import prefetcher
+
+
+class ConcurrencyTracker(object):
+    """Counts how many calls to a slow function are running at once."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.max_running = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, item):
+        with self._lock:
+            self._running += 1
+            self.max_running = max(self.max_running, self._running)
+        time.sleep(self.latency)
+        with self._lock:
+            self._running -= 1
+        return item * 2
+
+
+class PrefetcherTest(unittest.TestCase):
+
+    def test_yields_results_in_input_order(self):
+        self.assertEqual([2 * item for item in range(20)], list(prefetcher.imap(
+            ConcurrencyTracker(0.001), range(20), 4)))
+
+    def test_keeps_at_most_depth_calls_in_flight(self):
+        tracker = ConcurrencyTracker(0.01)
+        list(prefetcher.imap(tracker, range(20), 3))
+        self.assertEqual(3, tracker.max_running)
+
+    def test_does_not_read_more_than_depth_items_ahead(self):
+        consumed = []
+
+        def items():
+            for item in range(10):
+                consumed.append(item)
+                yield item
+
+        results = prefetcher.imap(lambda item: item, items(), 2)
+        self.assertEqual(0, next(results))
+        self.assertEqual([0, 1, 2], consumed)
+        results.close()
+
+    def test_raises_errors_in_input_order(self):
+
+        def fail_on_three(item):
+            if item == 3:
+                raise ValueError('bad item')
+            return item
+
+        results = prefetcher.imap(fail_on_three, range(10), 4)
+        self.assertEqual([0, 1, 2], [next(results) for _ in range(3)])
+        with self.assertRaises(ValueError):
+            next(results)
+
+    def test_empty_input(self):
+        self.assertEqual([], list(prefetcher.imap(abs, [], 4)))
+
+
+if __name__ == '__main__':
+    unittest.main()
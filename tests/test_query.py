@@ -0,0 +1,140 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import unittest
+
+import numpy
+
+from testmaster import field_decoder
+from testmaster import query
+from testmaster import result_table
+
+# 2016-05-24T16:00:00Z in microseconds since the epoch.
+_BASE_TIME_US = 1464105600000000
+
+
+def make_table(rows):
+    """Builds a ResultTable from (browser, os, s2c_throughput) tuples.
+
+    The start time of each result is one second after the previous one.
+    """
+    records = []
+    for index, (browser, os, s2c_throughput) in enumerate(rows):
+        fields = dict.fromkeys(field_decoder.FIELDS)
+        fields['browser'] = browser
+        fields['os'] = os
+        fields['s2c_throughput'] = s2c_throughput
+        fields['start_time'] = _BASE_TIME_US + index * 1000000
+        fields['errors'] = []
+        records.append(('%d.json' % index, fields))
+    return result_table.ResultTable.from_fields(records)
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_parses_conditions(self):
+        self.assertEqual(
+            query.Combination('and', [
+                query.Condition('browser', '=', 'chrome'),
+                query.Condition('os', '!=', 'Windows 10'),
+                query.Condition('s2c_throughput', '<', 5.0)
+            ]), query.parse(
+                'browser=chrome and os != "Windows 10" AND s2c_throughput<5'))
+
+    def test_and_binds_tighter_than_or(self):
+        self.assertEqual(
+            query.Combination('or', [
+                query.Condition('browser', '=', 'chrome'), query.Combination(
+                    'and', [
+                        query.Negation(query.Condition('os', '=', 'OSX')),
+                        query.Condition('latency', '>=', 10.0)
+                    ])
+            ]), query.parse('browser=chrome or not os=OSX and latency>=10'))
+
+    def test_parses_timestamps(self):
+        self.assertEqual(
+            query.Condition('start_time', '>', _BASE_TIME_US),
+            query.parse('start_time>2016-05-24T16:00:00Z'))
+
+    def test_rejects_malformed_queries(self):
+        for text in ('', 'browser', 'browser=', 'browser<chrome', 'color=red',
+                     'latency=fast', 'start_time>yesterday', 'browser=a b',
+                     '(browser=chrome', 'browser=chrome)', 'browser=chrome or'):
+            with self.assertRaises(ValueError):
+                query.parse(text)
+
+
+class TableIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = query.TableIndex(make_table([
+            ('chrome', 'Windows', 3.0), ('firefox', 'Windows', 8.0), (
+                'chrome', 'OSX', 1.0), ('chrome', 'Windows', None), (
+                    None, 'Windows', 5.0), ('chrome', 'Windows', 4.0)
+        ]))
+
+    def assertSelects(self, expected_rows, text):
+        rows = self.index.select(text)
+        self.assertEqual(numpy.int64, rows.dtype)
+        self.assertEqual(expected_rows, rows.tolist())
+
+    def test_selects_categorical_values(self):
+        self.assertSelects([0, 2, 3, 5], 'browser=chrome')
+        self.assertSelects([1], 'browser!=chrome')
+        self.assertSelects([], 'browser=safari')
+
+    def test_selects_numeric_ranges(self):
+        self.assertSelects([0, 2, 5], 's2c_throughput<5')
+        self.assertSelects([0, 2, 4, 5], 's2c_throughput<=5')
+        self.assertSelects([1], 's2c_throughput>5')
+        self.assertSelects([1, 4], 's2c_throughput>=5')
+        self.assertSelects([4], 's2c_throughput=5')
+        self.assertSelects([0, 1, 2, 5], 's2c_throughput!=5')
+
+    def test_selects_timestamp_ranges(self):
+        self.assertSelects([4, 5], 'start_time>=2016-05-24T16:00:04Z')
+
+    def test_missing_values_never_match(self):
+        self.assertSelects([], 'latency>0')
+        self.assertSelects([0, 1, 2, 3, 4, 5], 'not latency>0')
+
+    def test_combines_conditions(self):
+        self.assertSelects([0, 5],
+                           'browser=chrome and os=Windows and s2c_throughput<5')
+        self.assertSelects([1, 2], 'os=OSX or s2c_throughput>5')
+        self.assertSelects([1, 3, 4],
+                           'not (browser=chrome and s2c_throughput>0)')
+
+    def test_matches_full_scan(self):
+        random_state = numpy.random.RandomState(0)
+        rows = [(random_state.choice(['chrome', 'firefox', 'edge']),
+                 random_state.choice(['Windows', 'OSX']),
+                 float(random_state.randint(0, 20))) for _ in range(500)]
+        self.index = query.TableIndex(make_table(rows))
+        expected = [
+            row for row, (browser, os, s2c_throughput) in enumerate(rows)
+            if (browser == 'chrome' or os == 'OSX') and 4 < s2c_throughput <= 12
+        ]
+        self.assertSelects(expected,
+                           '(browser=chrome or os=OSX) and s2c_throughput>4 '
+                           'and s2c_throughput<=12')
+
+    def test_select_builds_an_index(self):
+        table = make_table([('chrome', 'OSX', 1.0), ('edge', 'Windows', 2.0)])
+        self.assertEqual([1], query.select(table, 'os=Windows').tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,10 +15,17 @@
 from __future__ import absolute_import
 import datetime
 import os
+import shutil
+import tempfile
+import time
 import unittest
+import zipfile
 
 import pytz
 
+from testmaster import csv_convert
+from testmaster import field_decoder
+from testmaster import pipeline_stats
 from testmaster import read_results
 from testmaster.ndt_e2e_clientworker.client_wrapper import results
 
@@ -92,12 +99,167 @@ class ReadResultsTest(unittest.TestCase):
 
     def test_reads_mix_of_input_types_correctly(self):
         """Parser should process a mix of files and ignore non-result files."""
-        actual_results = read_results.parse_files(
-            [add_testdata_prefix(RAW_RESULT_FILENAME),
-             add_testdata_prefix(RESULT_PACKAGE_FILENAME),
-             add_testdata_prefix(GARBAGE_FILENAME)]) # yapf: disable
+        result_paths = [add_testdata_prefix(RAW_RESULT_FILENAME),
+                        add_testdata_prefix(RESULT_PACKAGE_FILENAME),
+                        add_testdata_prefix(GARBAGE_FILENAME)]
+        actual_results = read_results.parse_files(result_paths)
         expected_results = {
             RAW_RESULT_FILENAME: RAW_RESULT,
             PACKAGED_RESULT_FILENAME: PACKAGED_RESULT,
         }
         self.assertDictEqual(expected_results, actual_results)
+
+    def test_iter_results_yields_results_in_input_order(self):
+        """iter_results should yield results lazily, in order of the input."""
+        result_paths = [add_testdata_prefix(RESULT_PACKAGE_FILENAME),
+                        add_testdata_prefix(GARBAGE_FILENAME),
+                        add_testdata_prefix(RAW_RESULT_FILENAME)]
+        results_iterator = read_results.iter_results(result_paths)
+        self.assertEqual(
+            (PACKAGED_RESULT_FILENAME, PACKAGED_RESULT), next(results_iterator))
+        self.assertEqual(
+            (RAW_RESULT_FILENAME, RAW_RESULT), next(results_iterator))
+        self.assertRaises(StopIteration, next, results_iterator)
+
+    def test_parallel_parse_matches_serial_parse(self):
+        result_paths = [add_testdata_prefix(RAW_RESULT_FILENAME),
+                        add_testdata_prefix(RESULT_PACKAGE_FILENAME),
+                        add_testdata_prefix(GARBAGE_FILENAME),
+                        add_testdata_prefix(RAW_RESULT_FILENAME)]
+        self.assertEqual(
+            list(read_results.iter_results(result_paths)),
+            list(read_results.iter_results(result_paths, workers=2)))
+        self.assertDictEqual(
+            read_results.parse_files(result_paths),
+            read_results.parse_files(result_paths, workers=2))
+
+    def test_iter_fields_matches_iter_results(self):
+        result_paths = [add_testdata_prefix(RESULT_PACKAGE_FILENAME),
+                        add_testdata_prefix(GARBAGE_FILENAME),
+                        add_testdata_prefix(RAW_RESULT_FILENAME)]
+        expected = [
+            (filename, field_decoder.result_to_fields(result))
+            for filename, result in read_results.iter_results(result_paths)
+        ]
+        self.assertEqual(
+            expected,
+            list(read_results.iter_fields(result_paths, field_decoder.FIELDS)))
+        self.assertEqual(expected,
+                         list(read_results.iter_fields(result_paths,
+                                                       field_decoder.FIELDS,
+                                                       workers=2)))
+        self.assertDictEqual(
+            {RAW_RESULT_FILENAME: {'latency': 564.0},
+             PACKAGED_RESULT_FILENAME: {'latency': 79.2}},
+            read_results.parse_fields(result_paths, ['latency']))
+
+    def test_iter_raw_results_reports_full_source(self):
+        package_path = add_testdata_prefix(RESULT_PACKAGE_FILENAME)
+        raw_path = add_testdata_prefix(RAW_RESULT_FILENAME)
+        sources = [source
+                   for source, _ in read_results.iter_raw_results([package_path,
+                                                                   raw_path])]
+        self.assertEqual(
+            [read_results.ResultSource(package_path, PACKAGED_RESULT_FILENAME),
+             read_results.ResultSource(raw_path, None)], sources)
+        self.assertEqual(
+            [PACKAGED_RESULT_FILENAME, RAW_RESULT_FILENAME],
+            [source.filename for source in sources])
+        self.assertEqual(package_path + '/' + PACKAGED_RESULT_FILENAME,
+                         str(sources[0]))
+        self.assertEqual(raw_path, str(sources[1]))
+
+    def test_truncated_package_is_an_error(self):
+        """A file that starts like a zip but is truncated is not skipped."""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        truncated_path = os.path.join(temp_dir, 'truncated.zip')
+        with open(
+                add_testdata_prefix(RESULT_PACKAGE_FILENAME),
+                'rb') as package_file:
+            package = package_file.read()
+        with open(truncated_path, 'wb') as truncated_file:
+            truncated_file.write(package[:len(package) // 2])
+        with self.assertRaises(zipfile.BadZipfile):
+            list(read_results.iter_raw_results([truncated_path]))
+
+    def test_parse_fields_records_pipeline_stats(self):
+        pipeline_stats.reset()
+        result_paths = [add_testdata_prefix(RAW_RESULT_FILENAME),
+                        add_testdata_prefix(RESULT_PACKAGE_FILENAME),
+                        add_testdata_prefix(GARBAGE_FILENAME)]
+        read_results.parse_fields(result_paths, ['latency'])
+        stats = pipeline_stats.snapshot()
+        self.assertEqual(3, stats['counters']['files_seen'])
+        self.assertEqual(1, stats['counters']['packages_read'])
+        self.assertEqual(1, stats['counters']['files_skipped'])
+        self.assertEqual(2, stats['counters']['results_read'])
+        # The client_wrapper log and garbage file in the package are skipped.
+        self.assertEqual(2, stats['counters']['package_members_skipped'])
+        with zipfile.ZipFile(result_paths[1]) as package:
+            packaged_size = package.getinfo(PACKAGED_RESULT_FILENAME).file_size
+        self.assertEqual(
+            os.path.getsize(result_paths[0]) + packaged_size,
+            stats['counters']['bytes_read'])
+        self.assertIn('read', stats['stage_seconds'])
+        self.assertIn('decode', stats['stage_seconds'])
+
+    def test_prefetch_matches_serial_read(self):
+        result_paths = [add_testdata_prefix(RAW_RESULT_FILENAME),
+                        add_testdata_prefix(RESULT_PACKAGE_FILENAME),
+                        add_testdata_prefix(GARBAGE_FILENAME)] * 3
+        self.assertEqual(
+            list(read_results.iter_raw_results(result_paths)),
+            list(read_results.iter_raw_results(result_paths,
+                                               prefetch=4)))
+        self.assertEqual(
+            list(read_results.iter_fields(result_paths, ['latency'])),
+            list(read_results.iter_fields(result_paths, ['latency'],
+                                          prefetch=4)))
+
+    def test_compact_results_produce_same_csv(self):
+        result_paths = [add_testdata_prefix(RAW_RESULT_FILENAME),
+                        add_testdata_prefix(RESULT_PACKAGE_FILENAME),
+                        add_testdata_prefix(GARBAGE_FILENAME)]
+        compact_results = read_results.parse_compact_files(result_paths)
+        self.assertItemsEqual(
+            [RAW_RESULT_FILENAME, PACKAGED_RESULT_FILENAME],
+            compact_results.keys())
+        self.assertEqual(
+            csv_convert.ndt_results_to_csv(read_results.parse_files(
+                result_paths)), csv_convert.ndt_results_to_csv(compact_results))
+
+
+class SlowFileSystemTest(unittest.TestCase):
+    """Simulates a network file system on which each open takes a while."""
+
+    LATENCY = 0.05
+
+    def setUp(self):
+        self.original_read_path = read_results._read_path
+
+        def slow_read_path(filename, counters):
+            time.sleep(self.LATENCY)
+            return self.original_read_path(filename, counters)
+
+        read_results._read_path = slow_read_path
+
+    def tearDown(self):
+        read_results._read_path = self.original_read_path
+
+    def time_read(self, result_paths, prefetch):
+        start_time = time.time()
+        raw_results = list(read_results.iter_raw_results(result_paths,
+                                                         prefetch))
+        return time.time() - start_time, raw_results
+
+    def test_prefetch_overlaps_latency_of_each_path(self):
+        result_paths = [add_testdata_prefix(RAW_RESULT_FILENAME),
+                        add_testdata_prefix(RESULT_PACKAGE_FILENAME)] * 8
+        serial_time, serial_results = self.time_read(result_paths, 0)
+        prefetch_time, prefetch_results = self.time_read(result_paths, 8)
+        self.assertEqual(serial_results, prefetch_results)
+        # Serially, each path's latency adds up. With 8 paths in flight, the
+        # latency of 16 paths costs about as much as that of 2.
+        self.assertGreaterEqual(serial_time, 16 * self.LATENCY)
+        self.assertLess(prefetch_time, serial_time / 3)
@@ -0,0 +1,100 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytz
+
+from testmaster import result_cache
+from testmaster.ndt_e2e_clientworker.client_wrapper import results
+
+RESULT = results.NdtResult(
+    browser='chrome',
+    browser_version='50.0.2661.86',
+    end_time=datetime.datetime(2016, 5, 24, 16, 55, 58, 756734, pytz.utc),
+    client='ndt_js',
+    client_version=None,
+    os='OSX',
+    os_version='10.11.3',
+    start_time=datetime.datetime(2016, 5, 24, 16, 55, 22, 677309, pytz.utc),
+    c2s_result=results.NdtSingleTestResult(
+        start_time=datetime.datetime(2016, 5, 24, 16, 55, 34, 74628, pytz.utc),
+        end_time=datetime.datetime(2016, 5, 24, 16, 55, 46, 944071, pytz.utc),
+        throughput=0.938),
+    s2c_result=results.NdtSingleTestResult(start_time=datetime.datetime(
+        2016, 5, 24, 16, 55, 46, 944247, pytz.utc)),
+    latency=564.0,
+    errors=[results.TestError(
+        'dummy s2c error',
+        datetime.datetime(2016, 5, 24, 16, 55, 58, 0, pytz.utc))])
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.result_path = os.path.join(self.temp_dir, 'result.json')
+        with open(self.result_path, 'w') as result_file:
+            result_file.write('{}')
+        self.cache = result_cache.ResultCache(os.path.join(self.temp_dir,
+                                                           'cache.db'))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_get_returns_results_that_were_put(self):
+        self.cache.put(self.result_path, [('result.json', RESULT)])
+        self.assertTrue(self.cache.contains(self.result_path))
+        self.assertEqual([('result.json', RESULT)],
+                         self.cache.get(self.result_path))
+
+    def test_get_returns_None_for_uncached_path(self):
+        self.assertFalse(self.cache.contains(self.result_path))
+        self.assertIsNone(self.cache.get(self.result_path))
+
+    def test_get_returns_None_after_file_changes(self):
+        self.cache.put(self.result_path, [('result.json', RESULT)])
+        with open(self.result_path, 'w') as result_file:
+            result_file.write('{"latency": 5.0}')
+        self.assertIsNone(self.cache.get(self.result_path))
+
+    def test_path_with_no_results_is_cached(self):
+        self.cache.put(self.result_path, [])
+        self.assertEqual([], self.cache.get(self.result_path))
+
+    def test_invalidate_removes_cached_results(self):
+        self.cache.put(self.result_path, [('result.json', RESULT)])
+        self.cache.invalidate(self.result_path)
+        self.assertIsNone(self.cache.get(self.result_path))
+
+    def test_evict_removes_entries_for_deleted_files(self):
+        self.cache.put(self.result_path, [('result.json', RESULT)])
+        os.remove(self.result_path)
+        self.assertEqual(1, self.cache.evict())
+
+    def test_evict_keeps_most_recently_used_entries(self):
+        other_path = os.path.join(self.temp_dir, 'other.json')
+        shutil.copy(self.result_path, other_path)
+        self.cache.put(self.result_path, [('result.json', RESULT)])
+        self.cache.put(other_path, [])
+        self.cache.get(self.result_path)
+        self.assertEqual(1, self.cache.evict(max_entries=1))
+        self.assertTrue(self.cache.contains(self.result_path))
+        self.assertFalse(self.cache.contains(other_path))
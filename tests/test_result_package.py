@@ -0,0 +1,115 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from testmaster import result_package
+
+
+def _is_json(name):
+    return name.endswith('.json')
+
+
+class ResultPackageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        result_package.clear_index_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_package(self, members, compression):
+        path = os.path.join(self.temp_dir, 'package.zip')
+        with zipfile.ZipFile(path, 'w', compression) as package:
+            for name, contents in members:
+                package.writestr(name, contents)
+        return path
+
+    def test_looks_like_package(self):
+        package_path = self.write_package(
+            [('a.json', '{}')], zipfile.ZIP_DEFLATED)
+        text_path = os.path.join(self.temp_dir, 'a.json')
+        with open(text_path, 'w') as text_file:
+            text_file.write('{}')
+        self.assertTrue(result_package.looks_like_package(package_path))
+        self.assertTrue(result_package.looks_like_package(
+            'tests/testdata/result-package.zip'))
+        self.assertFalse(result_package.looks_like_package(text_path))
+        self.assertFalse(result_package.looks_like_package(os.path.join(
+            self.temp_dir, 'missing.zip')))
+
+    def test_iter_members_reads_only_matching_members(self):
+        self.assertEqual(['packaged-result.json'], result_package.member_names(
+            'tests/testdata/result-package.zip', _is_json))
+        members = list(result_package.iter_members(
+            'tests/testdata/result-package.zip', _is_json))
+        with zipfile.ZipFile('tests/testdata/result-package.zip') as package:
+            expected = package.read('packaged-result.json')
+        self.assertEqual([('packaged-result.json', expected)], members)
+
+    def test_iter_members_matches_zipfile_for_each_compression(self):
+        members = [('dir/first.json', '{"a": 1}' * 1000), ('log.txt', 'x' * 10),
+                   ('second.json', ''), ('third.json', '{"b": 2}')]
+        expected = [member for member in members if _is_json(member[0])]
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            result_package.clear_index_cache()
+            package_path = self.write_package(members, compression)
+            self.assertEqual(
+                expected,
+                list(result_package.iter_members(package_path, _is_json)))
+
+    def test_index_is_refreshed_when_package_changes(self):
+        package_path = self.write_package(
+            [('a.json', '{}')], zipfile.ZIP_STORED)
+        self.assertEqual(['a.json'],
+                         result_package.member_names(package_path, _is_json))
+        os.remove(package_path)
+        package_path = self.write_package(
+            [('a.json', '{}'), ('b.json', '[]')], zipfile.ZIP_STORED)
+        self.assertEqual(['a.json', 'b.json'],
+                         result_package.member_names(package_path, _is_json))
+
+    def test_iter_members_raises_on_corrupt_member(self):
+        package_path = self.write_package(
+            [('a.json', '{"corrupt": false}')], zipfile.ZIP_STORED)
+        with open(package_path, 'r+b') as package_file:
+            contents = package_file.read()
+            package_file.seek(contents.index('false'))
+            package_file.write('FALSE')
+        with self.assertRaises(zipfile.BadZipfile):
+            list(result_package.iter_members(package_path, _is_json))
+
+    def test_iter_member_lines_matches_zipfile(self):
+        lines = ''.join('line %d\n' % index for index in range(20000))
+        members = [('client.log', lines + 'no newline'), ('a.json', '{}')]
+        for compression in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            result_package.clear_index_cache()
+            package_path = self.write_package(members, compression)
+            self.assertEqual(
+                (lines + 'no newline').splitlines(True),
+                list(result_package.iter_member_lines(package_path,
+                                                      'client.log')))
+            with self.assertRaises(KeyError):
+                list(result_package.iter_member_lines(package_path,
+                                                      'missing.log'))
+
+
+if __name__ == '__main__':
+    unittest.main()
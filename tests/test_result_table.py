@@ -0,0 +1,105 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import datetime
+import math
+import unittest
+
+import pytz
+
+from testmaster import result_table
+from testmaster.ndt_e2e_clientworker.client_wrapper import results
+
+# An NDT result in which no errors occur and both s2c and c2s complete
+# successfully.
+NO_ERRORS_RESULT = results.NdtResult(
+    browser='chrome',
+    os='OSX',
+    client='ndt_js',
+    end_time=datetime.datetime(2016, 5, 24, 16, 55, 58, 756734, pytz.utc),
+    start_time=datetime.datetime(2016, 5, 24, 16, 55, 22, 677309, pytz.utc),
+    c2s_result=results.NdtSingleTestResult(
+        start_time=datetime.datetime(2016, 5, 24, 16, 55, 34, 74628, pytz.utc),
+        end_time=datetime.datetime(2016, 5, 24, 16, 55, 46, 944071, pytz.utc),
+        throughput=0.938),
+    s2c_result=results.NdtSingleTestResult(
+        start_time=datetime.datetime(2016, 5, 24, 16, 55, 46, 944247, pytz.utc),
+        end_time=datetime.datetime(2016, 5, 24, 16, 55, 58, 324334, pytz.utc),
+        throughput=1.01),
+    latency=15.0)
+# An NDT result in which s2c and c2s tests fail to complete and generate errors.
+MISSING_FIELDS_RESULT = results.NdtResult(
+    browser='firefox',
+    os='OSX',
+    client='ndt_js',
+    end_time=datetime.datetime(2016, 5, 24, 19, 18, 48, 173000, pytz.utc),
+    start_time=datetime.datetime(2016, 5, 24, 19, 18, 3, 924000, pytz.utc),
+    c2s_result=results.NdtSingleTestResult(start_time=datetime.datetime(
+        2016, 5, 24, 19, 18, 35, 219000, pytz.utc)),
+    s2c_result=results.NdtSingleTestResult(start_time=datetime.datetime(
+        2016, 5, 24, 19, 18, 15, 991000, pytz.utc)),
+    errors=[results.TestError('dummy s2c error'),
+            results.TestError('dummy c2s error')])
+
+
+class ResultTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = result_table.ResultTable.from_results([(
+            'no-errors.json', NO_ERRORS_RESULT), ('missing-fields.json',
+                                                  MISSING_FIELDS_RESULT)])
+
+    def test_table_has_one_row_per_result(self):
+        self.assertEqual(2, len(self.table))
+        self.assertEqual(
+            ['no-errors.json', 'missing-fields.json'], self.table.filenames)
+
+    def test_missing_values_are_NaN(self):
+        c2s_throughput = self.table.columns['c2s_throughput']
+        self.assertAlmostEqual(0.938, c2s_throughput[0])
+        self.assertTrue(math.isnan(c2s_throughput[1]))
+
+    def test_durations_match_result_metrics(self):
+        self.assertAlmostEqual(36.079425, self.table.total_duration()[0])
+        self.assertAlmostEqual(44.249, self.table.total_duration()[1])
+        self.assertAlmostEqual(12.869443, self.table.c2s_duration()[0])
+        self.assertTrue(math.isnan(self.table.c2s_duration()[1]))
+        self.assertAlmostEqual(11.380087, self.table.s2c_duration()[0])
+        self.assertTrue(math.isnan(self.table.s2c_duration()[1]))
+
+    def test_categorical_columns_share_codes(self):
+        browsers = self.table.categoricals['browser']
+        self.assertEqual(['chrome', 'firefox'], browsers.categories)
+        self.assertEqual('firefox', browsers[1])
+        os_codes = self.table.categoricals['os'].codes
+        self.assertEqual(os_codes[0], os_codes[1])
+
+    def test_errors_are_preserved(self):
+        self.assertEqual([0, 2], list(self.table.error_count()))
+        self.assertEqual([], self.table.errors(0))
+        self.assertEqual(['dummy s2c error', 'dummy c2s error'],
+                         self.table.errors(1))
+
+    def test_take_selects_rows(self):
+        table = self.table.take([1, 0, 1])
+        self.assertEqual(
+            ['missing-fields.json', 'no-errors.json',
+             'missing-fields.json'], table.filenames)
+        self.assertEqual('firefox', table.categoricals['browser'][0])
+        self.assertAlmostEqual(0.938, table.columns['c2s_throughput'][1])
+        self.assertEqual([2, 0, 2], list(table.error_count()))
+        self.assertEqual(['dummy s2c error', 'dummy c2s error'],
+                         table.errors(2))
+        self.assertEqual(0, len(self.table.take([])))
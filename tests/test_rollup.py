@@ -0,0 +1,103 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import pickle
+import unittest
+
+from testmaster import result_table
+from testmaster import rollup
+from testmaster import timestamps
+
+# 2016-05-24T16:00:00Z in microseconds since the epoch.
+HOUR_START = timestamps.iso8601_to_us('2016-05-24T16:00:00Z')
+MINUTE = 60 * 1000000
+
+
+def make_table(rows):
+    """Builds a ResultTable from (minutes past HOUR_START, browser, latency)."""
+    builder = result_table.ResultTableBuilder()
+    for index, (minutes, browser, latency) in enumerate(rows):
+        fields = dict.fromkeys(result_table.FLOAT_COLUMNS + result_table.
+                               TIME_COLUMNS + result_table.CATEGORICAL_COLUMNS)
+        if minutes is not None:
+            fields['start_time'] = HOUR_START + minutes * MINUTE
+            fields['end_time'] = fields['start_time'] + 30 * 1000000
+        fields['browser'] = browser
+        fields['latency'] = latency
+        fields['errors'] = []
+        builder.append_fields('%d.json' % index, fields)
+    return builder.build()
+
+
+ROWS = [(0, 'chrome', 10.0), (59, 'firefox', 20.0), (30, 'chrome', 30.0),
+        (60, 'chrome', 40.0), (None, 'chrome', 50.0), (61, 'chrome', None)]
+
+
+class RollupTest(unittest.TestCase):
+
+    def test_buckets_results_by_window_and_group(self):
+        result_rollup = rollup.Rollup('1h', ['browser'])
+        result_rollup.add_table(make_table(ROWS))
+        summaries = result_rollup.summaries()
+        self.assertItemsEqual(
+            [('2016-05-24T16:00:00Z', 'chrome'),
+             ('2016-05-24T16:00:00Z', 'firefox'),
+             ('2016-05-24T17:00:00Z', 'chrome')], summaries.keys())
+        latency = summaries[('2016-05-24T16:00:00Z', 'chrome')]['latency']
+        self.assertEqual(2, latency.sample_count)
+        self.assertAlmostEqual(20.0, latency.mean)
+        self.assertAlmostEqual(10.0, latency.standard_deviation)
+        later = summaries[('2016-05-24T17:00:00Z', 'chrome')]
+        self.assertEqual(1, later['latency'].sample_count)
+        self.assertEqual(2, later['total_duration'].sample_count)
+        self.assertAlmostEqual(30.0, later['total_duration'].mean)
+        self.assertEqual(1, result_rollup.skipped_count)
+
+    def test_minute_windows_without_grouping(self):
+        result_rollup = rollup.Rollup('1m')
+        result_rollup.add_table(make_table(ROWS))
+        self.assertEqual(
+            ['2016-05-24T16:00:00Z', '2016-05-24T16:30:00Z',
+             '2016-05-24T16:59:00Z', '2016-05-24T17:00:00Z',
+             '2016-05-24T17:01:00Z'],
+            sorted(key[0] for key in result_rollup.summaries()))
+
+    def test_incremental_updates_match_single_update(self):
+        expected = rollup.Rollup('1h', ['browser'])
+        expected.add_table(make_table(ROWS))
+        result_rollup = rollup.Rollup('1h', ['browser'])
+        result_rollup.add_table(make_table(ROWS[:2]))
+        result_rollup = pickle.loads(pickle.dumps(result_rollup))
+        result_rollup.add_table(make_table(ROWS[2:]))
+        self.assertItemsEqual(expected.summaries().keys(),
+                              result_rollup.summaries().keys())
+        for key, metrics in expected.summaries().iteritems():
+            for metric, aggregates in metrics.iteritems():
+                actual = result_rollup.summaries()[key][metric]
+                self.assertEqual(aggregates.sample_count, actual.sample_count)
+                if aggregates.sample_count:
+                    self.assertAlmostEqual(aggregates.mean, actual.mean)
+                    self.assertAlmostEqual(aggregates.standard_deviation,
+                                           actual.standard_deviation)
+
+    def test_rejects_unknown_window_and_field(self):
+        with self.assertRaises(ValueError):
+            rollup.Rollup('1w')
+        with self.assertRaises(ValueError):
+            rollup.Rollup('1h', ['filename'])
+
+
+if __name__ == '__main__':
+    unittest.main()
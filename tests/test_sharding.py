@@ -0,0 +1,130 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+from testmaster import csv_convert
+from testmaster import read_results
+from testmaster import sharding
+from testmaster import summary
+
+SHARD_COUNT = 3
+GROUP_BY = ['browser', 'os']
+
+
+def testdata_path(filename):
+    return os.path.join(os.path.dirname(__file__), 'testdata', filename)
+
+
+def write_shard(args):
+    """Writes the partial of one shard (runs in a worker process)."""
+    result_paths, index, partial_path = args
+    with open(partial_path, 'wb') as partial_file:
+        sharding.write_partial(result_paths, index, SHARD_COUNT, GROUP_BY,
+                               partial_file)
+
+
+class ShardingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        with open(testdata_path('raw-result.json')) as raw_result_file:
+            raw_result = json.load(raw_result_file)
+        self.result_paths = [testdata_path('result-package.zip')]
+        # Results with the same filename in both directories have different
+        # latencies, so the merge must keep the same one as a single run.
+        for directory in ('a', 'b'):
+            os.mkdir(os.path.join(self.temp_dir, directory))
+            for index in range(12):
+                raw_result['latency'] = float(index + 100 * len(directory))
+                raw_result['browser'] = ('chrome', 'firefox')[index % 2]
+                if directory == 'b':
+                    raw_result['latency'] += 1000.0
+                path = os.path.join(self.temp_dir, directory,
+                                    'result-%02d.json' % index)
+                with open(path, 'w') as result_file:
+                    json.dump(raw_result, result_file)
+                self.result_paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_partials(self):
+        partial_paths = [os.path.join(self.temp_dir, 'partial-%d' % index)
+                         for index in range(SHARD_COUNT)]
+        pool = multiprocessing.Pool(SHARD_COUNT)
+        try:
+            pool.map(write_shard, [(self.result_paths, index, path)
+                                   for index, path in enumerate(partial_paths)])
+        finally:
+            pool.terminate()
+            pool.join()
+        return partial_paths
+
+    def merge(self, partial_paths):
+        partial_files = [open(path, 'rb') for path in partial_paths]
+        try:
+            output = io.BytesIO()
+            merged_summary = sharding.merge_partials(partial_files, output)
+        finally:
+            for partial_file in partial_files:
+                partial_file.close()
+        return output.getvalue(), merged_summary
+
+    def test_parse_shard(self):
+        self.assertEqual((1, 4), sharding.parse_shard('1/4'))
+        for text in ('1', '4/4', '-1/4', 'a/b', '1/'):
+            with self.assertRaises(ValueError):
+                sharding.parse_shard(text)
+
+    def test_shards_partition_paths(self):
+        shards = [sharding.shard_paths(self.result_paths, index, SHARD_COUNT)
+                  for index in range(SHARD_COUNT)]
+        self.assertEqual(
+            list(enumerate(sorted(self.result_paths))), sorted(
+                position_path for shard in shards for position_path in shard))
+        self.assertTrue(all(shards))
+
+    def test_merge_matches_single_run(self):
+        merged_csv, merged_summary = self.merge(self.write_partials())
+        sorted_paths = sorted(self.result_paths)
+        self.assertEqual(
+            csv_convert.ndt_fields_to_csv(read_results.parse_fields(
+                sorted_paths, csv_convert.CSV_FIELDS)), merged_csv)
+        self.assertIn(',1111.0,', merged_csv)
+        self.assertNotIn(',111.0,', merged_csv)
+        self.assertEqual(
+            summary.summarize(
+                read_results.iter_results(sorted_paths),
+                GROUP_BY,
+                exact=True),
+            merged_summary.summaries())
+
+    def test_merge_requires_every_shard(self):
+        partial_paths = self.write_partials()
+        with self.assertRaises(ValueError):
+            self.merge(partial_paths[1:])
+        with self.assertRaises(ValueError):
+            self.merge(partial_paths + partial_paths[:1])
+
+
+if __name__ == '__main__':
+    unittest.main()
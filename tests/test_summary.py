@@ -0,0 +1,101 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import io
+import pickle
+import unittest
+
+from testmaster import summary
+from testmaster.ndt_e2e_clientworker.client_wrapper import results
+
+
+def make_result(browser, os, latency):
+    return results.NdtResult(browser=browser, os=os, latency=latency)
+
+
+RESULTS = [
+    ('a.json', make_result('chrome', 'Windows', 10.0)),
+    ('b.json', make_result('chrome', 'OSX', 20.0)),
+    ('c.json', make_result('chrome', 'Windows', 30.0)),
+    ('d.json', make_result('firefox', 'Windows', None)),
+]
+
+
+class SummaryTest(unittest.TestCase):
+
+    def test_summarize_groups_results_by_fields(self):
+        summaries = summary.summarize(iter(RESULTS), ['browser', 'os'])
+        expected_groups = [('chrome', 'Windows'), ('chrome', 'OSX'),
+                           ('firefox', 'Windows')]
+        self.assertItemsEqual(expected_groups, summaries.keys())
+        latency = summaries[('chrome', 'Windows')]['latency']
+        self.assertEqual(2, latency.sample_count)
+        self.assertAlmostEqual(20.0, latency.mean)
+        self.assertAlmostEqual(20.0, latency.median)
+        self.assertEqual(
+            0, summaries[('firefox', 'Windows')]['latency'].sample_count)
+
+    def test_summarize_without_grouping_has_single_group(self):
+        summaries = summary.summarize(iter(RESULTS), [])
+        self.assertEqual([()], summaries.keys())
+        self.assertEqual(3, summaries[()]['latency'].sample_count)
+
+    def test_summarize_rejects_unknown_group_field(self):
+        with self.assertRaises(ValueError):
+            summary.summarize(iter(RESULTS), ['filename'])
+
+    def test_write_summary_csv_writes_row_per_group_and_metric(self):
+        summaries = summary.summarize(iter(RESULTS), ['browser'])
+        output = io.BytesIO()
+        summary.write_summary_csv(summaries, ['browser'], output)
+        rows = output.getvalue().splitlines()
+        self.assertEqual(
+            'browser,metric,sample_count,minimum,maximum,mean,median,'
+            'standard_deviation', rows[0])
+        self.assertIn('chrome,latency,3,10.000,30.000,20.000,20.000,8.165',
+                      rows)
+        self.assertIn('firefox,latency,0,,,,,', rows)
+        self.assertEqual(1 + 2 * len(summary.METRICS), len(rows))
+
+    def test_summary_can_be_updated_incrementally(self):
+        result_summary = summary.Summary(['browser'])
+        for _, result in RESULTS[:2]:
+            result_summary.add(result)
+        result_summary = pickle.loads(pickle.dumps(result_summary))
+        for _, result in RESULTS[2:]:
+            result_summary.add(result)
+        self.assertEqual(
+            summary.summarize(
+                iter(RESULTS), ['browser']), result_summary.summaries())
+
+    def test_merged_exact_summaries_match_single_summary(self):
+        first_summary = summary.Summary(['browser'], exact=True)
+        second_summary = summary.Summary(['browser'], exact=True)
+        for _, result in RESULTS[:3]:
+            second_summary.add(result)
+        for _, result in RESULTS[3:]:
+            first_summary.add(result)
+        first_summary.merge(second_summary)
+        self.assertEqual(
+            summary.summarize(
+                iter(RESULTS), ['browser'],
+                exact=True),
+            first_summary.summaries())
+
+    def test_cannot_merge_summaries_of_different_groups(self):
+        with self.assertRaises(ValueError):
+            summary.Summary(['browser']).merge(summary.Summary(['os']))
+        with self.assertRaises(ValueError):
+            summary.Summary(['os']).merge(summary.Summary(['os'], exact=True))
@@ -0,0 +1,58 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import datetime
+import unittest
+
+import pytz
+
+from testmaster import timestamps
+
+
+class TimestampsTest(unittest.TestCase):
+
+    def test_datetime_to_us_is_exact(self):
+        self.assertEqual(1464108922677309, timestamps.datetime_to_us(
+            datetime.datetime(2016, 5, 24, 16, 55, 22, 677309, pytz.utc)))
+
+    def test_us_to_datetime_is_exact(self):
+        self.assertEqual(
+            datetime.datetime(2016, 5, 24, 16, 55, 22, 677309, pytz.utc),
+            timestamps.us_to_datetime(1464108922677309))
+
+    def test_None_converts_to_None(self):
+        self.assertIsNone(timestamps.datetime_to_us(None))
+        self.assertIsNone(timestamps.us_to_datetime(None))
+
+    def test_iso8601_to_us_matches_datetime_to_us(self):
+        self.assertEqual(
+            timestamps.datetime_to_us(datetime.datetime(2016, 5, 24, 16, 55, 22,
+                                                        677309, pytz.utc)),
+            timestamps.iso8601_to_us('2016-05-24T16:55:22.677309Z'))
+        self.assertEqual(1464108922500000,
+                         timestamps.iso8601_to_us('2016-05-24T16:55:22.5Z'))
+        self.assertEqual(1464108922000000,
+                         timestamps.iso8601_to_us('2016-05-24T16:55:22Z'))
+        self.assertEqual(
+            -1, timestamps.iso8601_to_us('1969-12-31T23:59:59.999999Z'))
+        self.assertIsNone(timestamps.iso8601_to_us(None))
+
+    def test_iso8601_to_us_rejects_other_formats(self):
+        for timestamp in ['2016-05-24 16:55:22Z', '2016-05-24T16:55:22',
+                          '2016-05-24T16:55:22+00:00', '2016-02-30T00:00:00Z',
+                          '2016-05-24T16:55:60Z', '2016-05-24T16:55:22.Z',
+                          '2016-05-24T16:55:22.1234567Z', '']:
+            with self.assertRaises(ValueError):
+                timestamps.iso8601_to_us(timestamp)
@@ -0,0 +1,99 @@
+# Copyright 2016 Measurement Lab
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from testmaster import watcher
+
+
+class DirectoryWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.watch_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.watch_dir)
+
+    def write_file(self, filename, contents, age=60):
+        """Writes a file with a modification time age seconds in the past."""
+        path = os.path.join(self.watch_dir, filename)
+        with open(path, 'w') as output_file:
+            output_file.write(contents)
+        modified_time = time.time() - age
+        os.utime(path, (modified_time, modified_time))
+        return path
+
+    def test_poll_reports_each_new_file_once(self):
+        directory_watcher = watcher.DirectoryWatcher(self.watch_dir)
+        path_a = self.write_file('a.json', '{}')
+        self.assertEqual([path_a], directory_watcher.poll())
+        self.assertEqual([], directory_watcher.poll())
+        path_b = self.write_file('b.zip', 'zip')
+        self.assertEqual([path_b], directory_watcher.poll())
+
+    def test_poll_ignores_modified_files(self):
+        directory_watcher = watcher.DirectoryWatcher(self.watch_dir)
+        self.write_file('a.json', '{}')
+        directory_watcher.poll()
+        self.write_file('a.json', '{"latency": 5.0}')
+        self.assertEqual([], directory_watcher.poll())
+
+    def test_poll_waits_for_files_to_settle(self):
+        directory_watcher = watcher.DirectoryWatcher(self.watch_dir,
+                                                     settle_time=30)
+        path = self.write_file('a.json', '{}', age=0)
+        self.assertEqual([], directory_watcher.poll())
+        os.utime(path, (time.time() - 60, time.time() - 60))
+        self.assertEqual([path], directory_watcher.poll())
+
+    def test_poll_lists_directory_only_when_it_changes(self):
+        self.write_file('a.json', '{}')
+        directory_mtime = time.time() - 60
+        os.utime(self.watch_dir, (directory_mtime, directory_mtime))
+        listed = []
+        original_listdir = watcher.os.listdir
+
+        def listdir(path):
+            listed.append(path)
+            return original_listdir(path)
+
+        watcher.os.listdir = listdir
+        try:
+            directory_watcher = watcher.DirectoryWatcher(self.watch_dir)
+            directory_watcher.poll()
+            directory_watcher.poll()
+            self.assertEqual(1, len(listed))
+            self.write_file('b.json', '{}')
+            directory_watcher.poll()
+            self.assertEqual(2, len(listed))
+        finally:
+            watcher.os.listdir = original_listdir
+
+    def test_poll_ignores_subdirectories(self):
+        os.mkdir(os.path.join(self.watch_dir, 'subdir'))
+        self.assertEqual([], watcher.DirectoryWatcher(self.watch_dir).poll())
+
+    def test_new_watcher_resumes_from_seen_files(self):
+        path_a = self.write_file('a.json', '{}')
+        first_watcher = watcher.DirectoryWatcher(self.watch_dir)
+        self.assertEqual([path_a], first_watcher.poll())
+        path_b = self.write_file('b.json', '{}')
+        second_watcher = watcher.DirectoryWatcher(self.watch_dir,
+                                                  seen=first_watcher.seen)
+        self.assertEqual([path_b], second_watcher.poll())